@@ -0,0 +1,290 @@
+"""
+Catalog loading, registration and search against a production-sized
+synthetic catalog (see benchmarks/synthetic.py), compared with the
+recorded baseline.
+
+    python -m benchmarks.bench_catalog                     # sqlite, full scale
+    python -m benchmarks.bench_catalog --scale 0.1
+    python -m benchmarks.bench_catalog --url postgresql+psycopg2://.../bench_db
+    python -m benchmarks.bench_catalog --update-baseline
+
+Without --url the catalog is built in a temporary sqlite file. A postgres
+--url must point at a throwaway database that run_migrations has set up
+and that has nothing in it yet; the catalog is built there and left
+behind. Registrations are rolled back, except the bulk ones, which commit
+like the real thing.
+
+Results are keyed by backend and scale in benchmarks/baseline.json. Any
+benchmark more than --tolerance slower than its baseline, or making more
+round trips, is reported and the exit status is 1, so a change that
+regresses one shows up when the baseline file doesn't move with it.
+Round trips are exact; times are only comparable on the same machine, so
+re-record the baseline before comparing on a new one.
+"""
+
+import argparse
+import json
+import logging
+import statistics
+import tempfile
+import time
+from datetime import date
+from itertools import count
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, select
+
+from benchmarks.bench_registration import RoundTripCounter, fake_registration
+from benchmarks.synthetic import build_catalog, DATASETS, VARIABLES, KEYWORDS
+
+
+BASELINE = Path(__file__).parent / "baseline.json"
+
+# Differences smaller than this are noise whatever the ratio.
+NOISE_MS = 5.0
+
+SPEC = """
+file = "{csv}"
+
+[dataset]
+table_name = "bench_bulk_{n}"
+description = "Synthetic dataset for the bulk registration benchmark."
+cadence = "year"
+keywords = ["benchmark", "synthetic"]
+
+{variables}
+
+[edition]
+publish_date = 2024-01-01
+collection_start = 2023-01-01
+collection_end = 2023-12-31
+acquisition_date = 2024-01-02
+"""
+
+
+class Bench:
+    def __init__(self, engine, md, counter, repeat):
+        self.engine = engine
+        self.md = md
+        self.counter = counter
+        self.repeat = repeat
+        self.results = {}
+
+    def measure(self, name, body, setup=None, repeat=None, rollback=True):
+        """
+        Times body(db, state) on a fresh connection `repeat` times, where
+        state is whatever setup(db) returned. Only body is timed and only
+        its round trips are counted.
+        """
+        timings = []
+        for _ in range(repeat or self.repeat):
+            with self.engine.connect() as db:
+                state = setup(db) if setup else None
+                self.counter.count = 0
+                start = time.perf_counter()
+                body(db, state)
+                timings.append(time.perf_counter() - start)
+                round_trips = self.counter.count
+                if rollback:
+                    db.rollback()
+                else:
+                    db.commit()
+
+        self.results[name] = {
+            "best_ms": round(min(timings) * 1000, 3),
+            "median_ms": round(statistics.median(timings) * 1000, 3),
+            "round_trips": round_trips,
+        }
+        print(
+            f"  {name:<28} {self.results[name]['best_ms']:>10.1f} ms best "
+            f"{self.results[name]['median_ms']:>10.1f} ms median "
+            f"{round_trips:>6} round trips",
+            flush=True,
+        )
+
+
+def run(engine, md, repeat, workdir):
+    from metadata.bulk import BulkRegistrar
+    from metadata.replica import LocalReplica
+    from metadata.search import MetadataSearch
+
+    bench = Bench(engine, md, RoundTripCounter(engine), repeat)
+
+    bench.measure("get_available_datasets", lambda db, _: md.get_available_datasets(db))
+    bench.measure(
+        "get_available_datasets_delta",
+        lambda db, since: md.get_available_datasets(db, since=since),
+        setup=lambda db: db.execute(select(func.max(md.dataset_table.c.updated_at))).scalar(),
+    )
+    bench.measure("get_all_keywords", lambda db, _: md.get_all_keywords(db))
+
+    replica = LocalReplica(md, workdir / "replica.db")
+    replica.refresh()
+    bench.measure("catalog_refresh", lambda db, _: replica.refresh())
+
+    def new_dataset(db):
+        dataset, variables, _, _ = fake_registration(400, 0)
+        return md.insert_dataset(dataset, db), variables
+
+    bench.measure(
+        "insert_variables_400",
+        lambda db, state: md.insert_variables(state[1], state[0], db),
+        setup=new_dataset,
+    )
+    bench.measure(
+        "register_400",
+        lambda db, registration: md.register(*registration, db),
+        setup=lambda db: fake_registration(400, 5),
+    )
+
+    csv = workdir / "bulk.csv"
+    csv.write_text(
+        ",".join(f"var_{i}" for i in range(50))
+        + "\n"
+        + "\n".join(",".join(str(row * i) for i in range(50)) for row in range(1000))
+        + "\n"
+    )
+    variables = "\n".join(
+        f'[[variables]]\nvariable_name = "var_{i}"\ndata_type = "numeric"\n'
+        for i in range(50)
+    )
+    specs = count()
+
+    def write_spec(db):
+        n = next(specs)
+        path = workdir / f"bulk_{n}.toml"
+        path.write_text(SPEC.format(csv=csv.name, n=n, variables=variables))
+        return path
+
+    registrar = BulkRegistrar(md, "benchmarks")
+
+    def bulk_register(db, path):
+        registrar.register_path(path).unwrap()
+
+    bench.measure("bulk_register_50", bulk_register, setup=write_spec, rollback=False)
+
+    # Cold searches include building the local index on backends without
+    # full text search; warm ones reuse it.
+    bench.measure(
+        "search_datasets_cold",
+        lambda db, search: search.search_datasets("median household income", db),
+        setup=lambda db: MetadataSearch(md),
+        repeat=1,
+    )
+    search = MetadataSearch(md)
+    with engine.connect() as db:
+        search.search_datasets("rent", db)
+        search.search_variables("rent", db)
+        search.search_keywords("rent", db)
+
+    for name, query in [
+        ("search_datasets", "median household income"),
+        ("search_variables", "vacant property"),
+        ("search_keywords", "mortgage"),
+    ]:
+        method = getattr(search, name)
+        bench.measure(name, lambda db, _, method=method, query=query: method(query, db))
+
+    return bench.results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Lines describing every benchmark that got slower or chattier than its
+    baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        slower = result["best_ms"] - before["best_ms"]
+        if slower > NOISE_MS and result["best_ms"] > before["best_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {before['best_ms']:.1f} ms -> {result['best_ms']:.1f} ms"
+            )
+        if result["round_trips"] > before["round_trips"]:
+            regressions.append(
+                f"{name}: {before['round_trips']} -> {result['round_trips']} round trips"
+            )
+    return regressions
+
+
+def prepare(url, workdir):
+    from metadata.schema import metadata, datasets
+
+    if url is None:
+        engine = create_engine(f"sqlite:///{workdir / 'catalog.db'}")
+        metadata.create_all(engine)
+        return engine
+
+    engine = create_engine(url)
+    with engine.connect() as db:
+        from metadata.schema import check_schema
+
+        problems = check_schema(db)
+        if problems:
+            raise SystemExit(
+                "Run the migrations on the benchmark database first:\n" + "\n".join(problems)
+            )
+        if db.execute(select(func.count()).select_from(datasets)).scalar():
+            raise SystemExit("The benchmark database already has datasets in it.")
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="A throwaway, migrated postgres database")
+    parser.add_argument("--scale", type=float, default=1.0, help="Fraction of production size")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--output", type=Path, help="Also write the results here")
+    args = parser.parse_args()
+
+    from metadata.access import MetadataConnection
+
+    n_datasets = max(1, int(DATASETS * args.scale))
+    n_variables = max(1, int(VARIABLES * args.scale))
+    n_keywords = max(5, int(KEYWORDS * args.scale))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        engine = prepare(args.url, workdir)
+        md = MetadataConnection(logging.getLogger("benchmarks"), engine)
+        key = f"{engine.dialect.name}@{args.scale:g}"
+
+        print(f"{n_datasets} datasets, {n_variables} variables, {n_keywords} keywords ({key})")
+        start = time.perf_counter()
+        build_catalog(engine, n_datasets, n_variables, n_keywords)
+        print(f"  built in {time.perf_counter() - start:.1f} s", flush=True)
+
+        results = run(engine, md, args.repeat, workdir)
+        engine.dispose()
+
+    if args.output:
+        args.output.write_text(json.dumps({key: results}, indent=2) + "\n")
+
+    baselines = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.update_baseline:
+        baselines[key] = {"recorded": date.today().isoformat(), "results": results}
+        args.baseline.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline for {key} written to {args.baseline}")
+        return
+
+    if key not in baselines:
+        print(f"No baseline for {key}; record one with --update-baseline.")
+        return
+
+    regressions = compare(results, baselines[key]["results"], args.tolerance)
+    if regressions:
+        print(f"Regressions against the {baselines[key]['recorded']} baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        raise SystemExit(1)
+    print(f"No regressions against the {baselines[key]['recorded']} baseline.")
+
+
+if __name__ == "__main__":
+    main()
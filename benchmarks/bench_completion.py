@@ -0,0 +1,82 @@
+"""
+Completion latency for the dataset and keyword prompts at catalog scale,
+per keystroke, for the old WordCompleter and CatalogCompleter.
+
+    python -m benchmarks.bench_completion --entries 100000
+
+Each query is typed one character at a time and every prefix is timed,
+which is what the prompt does. CatalogCompleter should stay under 5 ms
+at the 99th percentile.
+"""
+
+import argparse
+import random
+import time
+
+from prompt_toolkit.completion import CompleteEvent, WordCompleter
+from prompt_toolkit.document import Document
+
+from benchmarks.synthetic import WORDS, TOPICS
+
+
+def fake_names(n, seed=0):
+    rng = random.Random(seed)
+    return {
+        f"{rng.choice(TOPICS)}_{rng.choice(WORDS)}_{rng.choice(WORDS)}_{i}": rng.randrange(50)
+        for i in range(n)
+    }
+
+
+def keystrokes(queries):
+    for query in queries:
+        for end in range(1, len(query) + 1):
+            yield query[:end]
+
+
+def time_completer(completer, texts):
+    event = CompleteEvent(text_inserted=True)
+    timings = []
+    for text in texts:
+        start = time.perf_counter()
+        list(completer.get_completions(Document(text), event))
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "p50_ms": timings[len(timings) // 2] * 1000,
+        "p99_ms": timings[int(len(timings) * 0.99)] * 1000,
+        "max_ms": timings[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    args = parser.parse_args()
+
+    from metadata.completion import CatalogCompleter
+
+    usage = fake_names(args.entries)
+    rng = random.Random(1)
+    queries = [rng.choice(list(usage)) for _ in range(50)]
+    queries += ["acs_median", "hosuing_rent", "parcels_asessed_value", "vacant"]
+    texts = list(keystrokes(queries))
+
+    start = time.perf_counter()
+    completer = CatalogCompleter(lambda: usage, background=False)
+    build = time.perf_counter() - start
+
+    results = {
+        "WordCompleter": time_completer(WordCompleter(list(usage)), texts),
+        "CatalogCompleter": time_completer(completer, texts),
+    }
+
+    print(f"{args.entries} entries, {len(texts)} keystrokes, index built in {build:.2f} s")
+    for name, result in results.items():
+        print(
+            f"  {name:<18} p50 {result['p50_ms']:>8.2f} ms "
+            f"p99 {result['p99_ms']:>8.2f} ms max {result['max_ms']:>8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
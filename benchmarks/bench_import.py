@@ -0,0 +1,68 @@
+"""
+Import time for the modules ETL scripts pull in, measured in a fresh
+interpreter each time with -X importtime.
+
+    python -m benchmarks.bench_import
+
+Reports the cumulative time for each module and how much of it is
+sqlalchemy, which every database-facing module needs and which sets the
+floor. 'metadata.access' should stay within tens of milliseconds of that
+floor; pandas, prompt_toolkit or psycopg2 showing up in its imports means
+something has started importing eagerly again.
+"""
+
+import argparse
+import subprocess
+import sys
+
+
+MODULES = ["metadata.access", "metadata.search", "metadata.capture"]
+HEAVY = ["pandas", "prompt_toolkit", "psycopg2", "dateutil"]
+
+
+def import_times(module):
+    """
+    For one cold import, the cumulative microseconds of the module itself
+    and of every module imported along the way (interpreter startup, like
+    'site', isn't counted).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times.setdefault(name.strip(), int(cumulative))
+
+    return times[module], times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for module in MODULES:
+        total, best = min(
+            (import_times(module) for _ in range(args.repeat)), key=lambda run: run[0]
+        )
+
+        total = total / 1000
+        sqlalchemy = best.get("sqlalchemy", 0) / 1000
+        heavy = [name for name in HEAVY if name in best]
+
+        print(
+            f"{module:<20} {total:>8.1f} ms total "
+            f"{total - sqlalchemy:>8.1f} ms excluding sqlalchemy"
+            + (f"  (imports {', '.join(heavy)})" if heavy else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
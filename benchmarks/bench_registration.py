@@ -0,0 +1,137 @@
+"""
+Round trips and wall time for writing one new dataset, the old way (an
+INSERT per variable, then separate keyword, tag and edition writes) and
+through MetadataConnection.register.
+
+    python -m benchmarks.bench_registration --variables 400 --rtt-ms 20
+
+This runs against the configured database, or --url, inside a transaction
+that's always rolled back. --rtt-ms adds a simulated delay to every round
+trip, which approximates a remote postgres when the database is local.
+"""
+
+import argparse
+import logging
+import time
+import uuid
+from datetime import date
+
+from sqlalchemy import create_engine, event, insert
+
+
+def fake_registration(n_variables, n_keywords):
+    tag = uuid.uuid4().hex[:8]
+    dataset = {
+        "table_name": f"bench_{tag}",
+        "description": "Synthetic dataset for the registration benchmark.",
+        "cadence": "year",
+    }
+    variables = [
+        (
+            {
+                "variable_name": f"var_{i}",
+                "description": f"Synthetic variable {i}",
+                "data_type": "numeric",
+            },
+            None,
+        )
+        for i in range(n_variables)
+    ]
+    keywords = [f"bench_{tag}_{i}" for i in range(n_keywords)]
+    edition = {
+        "num_records": 1000,
+        "notes": "",
+        "publish_date": date(2024, 1, 1),
+        "collection_start": date(2023, 1, 1),
+        "collection_end": date(2023, 12, 31),
+        "acquisition_date": date(2024, 1, 2),
+    }
+    return dataset, variables, keywords, edition
+
+
+def register_row_by_row(md, dataset, variables, keywords, edition, db):
+    """
+    The registration path as it was before MetadataConnection.register.
+    """
+    dataset_id = md.insert_dataset(dataset, db)
+    for variable, _ in variables:
+        db.execute(
+            insert(md.variable_table).values(**variable, dataset_id=dataset_id)
+        )
+    kw_ids = md.insert_new_keywords(keywords, db)
+    md.tag_dataset(list(kw_ids.values()), dataset_id, db)
+    md.insert_edition(edition, dataset_id, db)
+
+
+def register_batched(md, dataset, variables, keywords, edition, db):
+    md.register(dataset, variables, keywords, edition, db)
+
+
+class RoundTripCounter:
+    def __init__(self, engine, rtt_ms=0.0):
+        self.count = 0
+        self.delay = rtt_ms / 1000
+        event.listen(engine, "before_cursor_execute", self)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        if self.delay:
+            time.sleep(self.delay)
+
+
+def run(engine, md, n_variables, n_keywords, rtt_ms, repeat):
+    counter = RoundTripCounter(engine, rtt_ms)
+    results = {}
+
+    for name, register in [
+        ("row_by_row", register_row_by_row),
+        ("batched", register_batched),
+    ]:
+        timings = []
+        for _ in range(repeat):
+            dataset, variables, keywords, edition = fake_registration(
+                n_variables, n_keywords
+            )
+            with engine.connect() as db:
+                counter.count = 0
+                start = time.perf_counter()
+                register(md, dataset, variables, keywords, edition, db)
+                timings.append(time.perf_counter() - start)
+                db.rollback()
+
+        results[name] = {
+            "round_trips": counter.count,
+            "best_ms": min(timings) * 1000,
+        }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="Database url, defaults to config.toml")
+    parser.add_argument("--variables", type=int, default=400)
+    parser.add_argument("--keywords", type=int, default=5)
+    parser.add_argument("--rtt-ms", type=float, default=0.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    from metadata.access import MetadataConnection
+
+    engine = create_engine(args.url) if args.url else None
+    md = MetadataConnection(logging.getLogger("benchmarks"), engine)
+
+    results = run(
+        md.db_engine, md, args.variables, args.keywords, args.rtt_ms, args.repeat
+    )
+
+    print(f"{args.variables} variables, {args.keywords} keywords, {args.rtt_ms} ms rtt")
+    for name, result in results.items():
+        print(
+            f"  {name:<12} {result['round_trips']:>5} round trips "
+            f"{result['best_ms']:>10.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Synthetic catalogs for the benchmarks: datasets with variables, keywords
+and tags, with descriptions drawn from a small vocabulary so searches
+have something realistic to rank. Everything is seeded, so the same
+arguments always build the same catalog.
+"""
+
+import random
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import insert, text
+
+from metadata.schema import datasets, variables, keywords, tags, editions
+
+
+# Production scale, as of the last count.
+DATASETS = 10_000
+VARIABLES = 1_000_000
+KEYWORDS = 50_000
+TAGS_PER_DATASET = 5
+
+BATCH = 20_000
+
+# Changes are spread over a year that ended well before the benchmarks run,
+# like a catalog that's been in use for a while, so a delta sync only sees
+# the last few minutes of it plus whatever the benchmarks add.
+HISTORY_START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+HISTORY = timedelta(days=365)
+
+TOPICS = ["acs", "parcels", "health", "schools", "transit", "crime", "housing", "jobs"]
+UNITS = ["tract", "block group", "parcel", "school", "zip code", "county", "city"]
+WORDS = (
+    "population income median household poverty rent owner vacant occupied "
+    "enrollment graduation attendance ridership route stop violent property "
+    "employment wage industry age sex race ethnicity language insurance "
+    "mortgage value assessed taxable foreclosure demolition permit inspection"
+).split()
+
+
+def _sentence(rng, n=8):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def _batches(rows, size=BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def build_catalog(
+    engine,
+    n_datasets=DATASETS,
+    n_variables=VARIABLES,
+    n_keywords=KEYWORDS,
+    tags_per_dataset=TAGS_PER_DATASET,
+    seed=0,
+):
+    """
+    Fills an empty catalog. Variables are spread evenly over the datasets
+    and every dataset gets one edition. Rows go in as executemany batches
+    of BATCH, so memory stays flat however big the catalog is.
+    """
+    rng = random.Random(seed)
+    per_dataset, extra = divmod(n_variables, n_datasets)
+
+    def changed_at(i, n):
+        return HISTORY_START + HISTORY * i / n
+
+    def dataset_rows():
+        for i in range(1, n_datasets + 1):
+            topic = rng.choice(TOPICS)
+            yield {
+                "id": i,
+                "table_name": f"{topic}_{rng.choice(WORDS)}_{i}",
+                "description": _sentence(rng, 12),
+                "unit_of_analysis": rng.choice(UNITS),
+                "universe": _sentence(rng, 4),
+                "notes": _sentence(rng, 6),
+                "cadence": rng.choice(["month", "quarter", "year", "none"]),
+                "topic": topic,
+                "updated_at": changed_at(i, n_datasets),
+            }
+
+    def variable_rows():
+        for dataset_id in range(1, n_datasets + 1):
+            for j in range(per_dataset + (dataset_id <= extra)):
+                yield {
+                    "dataset_id": dataset_id,
+                    "variable_name": f"{rng.choice(WORDS)}_{j}",
+                    "description": _sentence(rng),
+                    "data_type": rng.choice(["numeric", "string", "date"]),
+                    "updated_at": changed_at(dataset_id, n_datasets),
+                }
+
+    def keyword_rows():
+        for i in range(1, n_keywords + 1):
+            yield {
+                "id": i,
+                "content": f"{rng.choice(WORDS)}_{i}",
+                "updated_at": changed_at(i, n_keywords),
+            }
+
+    def tag_rows():
+        for dataset_id in range(1, n_datasets + 1):
+            for kw_id in rng.sample(range(1, n_keywords + 1), min(tags_per_dataset, n_keywords)):
+                yield {"dataset_id": dataset_id, "kw_id": kw_id}
+
+    def edition_rows():
+        for dataset_id in range(1, n_datasets + 1):
+            yield {
+                "dataset_id": dataset_id,
+                "num_records": rng.randrange(100, 1_000_000),
+                "notes": "",
+                "publish_date": date(2024, 1, 1),
+                "collection_start": date(2023, 1, 1),
+                "collection_end": date(2023, 12, 31),
+                "acquisition_date": date(2024, 1, 2),
+            }
+
+    postgres = engine.dialect.name == "postgresql"
+    if postgres:
+        # The change tracking triggers from 0005 would stamp every dataset
+        # with now() as its variables go in.
+        _set_triggers(engine, "DISABLE")
+
+    for table, rows in [
+        (datasets, dataset_rows()),
+        (keywords, keyword_rows()),
+        (variables, variable_rows()),
+        (tags, tag_rows()),
+        (editions, edition_rows()),
+    ]:
+        for batch in _batches(rows):
+            with engine.begin() as db:
+                db.execute(insert(table), batch)
+
+    if postgres:
+        _set_triggers(engine, "ENABLE")
+
+        # Explicit ids don't move postgres' sequences along.
+        with engine.begin() as db:
+            for table in (datasets, keywords):
+                db.execute(
+                    text(
+                        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                        f"(SELECT max(id) FROM {table.name}))"
+                    )
+                )
+
+
+def _set_triggers(engine, action):
+    with engine.begin() as db:
+        for table in (datasets, variables, keywords):
+            db.execute(text(f"ALTER TABLE {table.name} {action} TRIGGER USER"))
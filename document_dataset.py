@@ -1,6 +1,5 @@
 from pathlib import Path
 import logging
-import pandas as pd
 import tomli
 
 from metadata.capture import RegistrationHandler
@@ -14,8 +13,10 @@ def main():
 
     logger = logging.getLogger(config["app"]["name"])
     filename = "munoz_llcs.csv"
-    file = pd.read_csv(Path.cwd() / "tests" / "fixtures" / filename)
-    handler = RegistrationHandler(filename, file)
+    # Passing the path rather than a DataFrame streams the file in chunks.
+    handler = RegistrationHandler(
+        filename, Path.cwd() / "tests" / "fixtures" / filename, config
+    )
     handler.run_complete_workflow()
     logger.info(f"{filename} successfully logged.")
 
@@ -1,29 +1,53 @@
-from sqlalchemy import insert, MetaData, Table, select
+import hashlib
 
-from .connection import db_engine
+from sqlalchemy import (
+    insert,
+    update,
+    select,
+    func,
+    literal,
+    true,
+    union_all,
+    bindparam,
+    exists,
+    cast,
+    BigInteger,
+    Integer,
+)
+
+from .connection import get_engine
+from . import schema
 from itertools import groupby
 
 
 class MetadataConnection:
-    def __init__(self, logger):
+    def __init__(self, logger, db_engine=None):
+        """
+        The tables come from metadata.schema rather than being reflected,
+        and the default engine isn't built until it's first used, so this
+        doesn't touch the database or the config.
+        """
         self.logger = logger
-        self.db_engine = db_engine
+        self._db_engine = db_engine
 
-        metadata = MetaData()
-        self.dataset_table = Table(
-            "datasets", metadata, autoload_with=db_engine
-        )
-        self.variable_table = Table(
-            "variables", metadata, autoload_with=db_engine
-        )
-        self.edition_table = Table(
-            "editions", metadata, autoload_with=db_engine
-        )
-        self.keyword_table = Table(
-            "keywords", metadata, autoload_with=db_engine
-        )
-        self.tags_table = Table("tags", metadata, autoload_with=db_engine)
-        self.standards = Table("standards", metadata, autoload_with=db_engine)
+        self.dataset_table = schema.datasets
+        self.variable_table = schema.variables
+        self.edition_table = schema.editions
+        self.keyword_table = schema.keywords
+        self.tags_table = schema.tags
+        self.standards = schema.standards
+        self.project_table = schema.projects
+        self.usage_table = schema.usages
+        self.derivation_table = schema.derivations
+        self.lineage_table = schema.lineage
+        self.autotime_table = schema.autotime
+        self.coverage_table = schema.coverage
+
+    @property
+    def db_engine(self):
+        if self._db_engine is None:
+            self._db_engine = get_engine()
+        return self._db_engine
 
     def insert_dataset(self, dataset: dict, db):
         ds_insert_stmt = (
@@ -37,28 +61,294 @@ class MetadataConnection:
         return row.id  # Does this really need a try except?
 
 
-    def get_available_datasets(self, db):
-        stmt = select(
-            self.dataset_table.c["id"],
-            self.dataset_table.c["table_name"],
-            self.variable_table.c["variable_name"],
-        ).select_from(
-            self.dataset_table.join(
-                self.variable_table,
-                (self.dataset_table.c.id == self.variable_table.c.dataset_id),
+    def get_available_datasets(self, db, since=None, names=None):
+        """
+        Maps each dataset's name to its id and variable names. Datasets
+        without variables are included (with an empty list), passing
+        `since` limits the result to datasets changed after it, and
+        `names` to the datasets with those names.
+
+        Postgres aggregates the variable names server-side; elsewhere the
+        rows come back ordered by dataset so they can be grouped here.
+        """
+        ds, var = self.dataset_table, self.variable_table
+        joined = ds.outerjoin(var, ds.c.id == var.c.dataset_id)
+
+        if db.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+            stmt = (
+                select(
+                    ds.c.id,
+                    ds.c.table_name,
+                    func.array_remove(
+                        func.array_agg(
+                            aggregate_order_by(var.c.variable_name, var.c.id)
+                        ),
+                        None,
+                    ),
+                )
+                .select_from(joined)
+                .group_by(ds.c.id)
+            )
+        else:
+            stmt = (
+                select(ds.c.id, ds.c.table_name, var.c.variable_name)
+                .select_from(joined)
+                .order_by(ds.c.id, var.c.id)
             )
-        )
 
-        self.logger.info(stmt.compile())
+        if since is not None:
+            stmt = stmt.where(ds.c.updated_at > since)
+        if names is not None:
+            stmt = stmt.where(ds.c.table_name.in_(list(names)))
 
         result = db.execute(stmt)
 
+        if db.dialect.name == "postgresql":
+            return {name: (id, variables) for id, name, variables in result}
+
         return {
-            dataset[1]: (dataset[0], [row[2] for row in rows])
-            for dataset, rows in groupby(
-                result.fetchall(), lambda row: (row[0], row[1])
-            )
+            dataset[1]: (dataset[0], [row[2] for row in rows if row[2] is not None])
+            for dataset, rows in groupby(result, lambda row: (row[0], row[1]))
+        }
+
+    def get_dataset_text(self, db, since=None):
+        """
+        What similarity is judged on, per dataset id: {"table_name",
+        "description", "universe", "keywords": [...], "variables": [...]},
+        in three queries. `since` limits it to datasets changed after it
+        (adding or changing variables touches their dataset, see 0005).
+        """
+        ds, var, kw, tags = self.dataset_table, self.variable_table, self.keyword_table, self.tags_table
+
+        stmt = select(ds.c.id, ds.c.table_name, ds.c.description, ds.c.universe)
+        if since is not None:
+            stmt = stmt.where(ds.c.updated_at > since)
+        found = {
+            row.id: {**row._asdict(), "keywords": [], "variables": []}
+            for row in db.execute(stmt)
         }
+        if not found:
+            return {}
+
+        # Joined server-side; names can't hold a newline.
+        ids = stmt.with_only_columns(ds.c.id)
+        for dataset_id, names in db.execute(
+            select(var.c.dataset_id, func.aggregate_strings(var.c.variable_name, "\n"))
+            .where(var.c.dataset_id.in_(ids))
+            .group_by(var.c.dataset_id)
+        ):
+            found[dataset_id]["variables"] = names.split("\n")
+        for row in db.execute(
+            select(tags.c.dataset_id, kw.c.content)
+            .select_from(tags.join(kw, tags.c.kw_id == kw.c.id))
+            .where(tags.c.dataset_id.in_(ids))
+        ):
+            found[row.dataset_id]["keywords"].append(row.content)
+
+        for entry in found.values():
+            del entry["id"]
+        return found
+
+    def get_dataset_id(self, table_name, db):
+        stmt = select(self.dataset_table.c.id).where(
+            self.dataset_table.c.table_name == table_name
+        )
+        return db.execute(stmt).scalar_one_or_none()
+
+    def find_datasets_by_fingerprint(self, fingerprint, db):
+        """
+        Names of the datasets whose registered schema fingerprint matches,
+        as {table_name: id}.
+        """
+        stmt = select(self.dataset_table.c.id, self.dataset_table.c.table_name).where(
+            self.dataset_table.c.schema_fingerprint == fingerprint
+        )
+
+        return {row.table_name: row.id for row in db.execute(stmt)}
+
+    def find_edition_by_digest(self, content_digest, db, dataset_name=None):
+        """
+        The first edition (of `dataset_name`, or of any dataset) whose file
+        had this content digest, as a dict of id, dataset_id, table_name
+        and publish_date, or None.
+        """
+        ds, ed = self.dataset_table, self.edition_table
+        stmt = (
+            select(ed.c.id, ed.c.dataset_id, ds.c.table_name, ed.c.publish_date)
+            .select_from(ed.join(ds, ds.c.id == ed.c.dataset_id))
+            .where(ed.c.content_digest == content_digest)
+            .order_by(ed.c.id)
+            .limit(1)
+        )
+        if dataset_name is not None:
+            stmt = stmt.where(ds.c.table_name == dataset_name)
+
+        row = db.execute(stmt).first()
+        return row._asdict() if row else None
+
+    def get_documented_digests(self, content_digests, db):
+        """
+        Which of these content digests some edition's file already had, as
+        a set of (table_name, content_digest), in one query.
+        """
+        ds, ed = self.dataset_table, self.edition_table
+        stmt = (
+            select(ds.c.table_name, ed.c.content_digest)
+            .select_from(ed.join(ds, ds.c.id == ed.c.dataset_id))
+            .where(ed.c.content_digest.in_(list(content_digests)))
+            .distinct()
+        )
+
+        return set(db.execute(stmt).tuples())
+
+    def set_schema_fingerprint(self, dataset_id, fingerprint, db):
+        db.execute(
+            update(self.dataset_table)
+            .where(self.dataset_table.c.id == dataset_id)
+            .values(schema_fingerprint=fingerprint)
+        )
+
+    def get_catalog_state(self, db):
+        """
+        Row counts and the latest change for the tables the local replica
+        keeps, in one query. Tags have no updated_at, so they get a
+        checksum instead: a dataset tagged with another keyword, or a tag
+        moved to another dataset, changes it without changing the count.
+        """
+        ds, kw, ed, tags, std = (
+            self.dataset_table,
+            self.keyword_table,
+            self.edition_table,
+            self.tags_table,
+            self.standards,
+        )
+        stmt = select(
+            select(func.count()).select_from(ds).scalar_subquery().label("datasets"),
+            select(func.max(ds.c.updated_at)).scalar_subquery().label("datasets_updated"),
+            select(func.count()).select_from(kw).scalar_subquery().label("keywords"),
+            select(func.max(kw.c.updated_at)).scalar_subquery().label("keywords_updated"),
+            select(func.count()).select_from(ed).scalar_subquery().label("editions"),
+            select(func.max(ed.c.updated_at)).scalar_subquery().label("editions_updated"),
+            select(func.count()).select_from(std).scalar_subquery().label("standards"),
+            select(func.max(std.c.updated_at)).scalar_subquery().label("standards_updated"),
+            select(func.count()).select_from(tags).scalar_subquery().label("tags"),
+            select(func.coalesce(func.sum(cast(tags.c.dataset_id, BigInteger) * tags.c.kw_id), 0))
+            .scalar_subquery()
+            .label("tags_checksum"),
+            select(func.max(tags.c.kw_id)).scalar_subquery().label("tags_last_keyword"),
+        )
+
+        return db.execute(stmt).one()._asdict()
+
+    def get_catalog_version(self, db):
+        """
+        A token that changes whenever anything a reader can see does: the
+        catalog state (datasets, keywords, editions, standards and tags),
+        hashed. Deleting a variable touches its dataset (0005), and other
+        deletes change a count.
+        """
+        state = "|".join(str(value) for value in self.get_catalog_state(db).values())
+
+        return hashlib.sha1(state.encode()).hexdigest()[:16]
+
+    def get_dataset(self, table_name, db):
+        """
+        The dataset's row (without its search vector) plus its variable
+        names, or None.
+        """
+        ds, var = self.dataset_table, self.variable_table
+        columns = [column for column in ds.columns if column.name != "search_vector"]
+        row = db.execute(select(*columns).where(ds.c.table_name == table_name)).one_or_none()
+        if row is None:
+            return None
+
+        names = db.execute(
+            select(var.c.variable_name).where(var.c.dataset_id == row.id).order_by(var.c.id)
+        ).scalars()
+
+        return {**row._asdict(), "variables": list(names)}
+
+    def get_variables(self, dataset_id, db):
+        var = self.variable_table
+        columns = [
+            column
+            for column in var.columns
+            if column.name not in {"search_vector", "dataset_id"}
+        ]
+        stmt = select(*columns).where(var.c.dataset_id == dataset_id).order_by(var.c.id)
+
+        return [row._asdict() for row in db.execute(stmt)]
+
+    def get_editions(self, dataset_id, db, statistics=False):
+        """
+        The dataset's editions, newest first. Statistics snapshots are
+        only included when asked for.
+        """
+        ed = self.edition_table
+        columns = [
+            column
+            for column in ed.columns
+            if statistics or column.name != "statistics"
+        ]
+        stmt = (
+            select(*columns)
+            .where(ed.c.dataset_id == dataset_id)
+            .order_by(ed.c.publish_date.desc(), ed.c.id.desc())
+        )
+
+        return [row._asdict() for row in db.execute(stmt)]
+
+    def register(self, dataset: dict, variables, keywords, edition: dict, db):
+        """
+        Writes a complete new dataset in a fixed number of statements no
+        matter how many variables or keywords it has: the dataset, every
+        variable, the keyword upsert, the tags and the edition. Nothing is
+        committed here, so the caller decides the transaction.
+        """
+        dataset_id = self.insert_dataset(dataset, db)
+        self.insert_variables(variables, dataset_id, db)
+        kw_ids = self.upsert_keywords(keywords, db)
+        self.tag_dataset(list(kw_ids.values()), dataset_id, db)
+        self.insert_edition(edition, dataset_id, db)
+
+        return dataset_id
+
+    def _insert_or_update(self, table, db):
+        if db.dialect.name == "postgresql":
+            from sqlalchemy.dialects import postgresql
+
+            return postgresql.insert(table)
+        if db.dialect.name == "sqlite":
+            from sqlalchemy.dialects import sqlite
+
+            return sqlite.insert(table)
+        raise NotImplementedError(f"No upsert for {db.dialect.name}.")
+
+    def upsert_keywords(self, kws: list[str], db):
+        """
+        Like insert_new_keywords, but keywords that already exist (including
+        ones another registration created a moment ago) are returned rather
+        than raising, so every keyword's id comes back in one statement.
+        """
+        kws = list(dict.fromkeys(kws))
+        if not kws:
+            return {}
+
+        stmt = self._insert_or_update(self.keyword_table, db).values(
+            [{"content": keyword} for keyword in kws]
+        )
+        # A no-op update rather than DO NOTHING, so existing rows are
+        # still RETURNed.
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self.keyword_table.c.content],
+            set_={"content": stmt.excluded.content},
+        ).returning(self.keyword_table.c.id, self.keyword_table.c.content)
+
+        result = db.execute(stmt)
+
+        return {row.content: row.id for row in result.fetchall()}
 
     def insert_new_keywords(self, kws: list[str], db):
         """
@@ -76,13 +366,54 @@ class MetadataConnection:
 
         return {row.content: row.id for row in result.fetchall()}
 
-    def get_all_keywords(self, db):
-        stmt = select(self.keyword_table.c.id, self.keyword_table.c.content)
+    def get_all_keywords(self, db, since=None, contents=None):
+        """
+        Maps each keyword to its id. `contents` limits the result to the
+        keywords that match one of them ignoring case and surrounding
+        spaces.
+        """
+        kw = self.keyword_table
+        stmt = select(kw.c.id, kw.c.content)
+        if since is not None:
+            stmt = stmt.where(kw.c.updated_at > since)
+        if contents is not None:
+            normalized = {content.strip().lower() for content in contents}
+            stmt = stmt.where(func.lower(func.trim(kw.c.content)).in_(list(normalized)))
         result = db.execute(stmt)
 
         return {row.content: row.id for row in result}
 
+    def get_keyword_usage(self, db):
+        """
+        How many datasets each keyword tags, as {content: count}. Unused
+        keywords are left out.
+        """
+        kw, tags = self.keyword_table, self.tags_table
+        stmt = (
+            select(kw.c.content, func.count())
+            .select_from(tags.join(kw, tags.c.kw_id == kw.c.id))
+            .group_by(kw.c.content)
+        )
+
+        return dict(db.execute(stmt).all())
+
+    def get_dataset_usage(self, db):
+        """
+        How many editions each dataset has, as {table_name: count}.
+        """
+        ds, ed = self.dataset_table, self.edition_table
+        stmt = (
+            select(ds.c.table_name, func.count())
+            .select_from(ed.join(ds, ed.c.dataset_id == ds.c.id))
+            .group_by(ds.c.table_name)
+        )
+
+        return dict(db.execute(stmt).all())
+
     def tag_dataset(self, kw_ids: list[int], ds_id: int, db):
+        if not kw_ids:
+            return
+
         db.execute(
             insert(self.tags_table),
             [
@@ -92,26 +423,294 @@ class MetadataConnection:
         )
 
     def insert_variables(self, variables: list[dict], dataset_id, db):
-        for variable, _ in variables: # Ignore the standard for now
-            variable["dataset_id"] = dataset_id
-            v_insert_stmt = insert(self.variable_table).values(
-                **variable
-            )
-            db.execute(v_insert_stmt)
+        """
+        All the variables go in as a single executemany, which sqlalchemy
+        batches into multi-row INSERTs. Standards are given by name and
+        linked in the same pass; names that aren't registered yet are
+        added (without a pattern) in one upsert.
+        """
+        standard_ids = self.upsert_standard_names(
+            [standard for _, standard in variables if standard], db
+        )
+        rows = [
+            {
+                **variable,
+                "dataset_id": dataset_id,
+                "standard_id": standard_ids.get(standard) if standard else None,
+            }
+            for variable, standard in variables
+        ]
+        if rows:
+            db.execute(insert(self.variable_table), rows)
+
+    def upsert_standard_names(self, names: list[str], db):
+        """
+        {name: id} for the given standard names, adding any that don't
+        exist, in one statement.
+        """
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
 
-            # TODO Lookup and append the standards
+        std = self.standards
+        stmt = self._insert_or_update(std, db).values([{"name": name} for name in names])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[std.c.name],
+            set_={"name": stmt.excluded.name},
+        ).returning(std.c.id, std.c.name)
 
-    def insert_standard(self, standard: dict):
-        pass
+        return {row.name: row.id for row in db.execute(stmt)}
+
+    def insert_standard(self, standard: dict, db):
+        """
+        Adds a standard, or updates the one with the same name, and returns
+        its id. See metadata/standards.py for the fields.
+        """
+        std = self.standards
+        stmt = self._insert_or_update(std, db).values(**standard)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[std.c.name],
+            set_={
+                name: stmt.excluded[name]
+                for name in standard
+                if name != "name"
+            } or {"name": stmt.excluded.name},
+        ).returning(std.c.id)
+
+        return db.execute(stmt).scalar_one()
 
     def get_current_standards(self, db):
         """
-        And another.
+        Every standard with its pattern and codes, as dicts.
+        """
+        std = self.standards
+        stmt = select(
+            std.c.id,
+            std.c.name,
+            std.c.description,
+            std.c.maintainer,
+            std.c.pattern,
+            std.c.codes,
+            std.c.width,
+        ).order_by(std.c.name)
+
+        return [row._asdict() for row in db.execute(stmt)]
+
+    def get_latest_statistics(self, dataset_id, db):
         """
+        The statistics snapshot of the dataset's most recently published
+        edition that has one, or None.
+        """
+        ed = self.edition_table
+        stmt = (
+            select(ed.c.statistics)
+            .where(ed.c.dataset_id == dataset_id, ed.c.statistics.is_not(None))
+            .order_by(ed.c.publish_date.desc(), ed.c.id.desc())
+            .limit(1)
+        )
 
-        return []
+        return db.execute(stmt).scalar_one_or_none()
 
     def insert_edition(self, edition: dict, dataset_id, db):
         edition["dataset_id"] = dataset_id
         e_insert_stmt = insert(self.edition_table).values(**edition)
         db.execute(e_insert_stmt)
+
+    def insert_editions(self, editions: list[dict], db):
+        """
+        Editions of any number of datasets (each with its dataset_id) as one
+        executemany.
+        """
+        if editions:
+            db.execute(insert(self.edition_table), editions)
+
+    def insert_project(self, project: dict, db):
+        """
+        Adds a project, or updates the one with the same project_name, and
+        returns its id.
+        """
+        pr = self.project_table
+        stmt = self._insert_or_update(pr, db).values(**project)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[pr.c.project_name],
+            set_={
+                name: stmt.excluded[name]
+                for name in project
+                if name != "project_name"
+            } or {"project_name": stmt.excluded.project_name},
+        ).returning(pr.c.id)
+
+        return db.execute(stmt).scalar_one()
+
+    def insert_usages(self, usages: list[dict], db):
+        """
+        Records that projects use datasets, as dicts of dataset_id,
+        project_id and an optional description, in one statement. Usages
+        that are already recorded get the new description.
+        """
+        if not usages:
+            return
+
+        us = self.usage_table
+        stmt = self._insert_or_update(us, db)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[us.c.dataset_id, us.c.project_id],
+            set_={"description": stmt.excluded.description},
+        )
+        db.execute(stmt, [{"description": None, **usage} for usage in usages])
+
+    def add_derivations(self, derivations: list[tuple], db):
+        """
+        Records that datasets are derived from others, as (parent_id,
+        child_id) or (parent_id, child_id, description) tuples, and extends
+        the lineage closure to match.
+
+        Each new edge connects everything upstream of the parent (and the
+        parent) to everything downstream of the child (and the child): pairs
+        that were already connected get the shorter depth, and the rest are
+        inserted, each in one statement, so the cost is the number of pairs
+        the edge connects rather than the size of the graph. The statements
+        are built once with bind parameters, so they're only compiled once
+        however many edges there are. Edges already recorded are skipped.
+        An edge that would make a cycle raises ValueError before anything of
+        it is written.
+        """
+        dv, ln = self.derivation_table, self.lineage_table
+        parent, child = bindparam("parent_id", type_=Integer), bindparam("child_id", type_=Integer)
+
+        recorded = select(dv.c.parent_id).where(dv.c.parent_id == parent, dv.c.child_id == child)
+        cycle = select(ln.c.depth).where(ln.c.ancestor_id == child, ln.c.descendant_id == parent)
+
+        upstream = union_all(
+            select(ln.c.ancestor_id.label("id"), ln.c.depth).where(ln.c.descendant_id == parent),
+            select(parent.label("id"), literal(0).label("depth")),
+        ).subquery("upstream")
+        downstream = union_all(
+            select(ln.c.descendant_id.label("id"), ln.c.depth).where(ln.c.ancestor_id == child),
+            select(child.label("id"), literal(0).label("depth")),
+        ).subquery("downstream")
+
+        through_edge = (
+            select(upstream.c.depth).where(upstream.c.id == ln.c.ancestor_id).scalar_subquery()
+            + select(downstream.c.depth).where(downstream.c.id == ln.c.descendant_id).scalar_subquery()
+            + 1
+        )
+        shorten = (
+            update(ln)
+            .where(
+                ln.c.ancestor_id.in_(select(upstream.c.id)),
+                ln.c.descendant_id.in_(select(downstream.c.id)),
+                through_edge < ln.c.depth,
+            )
+            .values(depth=through_edge)
+        )
+
+        existing = ln.alias("existing")
+        connect = insert(ln).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(upstream.c.id, downstream.c.id, upstream.c.depth + downstream.c.depth + 1)
+            .select_from(upstream.join(downstream, true()))
+            .where(
+                ~exists().where(
+                    existing.c.ancestor_id == upstream.c.id,
+                    existing.c.descendant_id == downstream.c.id,
+                )
+            ),
+        )
+
+        for parent_id, child_id, *description in derivations:
+            edge = {"parent_id": parent_id, "child_id": child_id}
+            if parent_id == child_id or db.execute(cycle, edge).first():
+                raise ValueError(
+                    f"Deriving dataset {child_id} from {parent_id} would make a cycle: "
+                    f"{parent_id} already derives from {child_id}."
+                )
+            if db.execute(recorded, edge).first():
+                continue
+
+            db.execute(insert(dv), {**edge, "description": (description or [None])[0]})
+            db.execute(shorten, edge)
+            db.execute(connect, edge)
+
+    def rebuild_lineage(self, db):
+        """
+        Recomputes the lineage closure from derivations with one recursive
+        query, for after derivations are deleted or edited by hand.
+        """
+        dv, ln = self.derivation_table, self.lineage_table
+
+        paths = select(
+            dv.c.parent_id.label("ancestor_id"),
+            dv.c.child_id.label("descendant_id"),
+            literal(1).label("depth"),
+        ).cte("paths", recursive=True)
+        paths = paths.union(
+            select(paths.c.ancestor_id, dv.c.child_id, paths.c.depth + 1).join(
+                dv, dv.c.parent_id == paths.c.descendant_id
+            )
+        )
+        shortest = select(
+            paths.c.ancestor_id, paths.c.descendant_id, func.min(paths.c.depth)
+        ).group_by(paths.c.ancestor_id, paths.c.descendant_id)
+
+        db.execute(ln.delete())
+        db.execute(insert(ln).from_select(["ancestor_id", "descendant_id", "depth"], shortest))
+
+    def _related(self, dataset_id, db, upstream):
+        ds, ln = self.dataset_table, self.lineage_table
+        this, other = (
+            (ln.c.descendant_id, ln.c.ancestor_id) if upstream else (ln.c.ancestor_id, ln.c.descendant_id)
+        )
+        stmt = (
+            select(ds.c.id, ds.c.table_name, ln.c.depth)
+            .join(ln, other == ds.c.id)
+            .where(this == dataset_id)
+            .order_by(ln.c.depth, ds.c.table_name)
+        )
+
+        return [row._asdict() for row in db.execute(stmt)]
+
+    def get_upstream(self, dataset_id, db):
+        """
+        Every dataset the given one is derived from, directly (depth 1) or
+        not, as dicts of id, table_name and depth, nearest first.
+        """
+        return self._related(dataset_id, db, upstream=True)
+
+    def get_downstream(self, dataset_id, db):
+        """
+        Every dataset derived from the given one, like get_upstream.
+        """
+        return self._related(dataset_id, db, upstream=False)
+
+    def get_affected_projects(self, dataset_id, db):
+        """
+        The projects that use the dataset or anything derived from it, as
+        dicts of project_id, project_name and the nearest dataset it uses
+        (table_name, with its depth; 0 is the dataset itself).
+        """
+        ds, ln, us, pr = self.dataset_table, self.lineage_table, self.usage_table, self.project_table
+        reach = union_all(
+            select(ln.c.descendant_id.label("id"), ln.c.depth).where(ln.c.ancestor_id == dataset_id),
+            select(literal(dataset_id).label("id"), literal(0).label("depth")),
+        ).subquery()
+
+        stmt = (
+            select(
+                pr.c.id.label("project_id"),
+                pr.c.project_name,
+                ds.c.table_name,
+                reach.c.depth,
+            )
+            .select_from(
+                reach.join(us, us.c.dataset_id == reach.c.id)
+                .join(pr, pr.c.id == us.c.project_id)
+                .join(ds, ds.c.id == us.c.dataset_id)
+            )
+            .order_by(pr.c.project_name, reach.c.depth, ds.c.table_name)
+        )
+
+        nearest = {}
+        for row in db.execute(stmt):
+            nearest.setdefault(row.project_id, row._asdict())
+        return list(nearest.values())
@@ -0,0 +1,237 @@
+"""
+A read-only HTTP API over the catalog, so dashboards and ETL jobs can look
+things up without each holding database connections.
+
+    GET /version
+    GET /datasets                             name -> {id, variables}
+    GET /datasets/<name>
+    GET /datasets/<name>/variables
+    GET /datasets/<name>/editions[?statistics=true]
+    GET /search/<datasets|variables|keywords|standards>?q=...[&limit=20&offset=0]
+
+Every response is JSON and carries an ETag made from the catalog version
+(MetadataConnection.get_catalog_version) and the request, so a client that
+sends it back as If-None-Match gets a 304 without the database being
+asked anything. Responses are also kept in an LRU cache until the version
+moves on or they're older than `ttl`, and the version itself is re-read
+at most once every `version_ttl` seconds, so a burst of lookups costs one
+small query plus one per distinct request.
+
+CatalogAPI is a plain WSGI app: `metadata serve` runs it on wsgiref's
+threaded server, and anything that hosts WSGI (gunicorn, waitress) can run
+it in production. Database connections come from the engine's pool, whose
+size is set in config.toml ([db] pool_size / max_overflow).
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import parse_qs, unquote
+
+from .search import MetadataSearch
+
+
+MAX_LIMIT = 200
+SEARCHES = {"datasets", "variables", "keywords", "standards"}
+
+STATUS = {
+    200: "200 OK",
+    304: "304 Not Modified",
+    400: "400 Bad Request",
+    404: "404 Not Found",
+    405: "405 Method Not Allowed",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        self.status = status
+        self.message = message
+        super().__init__(message)
+
+
+class TTLCache:
+    """
+    An LRU cache whose entries also expire `ttl` seconds after they're
+    stored. Safe to share between the server's threads.
+    """
+
+    def __init__(self, maxsize=4096, ttl=300.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.clock() - stored_at > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (self.clock(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Can't serialize {type(value).__name__}.")
+
+
+def _flag(query, name):
+    return query.get(name, [""])[0].lower() in {"1", "true", "yes"}
+
+
+def _int(query, name, default, maximum=None):
+    raw = query.get(name, [None])[0]
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise HTTPError(400, f"'{name}' must be a whole number.")
+    if value < 0:
+        raise HTTPError(400, f"'{name}' can't be negative.")
+    return min(value, maximum) if maximum is not None else value
+
+
+class CatalogAPI:
+    def __init__(self, md, ttl=300.0, version_ttl=1.0, maxsize=4096, clock=time.monotonic):
+        self.md = md
+        self.search = MetadataSearch(md)
+        self.cache = TTLCache(maxsize, ttl, clock)
+        self.version_ttl = version_ttl
+        self.clock = clock
+
+        self._version = None
+        self._version_read_at = None
+        self._version_lock = threading.Lock()
+
+    def version(self):
+        with self._version_lock:
+            now = self.clock()
+            if self._version is None or now - self._version_read_at > self.version_ttl:
+                with self.md.db_engine.connect() as db:
+                    version = self.md.get_catalog_version(db)
+                if version != self._version:
+                    # Local search indexes (sqlite) were built from the old catalog.
+                    self.search.refresh()
+                self._version, self._version_read_at = version, now
+            return self._version
+
+    def route(self, path, query, db):
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+
+        if parts == ["version"]:
+            return {"version": self.version()}
+
+        if parts == ["datasets"]:
+            return {
+                name: {"id": id, "variables": variables}
+                for name, (id, variables) in self.md.get_available_datasets(db).items()
+            }
+
+        if len(parts) in {2, 3} and parts[0] == "datasets":
+            dataset = self.md.get_dataset(parts[1], db)
+            if dataset is None:
+                raise HTTPError(404, f"There's no dataset named '{parts[1]}'.")
+            if len(parts) == 2:
+                return dataset
+            if parts[2] == "variables":
+                return self.md.get_variables(dataset["id"], db)
+            if parts[2] == "editions":
+                return self.md.get_editions(
+                    dataset["id"], db, statistics=_flag(query, "statistics")
+                )
+
+        if len(parts) == 2 and parts[0] == "search" and parts[1] in SEARCHES:
+            text = query.get("q", [""])[0].strip()
+            if not text:
+                raise HTTPError(400, "Searches need a 'q'.")
+            search = getattr(self.search, f"search_{parts[1]}")
+            return search(
+                text,
+                db,
+                limit=_int(query, "limit", 20, MAX_LIMIT),
+                offset=_int(query, "offset", 0),
+            )
+
+        raise HTTPError(404, f"Nothing at '{path}'.")
+
+    def respond(self, method, path, query_string, if_none_match=None):
+        """
+        (status, headers, body) for one request, without any WSGI around
+        it.
+        """
+        if method not in {"GET", "HEAD"}:
+            return self._error(405, "This API is read-only.")
+
+        query = parse_qs(query_string)
+        key = (path, tuple(sorted((name, tuple(values)) for name, values in query.items())))
+
+        version = self.version()
+        etag = '"{}"'.format(hashlib.sha1(f"{version}{key}".encode()).hexdigest()[:20])
+        headers = [("ETag", etag), ("Cache-Control", "no-cache")]
+
+        if if_none_match and etag in {tag.strip() for tag in if_none_match.split(",")}:
+            return 304, headers, b""
+
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == version:
+            body = cached[1]
+        else:
+            try:
+                with self.md.db_engine.connect() as db:
+                    result = self.route(path, query, db)
+            except HTTPError as e:
+                return self._error(e.status, e.message)
+            body = json.dumps(result, default=_json_default).encode()
+            self.cache.set(key, (version, body))
+
+        return 200, headers + [("Content-Type", "application/json")], body
+
+    def _error(self, status, message):
+        body = json.dumps({"error": message}).encode()
+        return status, [("Content-Type", "application/json")], body
+
+    def __call__(self, environ, start_response):
+        status, headers, body = self.respond(
+            environ["REQUEST_METHOD"],
+            environ.get("PATH_INFO", "/"),
+            environ.get("QUERY_STRING", ""),
+            environ.get("HTTP_IF_NONE_MATCH"),
+        )
+        start_response(STATUS[status], headers + [("Content-Length", str(len(body)))])
+        return [] if environ["REQUEST_METHOD"] == "HEAD" else [body]
+
+
+def serve(app, host="127.0.0.1", port=8000):
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIServer, make_server
+
+    class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+
+    with make_server(host, port, app, server_class=ThreadingWSGIServer) as server:
+        server.serve_forever()
@@ -4,6 +4,23 @@ import logging
 import logging.config
 
 
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One JSON object per record, for the metrics log. Records logged with
+    extra={"metrics": {...}} have that dict merged in.
+    """
+
+    def format(self, record):
+        line = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "metrics", {}),
+        }
+        return json.dumps(line, default=str)
+
+
 def setup_logging():
     with open(Path.cwd() / "logging_config.json") as f:
         logging_config = json.load(f)
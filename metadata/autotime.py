@@ -0,0 +1,331 @@
+"""
+Autotime: what stretch of time each dataset covers, at what resolution.
+
+A dataset's coverage comes from its editions. Each edition's
+collection_start to collection_end is widened to whole periods of the
+dataset's cadence (an annual dataset collected from March to May covers
+that year), and the periods are merged into contiguous intervals. Whatever
+falls between two intervals is a gap: periods the cadence says should be
+there and no edition covers. Datasets with no cadence ('none') keep their
+editions' exact dates.
+
+Coverage is looked up by frame type (the dataset's unit of analysis,
+normalized: "Census Tract" and "census tract" are the same frame) and a
+date range. On postgres the intervals live in the coverage table, whose
+generated daterange column has a GiST index with the frame type, and
+triggers on editions and datasets keep it up to date with the same rules
+in SQL (0012_DOCS_autotime.sql, 0015_DOCS_autotime_moved_editions.sql;
+the GiST index needs the btree_gist extension, see 0015). Summaries are
+read from the autotime table there. On any other backend (the local
+replica, tests) an IntervalTree per frame type is built from the editions
+on first use and kept until refresh() is called, and summaries are
+computed from the editions.
+"""
+
+import calendar
+import re
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import select, func, literal
+
+
+DAY = timedelta(days=1)
+
+# Months per period for each cadence; `none` keeps edition dates as they are.
+PERIOD_MONTHS = {"month": 1, "quarter": 3, "year": 12}
+RESOLUTIONS = set(PERIOD_MONTHS) | {"none"}
+
+
+def frame_type(unit_of_analysis):
+    if not unit_of_analysis:
+        return None
+    frame = " ".join(str(unit_of_analysis).lower().split())
+    return re.sub(r"[ -]level$", "", frame) or None
+
+
+def period_start(day: date, cadence):
+    months = PERIOD_MONTHS.get(cadence)
+    if months is None:
+        return day
+    month = (day.month - 1) // months * months + 1
+    return date(day.year, month, 1)
+
+
+def period_end(day: date, cadence):
+    months = PERIOD_MONTHS.get(cadence)
+    if months is None:
+        return day
+    month = (day.month - 1) // months * months + months
+    return date(day.year, month, calendar.monthrange(day.year, month)[1])
+
+
+def period_label(day: date, cadence):
+    if cadence == "year":
+        return f"{day.year}"
+    if cadence == "quarter":
+        return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+    if cadence == "month":
+        return f"{day.year}-{day.month:02}"
+    return day.isoformat()
+
+
+def parse_period(text):
+    """
+    The first and last day of "2019", "2019-Q3", "2019-07" or "2019-07-15".
+    """
+    text = text.strip().upper()
+    if m := re.fullmatch(r"(\d{4})", text):
+        cadence, day = "year", date(int(m[1]), 1, 1)
+    elif m := re.fullmatch(r"(\d{4})-?Q([1-4])", text):
+        cadence, day = "quarter", date(int(m[1]), int(m[2]) * 3 - 2, 1)
+    elif m := re.fullmatch(r"(\d{4})-(\d{1,2})", text):
+        cadence, day = "month", date(int(m[1]), int(m[2]), 1)
+    else:
+        day = date.fromisoformat(text)
+        return day, day
+    return period_start(day, cadence), period_end(day, cadence)
+
+
+def coverage(editions, cadence):
+    """
+    The sorted, merged [start, end] intervals covered by `editions`, pairs
+    of collection_start and collection_end (either may be None).
+    """
+    spans = []
+    for start, end in editions:
+        start, end = start or end, end or start
+        if start is None:
+            continue
+        if end < start:
+            start, end = end, start
+        spans.append((period_start(start, cadence), period_end(end, cadence)))
+
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1] + DAY:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def gaps(intervals):
+    """
+    The [start, end] stretches between merged intervals.
+    """
+    return [(a_end + DAY, b_start - DAY) for (_, a_end), (b_start, _) in zip(intervals, intervals[1:])]
+
+
+def describe_gaps(found, cadence):
+    return ", ".join(
+        period_label(start, cadence)
+        if period_start(start, cadence) == period_start(end, cadence)
+        else f"{period_label(start, cadence)} to {period_label(end, cadence)}"
+        for start, end in found
+    )
+
+
+def dataset_coverage(datasets, editions):
+    """
+    Autotime rows and coverage intervals for `datasets` (rows with id,
+    unit_of_analysis and cadence) from `editions` (rows with dataset_id,
+    collection_start and collection_end).
+    """
+    by_dataset = defaultdict(list)
+    for row in editions:
+        by_dataset[row.dataset_id].append((row.collection_start, row.collection_end))
+
+    summaries, intervals = [], []
+    for row in datasets:
+        cadence = row.cadence if row.cadence in PERIOD_MONTHS else "none"
+        covered = coverage(by_dataset[row.id], cadence)
+        frame = frame_type(row.unit_of_analysis)
+        summaries.append(
+            {
+                "dataset_id": row.id,
+                "frame_type": frame,
+                "resolution": cadence,
+                "available_from": covered[0][0] if covered else None,
+                "available_to": covered[-1][1] if covered else None,
+                "gaps": [[start.isoformat(), end.isoformat()] for start, end in gaps(covered)],
+            }
+        )
+        intervals.extend(
+            {"dataset_id": row.id, "frame_type": frame, "period_start": start, "period_end": end}
+            for start, end in covered
+        )
+
+    return summaries, intervals
+
+
+class IntervalTree:
+    """
+    Static intervals sorted by start, searched as an implicit balanced
+    tree: each node is the middle of its slice and knows the latest end
+    in it, so whole subtrees that end too early are skipped.
+    """
+
+    def __init__(self, intervals):
+        intervals = sorted(intervals, key=lambda interval: interval[0])
+        self.starts = [start for start, _, _ in intervals]
+        self.ends = [end for _, end, _ in intervals]
+        self.payloads = [payload for _, _, payload in intervals]
+        self.max_end = [None] * len(intervals)
+        self._build(0, len(intervals))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        latest = self.ends[mid]
+        for child in (self._build(lo, mid), self._build(mid + 1, hi)):
+            if child is not None and child > latest:
+                latest = child
+        self.max_end[mid] = latest
+        return latest
+
+    def search(self, start_by, end_by):
+        """
+        Payloads of the intervals that start on or before `start_by` and
+        end on or after `end_by`.
+        """
+        found = []
+        stack = [(0, len(self.starts))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self.max_end[mid] < end_by:
+                continue
+            stack.append((lo, mid))
+            # Otherwise everything to the right starts too late as well.
+            if self.starts[mid] <= start_by:
+                if self.ends[mid] >= end_by:
+                    found.append(self.payloads[mid])
+                stack.append((mid + 1, hi))
+        return found
+
+
+class Autotime:
+    def __init__(self, md):
+        self.md = md
+        self._trees = None
+
+    def refresh(self):
+        self._trees = None
+
+    def covering(self, frame, start: date, end: date, db, partial=False):
+        """
+        Datasets of the given frame type whose coverage includes all of
+        start to end (or any of it, with `partial`), as dicts of id and
+        table_name ordered by name.
+        """
+        frame = frame_type(frame)
+        if db.dialect.name != "postgresql":
+            return self._covering_local(frame, start, end, db, partial)
+
+        ds, cov = self.md.dataset_table, self.md.coverage_table
+        wanted = func.daterange(start, end, literal("[]"))
+        stmt = (
+            select(ds.c.id, ds.c.table_name)
+            .select_from(cov.join(ds, ds.c.id == cov.c.dataset_id))
+            .where(
+                cov.c.frame_type == frame,
+                cov.c.period.op("&&" if partial else "@>")(wanted),
+            )
+            .distinct()
+            .order_by(ds.c.table_name)
+        )
+
+        return [row._asdict() for row in db.execute(stmt)]
+
+    def _covering_local(self, frame, start, end, db, partial):
+        if self._trees is None:
+            self._trees = self._build_trees(db)
+        tree = self._trees.get(frame)
+        if tree is None:
+            return []
+
+        found = tree.search(end, start) if partial else tree.search(start, end)
+        return [
+            {"id": dataset_id, "table_name": table_name}
+            for dataset_id, table_name in sorted(set(found), key=lambda payload: payload[1])
+        ]
+
+    def _build_trees(self, db):
+        ds, ed = self.md.dataset_table, self.md.edition_table
+        datasets = db.execute(
+            select(ds.c.id, ds.c.table_name, ds.c.unit_of_analysis, ds.c.cadence)
+        ).all()
+        editions = db.execute(select(ed.c.dataset_id, ed.c.collection_start, ed.c.collection_end))
+        _, intervals = dataset_coverage(datasets, editions)
+
+        names = {row.id: row.table_name for row in datasets}
+        by_frame = defaultdict(list)
+        for interval in intervals:
+            by_frame[interval["frame_type"]].append(
+                (
+                    interval["period_start"],
+                    interval["period_end"],
+                    (interval["dataset_id"], names[interval["dataset_id"]]),
+                )
+            )
+
+        return {frame: IntervalTree(found) for frame, found in by_frame.items()}
+
+    def summary(self, dataset_id, db):
+        """
+        The dataset's autotime row (frame_type, resolution, available_from,
+        available_to, gaps) plus its coverage intervals, or None. Read from
+        the autotime and coverage tables on postgres, computed from the
+        editions elsewhere.
+        """
+        if db.dialect.name == "postgresql":
+            return self._stored_summary(dataset_id, db)
+
+        ds, ed = self.md.dataset_table, self.md.edition_table
+        datasets = db.execute(
+            select(ds.c.id, ds.c.unit_of_analysis, ds.c.cadence).where(ds.c.id == dataset_id)
+        ).all()
+        if not datasets:
+            return None
+        editions = db.execute(
+            select(ed.c.dataset_id, ed.c.collection_start, ed.c.collection_end).where(
+                ed.c.dataset_id == dataset_id
+            )
+        )
+
+        summaries, intervals = dataset_coverage(datasets, editions)
+        return {
+            **summaries[0],
+            "gaps": [(date.fromisoformat(a), date.fromisoformat(b)) for a, b in summaries[0]["gaps"]],
+            "intervals": [(row["period_start"], row["period_end"]) for row in intervals],
+        }
+
+    def _stored_summary(self, dataset_id, db):
+        at, cov = self.md.autotime_table, self.md.coverage_table
+        row = db.execute(
+            select(
+                at.c.frame_type, at.c.resolution, at.c.available_from, at.c.available_to, at.c.gaps
+            ).where(at.c.dataset_id == dataset_id)
+        ).first()
+        if row is None:
+            return None
+        intervals = db.execute(
+            select(cov.c.period_start, cov.c.period_end)
+            .where(cov.c.dataset_id == dataset_id)
+            .order_by(cov.c.period_start)
+        ).all()
+
+        return {
+            "dataset_id": dataset_id,
+            **row._asdict(),
+            "gaps": [(date.fromisoformat(a), date.fromisoformat(b)) for a, b in row.gaps or []],
+            "intervals": [tuple(interval) for interval in intervals],
+        }
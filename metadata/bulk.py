@@ -0,0 +1,434 @@
+"""
+Non-interactive registration from spec files, for backfills.
+
+A spec holds the same fields the prompts in capture.py collect. A new
+dataset looks like this (TOML shown; YAML and JSON take the same shape):
+
+    file = "tracts_2020.csv"        # optional, relative to the spec
+
+    [dataset]
+    table_name = "acs_tracts"
+    description = "..."
+    cadence = "year"
+    keywords = ["census", "tracts"]
+    ...
+
+    [[variables]]
+    variable_name = "geoid"
+    data_type = "string"
+    ...
+
+    [edition]
+    publish_date = 2021-03-01
+    collection_start = 2020-01-01
+    ...
+
+A new edition of a dataset that's already registered replaces the
+[dataset] table and [[variables]] with `dataset_name = "acs_tracts"`.
+
+When `file` is given, its columns are checked against the variables, its
+profile is stored with them, and num_records defaults to its row count.
+An edition whose file is byte for byte one the dataset already has (see
+metadata/digest.py) isn't registered again.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import tomli
+from returns.result import Success, Failure
+
+from .fingerprint import column_diff, describe_diff
+from .instrument import span
+from .validation import (
+    validate_date,
+    validate_keyword,
+    validate_cadence,
+    validate_data_type,
+    validate_suppression_threshold,
+)
+
+
+SPEC_SUFFIXES = {".toml", ".json", ".yaml", ".yml"}
+
+DATASET_FIELDS = [
+    "table_name",
+    "description",
+    "unit_of_analysis",
+    "universe",
+    "owner",
+    "collector",
+    "collection_method",
+    "collection_reason",
+    "source_url",
+    "notes",
+    "use_conditions",
+    "cadence",
+]
+
+VARIABLE_FIELDS = [
+    "variable_name",
+    "description",
+    "data_type",
+    "parent_variable",
+    "suppression_threshold",
+]
+
+EDITION_DATES = [
+    "publish_date",
+    "collection_start",
+    "collection_end",
+    "acquisition_date",
+]
+
+
+class SpecError(ValueError):
+    """
+    A spec file that can't be registered. `problems` lists everything
+    wrong with it, not just the first thing.
+    """
+
+    def __init__(self, path, problems):
+        self.path = path
+        self.problems = problems
+        super().__init__(f"{path}: " + "; ".join(problems))
+
+
+def load_spec(path):
+    path = Path(path)
+    suffix = path.suffix.lower()
+
+    if suffix == ".toml":
+        with open(path, "rb") as f:
+            return tomli.load(f)
+    if suffix == ".json":
+        return json.loads(path.read_text())
+    if suffix in {".yaml", ".yml"}:
+        try:
+            import yaml
+        except ImportError as e:
+            raise ImportError("YAML specs need PyYAML (the 'yaml' extra) installed.") from e
+        return yaml.safe_load(path.read_text())
+
+    raise SpecError(path, [f"'{suffix}' isn't a spec format ({', '.join(sorted(SPEC_SUFFIXES))})."])
+
+
+def find_specs(paths):
+    """
+    Expands directories into the spec files directly inside them.
+    """
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(
+                child for child in path.iterdir() if child.suffix.lower() in SPEC_SUFFIXES
+            )
+        else:
+            yield path
+
+
+def _as_date(value):
+    if isinstance(value, date):
+        return value
+    from dateutil.parser import parse as parse_date
+
+    return parse_date(str(value)).date()
+
+
+def parse_spec(spec: dict, path, topic, source=None, standards=None):
+    """
+    Validates a loaded spec and returns it in the shapes the interactive
+    workflow produces. `source` (anything open_source takes) stands in for
+    the spec's `file`, for callers that already have the data. With a
+    StandardMatcher as `standards`, variables that don't name a standard
+    get the one their column matches, if any:
+
+        {
+            "dataset_name": str,
+            "dataset": dict or None (None for an edition of an existing dataset),
+            "variables": [(variable dict, standard), ...],
+            "keywords": [str, ...],
+            "edition": dict,
+            "fingerprint": str or None,
+            "columns": [str, ...] or None (None without a file),
+        }
+
+    Raises SpecError listing every problem found.
+    """
+    problems = []
+    dataset_spec = spec.get("dataset")
+    existing_name = spec.get("dataset_name")
+
+    if (dataset_spec is None) == (existing_name is None):
+        raise SpecError(
+            path, ["Give either a [dataset] table or a 'dataset_name', not both or neither."]
+        )
+
+    dataset = None
+    keywords = []
+    variables = []
+
+    if dataset_spec is not None:
+        unknown = set(dataset_spec) - set(DATASET_FIELDS) - {"keywords"}
+        if unknown:
+            problems.append(f"Unknown dataset fields: {', '.join(sorted(unknown))}")
+        if not dataset_spec.get("table_name"):
+            problems.append("The dataset needs a table_name.")
+        if not validate_cadence(dataset_spec.get("cadence")):
+            problems.append("The cadence must be one of 'month', 'quarter', 'year', or 'none'.")
+
+        keywords = list(dataset_spec.get("keywords", []))
+        problems.extend(
+            f"Keyword '{keyword}' must be longer than three characters."
+            for keyword in keywords
+            if not validate_keyword(keyword)
+        )
+
+        dataset = {field: dataset_spec.get(field) for field in DATASET_FIELDS}
+        dataset["topic"] = topic
+
+        names = [variable.get("variable_name") for variable in spec.get("variables", [])]
+        if not names:
+            problems.append("A new dataset needs at least one [[variables]] entry.")
+        if len(set(names)) != len(names):
+            problems.append("Variable names must be unique.")
+
+        for variable in spec.get("variables", []):
+            name = variable.get("variable_name")
+            unknown = set(variable) - set(VARIABLE_FIELDS) - {"standard"}
+            if unknown:
+                problems.append(f"Unknown fields on '{name}': {', '.join(sorted(unknown))}")
+            if not validate_data_type(variable.get("data_type")):
+                problems.append(f"'{name}' needs a data_type of numeric, string or date.")
+            parent = variable.get("parent_variable")
+            if parent is not None and (parent not in names or parent == name):
+                problems.append(f"The parent of '{name}' must be another variable.")
+            threshold = variable.get("suppression_threshold")
+            if threshold is not None and not validate_suppression_threshold(threshold):
+                problems.append(f"The suppression threshold of '{name}' must be numeric.")
+
+            variables.append(
+                (
+                    {field: variable.get(field) for field in VARIABLE_FIELDS},
+                    variable.get("standard"),
+                )
+            )
+
+    edition_spec = spec.get("edition") or {}
+    for field in EDITION_DATES:
+        if not validate_date(edition_spec.get(field)):
+            problems.append(f"The edition's {field} must be a date.")
+
+    fingerprint = None
+    statistics = None
+    columns = None
+    content = {"content_digest": None, "content_size": None}
+    num_records = edition_spec.get("num_records")
+    if source is not None or spec.get("file"):
+        if source is not None:
+            checked = _check_source(source, variables, num_records, standards)
+        else:
+            checked = _check_file(
+                Path(path).parent / spec["file"], variables, num_records, standards
+            )
+        file_problems, num_records, fingerprint, statistics, content, columns = checked
+        problems.extend(file_problems)
+    if num_records is None:
+        problems.append("The edition needs num_records (or a 'file' to count).")
+
+    if problems:
+        raise SpecError(path, problems)
+
+    edition = {
+        "num_records": num_records,
+        "notes": edition_spec.get("notes", ""),
+        "statistics": statistics,
+        **content,
+        **{field: _as_date(edition_spec[field]) for field in EDITION_DATES},
+    }
+    if dataset is not None:
+        dataset["schema_fingerprint"] = fingerprint
+
+    return {
+        "dataset_name": dataset["table_name"] if dataset else existing_name,
+        "dataset": dataset,
+        "variables": variables,
+        "keywords": keywords,
+        "edition": edition,
+        "fingerprint": fingerprint,
+        "columns": columns,
+    }
+
+
+def check_columns(dataset_name, expected, columns):
+    """
+    Raises SpecError if an edition's file (`columns`, None when there's no
+    file) doesn't have exactly the registered dataset's columns.
+    """
+    if columns is None:
+        return
+    missing, extra = column_diff(expected, columns)
+    if missing or extra:
+        raise SpecError(
+            dataset_name,
+            [f"The file's columns don't match the dataset's. {describe_diff(missing, extra)}".replace("\n", "; ")],
+        )
+
+
+def _check_file(path, variables, num_records, standards=None):
+    if not path.exists():
+        return [f"The file '{path}' doesn't exist."], num_records, None, None, {}, None
+
+    return _check_source(path, variables, num_records, standards)
+
+
+def _check_source(source, variables, num_records, standards=None):
+    """
+    Checks the spec's variables against the data, attaching each column's
+    profile (and any standard they match) along the way, and takes the
+    edition's statistics snapshot and, for a file, its content digest.
+    """
+    from .digest import content_digest
+    from .sources import open_source
+    from .profile import column_profile
+    from .fingerprint import source_fingerprint
+    from .drift import edition_snapshot
+
+    content = {"content_digest": None, "content_size": None}
+    if isinstance(source, (str, Path)):
+        content = content_digest(source)
+
+    source = open_source(source)
+    problems = []
+
+    if variables:
+        missing, extra = column_diff(
+            [variable["variable_name"] for variable, _ in variables], source.columns
+        )
+        if missing or extra:
+            problems.append(describe_diff(missing, extra).replace("\n", "; "))
+        else:
+            profile = source.profile()
+            for variable, _ in variables:
+                variable["profile"] = column_profile(profile, variable["variable_name"])
+
+            if standards is not None:
+                matches = standards.match(source.sample())
+                for i, (variable, standard) in enumerate(variables):
+                    found = matches.get(variable["variable_name"])
+                    # Nobody's there to choose between several.
+                    if standard is None and found and len(found) == 1:
+                        variables[i] = (variable, found[0][0])
+
+    if num_records is None:
+        num_records = source.num_records
+
+    return (
+        problems,
+        num_records,
+        source_fingerprint(source),
+        edition_snapshot(source),
+        content,
+        list(source.columns),
+    )
+
+
+class BulkRegistrar:
+    """
+    Registers many specs concurrently. Each spec is parsed, validated and
+    written in its own transaction on a worker thread, and all workers
+    share the engine's connection pool, so `workers` shouldn't exceed the
+    pool's size plus overflow (15 for the default engine).
+    """
+
+    def __init__(self, md, topic, workers=8, standards=None):
+        self.md = md
+        self.topic = topic
+        self.workers = workers
+        # A StandardMatcher; run() loads one from the catalog.
+        self.standards = standards
+
+    def register(self, registration, db):
+        """
+        The dataset's id, or None if the spec's file is already an edition
+        of it.
+        """
+        if registration["dataset"] is None:
+            name = registration["dataset_name"]
+            existing = self.md.get_available_datasets(db, names=[name])
+            if name not in existing:
+                raise SpecError(name, ["There's no registered dataset by this name."])
+            dataset_id, columns = existing[name]
+            check_columns(name, columns, registration["columns"])
+
+            digest = registration["edition"]["content_digest"]
+            if digest and self.md.find_edition_by_digest(digest, db, name):
+                return None
+            if registration["fingerprint"]:
+                self.md.set_schema_fingerprint(dataset_id, registration["fingerprint"], db)
+            self.md.insert_edition(registration["edition"], dataset_id, db)
+            return dataset_id
+
+        return self.md.register(
+            registration["dataset"],
+            registration["variables"],
+            registration["keywords"],
+            registration["edition"],
+            db,
+        )
+
+    def register_path(self, path, spec=None):
+        """
+        Success(dataset_id) (Success(None) when there was no new edition
+        to register) or Failure(exception) for one spec file. `spec` is
+        the file already loaded (or the exception loading it raised).
+        """
+        try:
+            if spec is None:
+                spec = load_spec(path)
+            if isinstance(spec, Exception):
+                raise spec
+            with span("bulk.parse", spec=str(path)):
+                registration = parse_spec(spec, path, self.topic, standards=self.standards)
+            with span("bulk.commit", spec=str(path)), self.md.db_engine.begin() as db:
+                return Success(self.register(registration, db))
+        except Exception as e:
+            # One bad spec, whatever's wrong with it, doesn't stop the rest.
+            return Failure(e)
+
+    def run(self, paths):
+        """
+        Returns [(path, Result), ...] in the order the paths were given.
+        Specs for new datasets are all registered before any editions, so
+        a backfill can carry a dataset and its later editions together.
+        """
+        paths = list(find_specs(paths))
+        specs = {path: _load(path) for path in paths}
+        results = {}
+
+        if self.standards is None:
+            from .standards import StandardMatcher
+
+            with self.md.db_engine.connect() as db:
+                self.standards = StandardMatcher(self.md.get_current_standards(db))
+
+        new = {path for path, spec in specs.items() if _is_new_dataset(spec)}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for batch in ([path for path in paths if path in new], [path for path in paths if path not in new]):
+                results.update(zip(batch, pool.map(self.register_path, batch, [specs[path] for path in batch])))
+
+        return [(path, results[path]) for path in paths]
+
+
+def _load(path):
+    try:
+        return load_spec(path)
+    except Exception as e:
+        # register_path reports it.
+        return e
+
+
+def _is_new_dataset(spec):
+    # A spec that didn't load goes first, to be reported.
+    return not isinstance(spec, dict) or "dataset" in spec
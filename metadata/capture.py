@@ -1,110 +1,252 @@
 import logging
-
-import pandas as pd
-from dateutil.parser import parse as parse_date, ParserError as DateParseError
+import threading
+from pathlib import Path
 
 from prompt_toolkit import prompt
 from prompt_toolkit.shortcuts import confirm
 from prompt_toolkit.completion import WordCompleter
 from prompt_toolkit.validation import Validator
+from returns.result import Success
 
-from .connection import db_engine
 from .app_logger import setup_logging
 from .access import MetadataConnection
+from .replica import LocalReplica, OFFLINE_ERRORS
+from .fingerprint import source_fingerprint, column_diff, describe_diff
+from .drift import edition_snapshot, drift_report, describe_drift
+from .digest import content_digest
+from .instrument import span
+from .similar import SimilarityIndex
+from .validation import (
+    DATA_TYPES,
+    validate_date,
+    validate_keyword,
+    validate_cadence,
+    validate_suppression_threshold,
+)
 from .vimput import gather_text_with_editor
 
 
+# pandas (via .sources and .profile) and dateutil are imported where they're
+# used, so importing this module only costs prompt_toolkit and sqlalchemy.
+
+
 class RegistrationHandler:
     """
     This class handles registering a dataset provided in the init method.
+    The file can be a DataFrame, a path (which is streamed rather than
+    loaded) or any source from metadata.sources.
 
     Check the migrations file '0001_DOCS_data_tables.sql' for a reference
     on field names and data types.
     """
 
-    def __init__(self, filename, file: pd.DataFrame, config, vim_edit=False):
+    def __init__(self, filename, file, config, vim_edit=False):
+        from .sources import open_source
+        from .completion import CatalogCompleter
+
         self.filename = filename
-        self.file = file
+        self.path = file if isinstance(file, (str, Path)) else None
+        self.source = open_source(file)
         self.topic = config["app"]["name"]
         self.logger = logging.getLogger(self.topic)
-        self.db_engine = db_engine
         self.vim_edit = vim_edit
 
         setup_logging()
         self.md = MetadataConnection(self.logger)
+        self.db_engine = self.md.db_engine
 
-        with self.db_engine.connect() as db:
-            self.available_keywords = self.md.get_all_keywords(db)
-            self.available_datasets = self.md.get_available_datasets(db)
+        # Everything read before the commit comes from the local replica,
+        # so only the commit needs the central database.
+        self.replica = LocalReplica(self.md)
+        self.offline = False
+        with span("registration.catalog"):
+            try:
+                self.report_sync(self.replica.sync())
+                self.replica.refresh()
+            except OFFLINE_ERRORS:
+                self.logger.warning("Can't reach the catalog database.", exc_info=True)
+                self.offline = True
+                print(
+                    "The catalog database can't be reached, so this works from the local\n"
+                    "copy and the registration will be saved to send later."
+                )
 
-        self.keyword_completer = WordCompleter(
-            list(self.available_keywords.keys())
+        self.available_keywords = self.replica.keywords()
+        self.available_datasets = self.replica.datasets()
+
+        # Indexed on background threads while the first prompts are up.
+        self.keyword_completer = CatalogCompleter(
+            lambda: self._usage(self.available_keywords, self.replica.local.get_keyword_usage)
         )
-        self.dataset_completer = WordCompleter(
-            list(self.available_datasets.keys())
+        self.dataset_completer = CatalogCompleter(
+            lambda: self._usage(self.available_datasets, self.replica.local.get_dataset_usage)
         )
-
-        def validate_date(date: str):
-            try:
-                parse_date(date)
-                return True
-            except DateParseError:
-                return False
+        self.similar = SimilarityIndex(self.replica.local)
+        self.similar_ready = threading.Event()
+        threading.Thread(target=self._load_similar, daemon=True).start()
 
         self.date_validator = Validator.from_callable(
             validate_date,
             error_message="The date must be in YYYY-MM-DD format.",
         )
 
+    def _usage(self, names, get_usage):
+        with self.replica.engine.connect() as local:
+            usage = get_usage(local)
+        return {name: usage.get(name, 0) for name in names}
+
+    def _load_similar(self):
+        try:
+            with self.replica.engine.connect() as local:
+                self.similar.refresh(local)
+            self.similar.prepare()
+        except Exception:
+            self.logger.exception("Couldn't load the similar datasets index.")
+        finally:
+            self.similar_ready.set()
+
+    def report_sync(self, results):
+        for entry, result in results:
+            if isinstance(result, Success):
+                print(f"Sent the saved registration of '{entry['dataset_name']}'.")
+            else:
+                print(
+                    f"The saved registration of '{entry['dataset_name']}' couldn't be sent: "
+                    f"{result.failure()}\nSee `metadata sync`."
+                )
+
     def run_complete_workflow(self):
+        self.content = None
+        if self.path is not None:
+            with span("registration.digest", file=str(self.filename)):
+                self.content = content_digest(self.path)
+
+        # The profile is built here, on first use, so this span is mostly
+        # the pass over the file.
+        with span("registration.profile", file=str(self.filename)):
+            fingerprint = source_fingerprint(self.source)
+            with self.replica.engine.connect() as local:
+                matches = self.replica.local.find_datasets_by_fingerprint(fingerprint, local)
+
+        suggestion = ""
+        if matches:
+            suggestion = next(iter(matches))
+            print(
+                f"The columns in {self.filename} match: {', '.join(matches)}"
+            )
+
+        with span("registration.similar"):
+            self.similar_ready.wait()
+            similar = self.similar.similar_to(
+                self.source.columns, Path(str(self.filename)).stem, k=3, exclude=matches
+            )
+        if similar:
+            print(
+                "Existing datasets that look similar: "
+                + ", ".join(f"{name} ({score:.0%})" for name, score in similar)
+            )
+
         dataset_name = prompt(
             f"What is the dataset name for {self.filename}? Enter a new\n"
             "if this is the first time documenting this dataset.\n-> ",
             completer=self.dataset_completer,
+            default=suggestion,
         )
 
         is_new = dataset_name not in self.available_datasets
 
-        if is_new:
-            dataset_details, keywords = self.register_dataset(dataset_name)
-            variable_details = self.register_variables()
-            new_keywords = [
-                kw for kw in keywords if kw not in self.available_keywords
-            ]
-            prev_kw_ids = {
-                kw: id for kw, id in self.available_keywords.items() if kw in keywords
-            }
+        # A file that's been documented before for this dataset isn't a new
+        # edition of it. The same file under another name still can be.
+        if not is_new and self.content is not None:
+            with self.replica.engine.connect() as local:
+                found = self.replica.local.find_edition_by_digest(
+                    self.content["content_digest"], local, dataset_name
+                )
+            if found is not None:
+                print(
+                    f"{self.filename} is already documented as the edition of "
+                    f"'{found['table_name']}' published {found['publish_date']}, "
+                    "so there's no new edition to register."
+                )
+                return
 
-            # TODO lookup and add keywords to tags table
+        if is_new:
+            with span("registration.dataset"):
+                dataset_details, keywords = self.register_dataset(dataset_name)
+            dataset_details["schema_fingerprint"] = fingerprint
+            with span("registration.variables"):
+                variable_details = self.register_variables()
 
-        edition_details = self.register_edition()
+        else:
+            dataset_id, columns = self.available_datasets[dataset_name]
+
+            # Checked before any prompting so nobody fills in an edition
+            # that can't be saved.
+            missing, extra = column_diff(columns, self.source.columns)
+            if missing or extra:
+                raise ValueError(
+                    f"The columns of {self.filename} don't match '{dataset_name}'.\n"
+                    f"{describe_diff(missing, extra)}\n"
+                    "In the ETL script, rename these columns before calling "
+                    "the 'document' function."
+                )
 
-        # TODO This migth need a refactor to deal with the if more elegantly
-        with self.db_engine.connect() as db:
-            if is_new:
-                dataset_id = self.md.insert_dataset(dataset_details, db)  # type: ignore
-                self.md.insert_variables(variable_details, dataset_id, db)  # type: ignore
-                new_kw_ids = self.md.insert_new_keywords(new_keywords, db)  # type: ignore
+            with span("registration.drift"), self.replica.engine.connect() as local:
+                previous = self.replica.local.get_latest_statistics(dataset_id, local)
+            if previous is not None:
+                print(
+                    "Changes since the last edition:\n"
+                    + describe_drift(drift_report(previous, edition_snapshot(self.source)))
+                )
 
-                tags = [
-                    *prev_kw_ids.values(),  # type: ignore
-                    *new_kw_ids.values(),
-                ]
-                self.md.tag_dataset(tags, dataset_id, db)
+        with span("registration.edition"):
+            edition_details = self.register_edition()
+
+        with span("registration.commit", new=is_new):
+            # A dataset that's only queued so far (no id yet) can only be
+            # queued behind.
+            if not self.offline and (is_new or dataset_id is not None):  # type: ignore
+                try:
+                    with self.db_engine.begin() as db:
+                        if is_new:
+                            self.md.register(
+                                dataset_details,  # type: ignore
+                                variable_details,  # type: ignore
+                                keywords,  # type: ignore
+                                edition_details,
+                                db,
+                            )
+
+                        else:
+                            if dataset_name not in matches:
+                                # Same columns but a new (or never recorded)
+                                # fingerprint, e.g. a type changed or the
+                                # dataset predates fingerprints.
+                                self.md.set_schema_fingerprint(dataset_id, fingerprint, db)  # type: ignore
+
+                            self.md.insert_edition(edition_details, dataset_id, db)  # type: ignore
+                    return
+                except OFFLINE_ERRORS:
+                    self.logger.warning("Lost the catalog database.", exc_info=True)
 
+            if is_new:
+                self.replica.queue_dataset(
+                    dataset_details,  # type: ignore
+                    variable_details,  # type: ignore
+                    keywords,  # type: ignore
+                    edition_details,
+                )
             else:
-                dataset_id, columns = self.available_datasets[dataset_name]
-
-                assert all(col in self.file.columns for col in columns) and all(
-                    col in columns for col in self.file.columns
-                ), (
-                    "The column names of the new dataset don't match the current "
-                    "columns. In the ETL script, rename these columns before "
-                    "calling the 'document' function."
+                self.replica.queue_edition(
+                    dataset_name,
+                    edition_details,
+                    self.source.columns,
+                    None if dataset_name in matches else fingerprint,
                 )
-
-            self.md.insert_edition(edition_details, dataset_id, db)
-            db.commit()
+            print(
+                f"Saved '{dataset_name}' locally. It's sent the next time the catalog\n"
+                "database can be reached (or run `metadata sync`)."
+            )
 
     def register_dataset(self, dataset_name):
         """
@@ -150,14 +292,8 @@ class RegistrationHandler:
 
         # Keywords
 
-        def validate_keywords(value):
-            try:
-                return len(value) > 3
-            except TypeError:
-                return False
-
         keyword_validator = Validator.from_callable(
-            validate_keywords,
+            validate_keyword,
             error_message="Keywords must be longer than three characters.",
         )
 
@@ -175,17 +311,6 @@ class RegistrationHandler:
             print("Current keywords:", ",".join(keywords))
             add_another = confirm("Add another keyword?")
 
-        def validate_cadence(cadence):
-            """
-            FUTURE: This should depend on autotime so we can easily add
-            """
-            return cadence in {
-                "month",
-                "quarter",
-                "year",
-                "none",
-            }
-
         cadence_validator = Validator.from_callable(
             validate_cadence,
             error_message="The cadence must be one of 'month', 'quarter', 'year', or 'none'.",
@@ -214,15 +339,40 @@ class RegistrationHandler:
 
     def register_variables(self):
         """
-        Each variable needs to go through a new workflow.
+        Each variable needs to go through a new workflow. The whole file
+        is profiled up front, and the profile supplies the defaults for
+        each prompt and is stored with the variable.
         """
 
-        datatype_completer = WordCompleter(["numeric", "string", "date"])
+        from .profile import column_profile, describe_column, suggested_threshold
+        from .hierarchy import detect_parents, describe_candidate
+        from .standards import StandardMatcher
+
+        datatype_completer = WordCompleter(sorted(DATA_TYPES))
+        profile = self.source.profile()
+        columns = self.source.columns
+
+        # Sums and subsets among the numeric columns suggest the parents.
+        with span("registration.hierarchy"):
+            detected = detect_parents(
+                self.source.sample(),
+                [name for name in columns if profile.loc[name, "inferred_type"] == "numeric"],
+            )
+
+        with span("registration.standards"), self.replica.engine.connect() as local:
+            standards = self.replica.local.get_current_standards(local)
+            standard_matches = StandardMatcher(standards).match(self.source.sample())
+        standard_completer = WordCompleter(
+            [standard["name"] for standard in standards], sentence=True
+        )
 
         result = []
-        for variable_name in self.file.columns:
+        for variable_name in columns:
+            column = column_profile(profile, variable_name)
+
             print(f"Variable name: {variable_name} ")
-            print(f"Example rows:\n{self.file[variable_name].head()}")
+            print(f"Example rows:\n{self.source.head(variable_name)}")
+            print(f"Profile: {describe_column(column)}")
 
             if self.vim_edit:
                 description = gather_text_with_editor(
@@ -236,16 +386,21 @@ class RegistrationHandler:
             data_type = prompt(
                 "What is data type of this variable? ",
                 completer=datatype_completer,
+                default=column["inferred_type"],
             )
 
             parent_variable_validator = Validator.from_callable(
-                lambda x: ((x in self.file.columns) & (x != variable_name)),
+                lambda x: ((x in columns) & (x != variable_name)),
                 f"The parent variable must be a valid variable name, and cannot be itself.",
             )
             parent_variable_completer = WordCompleter(
-                [item for item in self.file.columns if item != variable_name]
+                [item for item in columns if item != variable_name]
             )
 
+            candidates = detected.get(variable_name, [])
+            for candidate in candidates:
+                print(f"Possible parent: {describe_candidate(candidate)}")
+
             has_parent = confirm(
                 "Does this variable have a parent variable? ",
             )
@@ -253,15 +408,22 @@ class RegistrationHandler:
                 parent_variable = prompt(
                     completer=parent_variable_completer,
                     validator=parent_variable_validator,
+                    default=candidates[0]["parent"] if candidates else "",
                 )
             else:
                 parent_variable = None
 
             suppression_validator = Validator.from_callable(
-                lambda x: x.isnumeric(),
+                validate_suppression_threshold,
                 "The suppression threshold must be a numeric value.",
             )
 
+            suggested = suggested_threshold(column)
+            if suggested is not None:
+                print(
+                    f"{column['small_count']} values are between 0 and {suggested}."
+                )
+
             is_suppressed = confirm(
                 "Is there a level that this data should be suppressed? ",
             )
@@ -269,15 +431,24 @@ class RegistrationHandler:
                 suppression_threshold = prompt(
                     "What is the minimum value that our tools should display? ",
                     validator=suppression_validator,
+                    default="" if suggested is None else str(suggested),
                 )
             else:
                 suppression_threshold = None
 
+            matched = standard_matches.get(variable_name, [])
+            for name, share in matched:
+                print(f"Looks like {name} ({share:.0%} of sampled values match).")
+
             is_standard = confirm(
                 "Does the variable follow any known standard?"
             )
             if is_standard:
-                standard = prompt("Which standard does it follow? ")
+                standard = prompt(
+                    "Which standard does it follow? ",
+                    completer=standard_completer,
+                    default=matched[0][0] if matched else "",
+                )
             else:
                 standard = None
 
@@ -289,6 +460,7 @@ class RegistrationHandler:
                         "data_type": data_type,
                         "parent_variable": parent_variable,
                         "suppression_threshold": suppression_threshold,
+                        "profile": column,
                     },
                     standard,
                 )
@@ -301,8 +473,9 @@ class RegistrationHandler:
         Each time the dataset is downloaded, the dataset edition has to
         be documented.
         """
+        from dateutil.parser import parse as parse_date
 
-        num_records = len(self.file)
+        num_records = self.source.num_records
         notes = prompt(
             "Are there any edition-specific notes that you'd like to include? "
         )
@@ -326,8 +499,10 @@ class RegistrationHandler:
         return {
             "num_records": num_records,
             "notes": notes,
-            "publish_date": publish_date,
-            "collection_start": collection_start,
-            "collection_end": collection_end,
-            "acquisition_date": acquisition_date,
+            "publish_date": parse_date(publish_date).date(),
+            "collection_start": parse_date(collection_start).date(),
+            "collection_end": parse_date(collection_end).date(),
+            "acquisition_date": parse_date(acquisition_date).date(),
+            "statistics": edition_snapshot(self.source),
+            **(self.content or {}),
         }
@@ -0,0 +1,25 @@
+"""
+Where local copies of the catalog live, and how far back a delta refresh
+re-reads.
+
+LocalReplica (metadata/replica.py) keeps what registration needs up front
+in a sqlite file, and SimilarityIndex (metadata/similar.py) its term
+counts; after the first sync both only read rows whose updated_at is newer
+than the last one (see 0005_DOCS_catalog_changes.sql), so starting a
+RegistrationHandler costs a couple of small queries rather than a dump of
+every dataset and variable.
+"""
+
+import os
+from datetime import timedelta
+from pathlib import Path
+
+
+# now() in postgres is the transaction's start time, so a registration that
+# commits after we sync can carry an updated_at from before it. Re-reading a
+# window before the last sync picks those up; re-reading rows is harmless.
+SYNC_OVERLAP = timedelta(minutes=5)
+
+
+def default_cache_dir():
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "metadata"
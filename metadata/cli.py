@@ -0,0 +1,358 @@
+import logging
+from pathlib import Path
+
+import click
+
+from .app_logger import setup_logging
+from .connection import get_config
+
+
+@click.group()
+def cli():
+    """
+    Dataset documentation tools.
+    """
+    setup_logging()
+
+
+@cli.command("bulk-register")
+@click.argument(
+    "specs", nargs=-1, required=True, type=click.Path(exists=True, path_type=Path)
+)
+@click.option("--workers", default=8, show_default=True, help="Concurrent registrations.")
+def bulk_register(specs, workers):
+    """
+    Register datasets or editions from spec files (or directories of them)
+    without prompting. See metadata/bulk.py for the spec format.
+    """
+    from returns.result import Success
+
+    from .access import MetadataConnection
+    from .bulk import BulkRegistrar
+
+    config = get_config()
+    md = MetadataConnection(logging.getLogger(config["app"]["name"]))
+    registrar = BulkRegistrar(md, config["app"]["name"], workers=workers)
+
+    results = registrar.run(specs)
+    failures = 0
+    for path, result in results:
+        if result == Success(None):
+            click.echo(f"same    {path} (already documented)")
+        elif isinstance(result, Success):
+            click.echo(f"ok      {path} (dataset {result.unwrap()})")
+        else:
+            failures += 1
+            click.echo(f"failed  {path}: {result.failure()}", err=True)
+
+    click.echo(f"{failures} of {len(results)} failed.")
+    if failures:
+        raise SystemExit(1)
+
+
+@cli.command()
+@click.argument("dataset_name")
+@click.argument("file", type=click.Path(exists=True, path_type=Path))
+def drift(dataset_name, file):
+    """
+    Compare FILE against the statistics of DATASET_NAME's latest edition.
+    Only FILE is read.
+    """
+    from .access import MetadataConnection
+    from .drift import edition_snapshot, drift_report, describe_drift
+    from .sources import open_source
+
+    config = get_config()
+    md = MetadataConnection(logging.getLogger(config["app"]["name"]))
+
+    with md.db_engine.connect() as db:
+        dataset_id = md.get_dataset_id(dataset_name, db)
+        if dataset_id is None:
+            raise click.BadParameter(f"No dataset named '{dataset_name}'.")
+        previous = md.get_latest_statistics(dataset_id, db)
+
+    if previous is None:
+        raise click.ClickException(f"No edition of '{dataset_name}' has statistics yet.")
+
+    click.echo(describe_drift(drift_report(previous, edition_snapshot(open_source(file)))))
+
+
+@cli.command()
+@click.argument("out_dir", type=click.Path(file_okay=False, path_type=Path))
+@click.option("--format", "format_", type=click.Choice(["jsonl", "parquet"]), default="jsonl", show_default=True)
+@click.option("--since", type=click.DateTime(), help="Only rows changed after this (e.g. a manifest's exported_at).")
+@click.option("--batch-size", default=10_000, show_default=True, help="Rows held in memory at once.")
+def export(out_dir, format_, since, batch_size):
+    """
+    Export the catalog tables to OUT_DIR, one file per table plus a
+    manifest.json.
+    """
+    from .access import MetadataConnection
+    from .export import export_catalog
+
+    config = get_config()
+    md = MetadataConnection(logging.getLogger(config["app"]["name"]))
+
+    manifest = export_catalog(md, out_dir, format_, since=since, batch_size=batch_size)
+    for name, table in manifest["tables"].items():
+        click.echo(f"{table['rows']:>10} {name}")
+    click.echo(f"Exported at {manifest['exported_at']}.")
+
+
+@cli.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8000, show_default=True)
+@click.option("--ttl", default=300.0, show_default=True, help="Seconds a cached response is kept.")
+def serve(host, port, ttl):
+    """
+    Serve the read-only catalog API (see metadata/api.py).
+    """
+    from .access import MetadataConnection
+    from .api import CatalogAPI, serve as serve_api
+
+    config = get_config()
+    md = MetadataConnection(logging.getLogger(config["app"]["name"]))
+
+    click.echo(f"Serving the catalog on http://{host}:{port}/")
+    serve_api(CatalogAPI(md, ttl=ttl), host, port)
+
+
+@cli.command()
+@click.option("--discard", type=int, multiple=True, help="Drop a queued registration by its id.")
+def sync(discard):
+    """
+    Send registrations saved while the catalog database couldn't be
+    reached, and list any that conflict with it.
+    """
+    from returns.result import Success
+
+    from .access import MetadataConnection
+    from .replica import LocalReplica, OFFLINE_ERRORS
+
+    config = get_config()
+    md = MetadataConnection(logging.getLogger(config["app"]["name"]))
+    replica = LocalReplica(md)
+
+    for entry_id in discard:
+        if not replica.discard(entry_id):
+            raise click.BadParameter(f"Nothing queued with id {entry_id}.")
+
+    try:
+        results = replica.sync()
+        replica.refresh()
+    except OFFLINE_ERRORS as e:
+        raise click.ClickException(f"The catalog database still can't be reached: {e}")
+
+    for entry, result in results:
+        if isinstance(result, Success):
+            click.echo(f"sent      {entry['id']:>4} {entry['kind']} of {entry['dataset_name']}")
+        else:
+            click.echo(
+                f"conflict  {entry['id']:>4} {entry['kind']} of {entry['dataset_name']}: "
+                f"{result.failure()}",
+                err=True,
+            )
+    click.echo(f"{len(replica.pending())} registration(s) still queued.")
+
+
+@cli.command()
+@click.option("--dry-run", is_flag=True, help="List the migrations that would be applied.")
+@click.option("--savepoints", is_flag=True, help="Keep the migrations before one that fails.")
+def migrate(dry_run, savepoints):
+    """
+    Apply the pending migrations in metadata/migrations, in one locked
+    transaction. See metadata/run_migrations.py.
+    """
+    from .connection import get_engine
+    from .run_migrations import MigrationError, migrate as run
+
+    config = get_config()
+    try:
+        found = run(
+            get_engine(),
+            dry_run=dry_run,
+            savepoints=savepoints,
+            logger=logging.getLogger(config["app"]["name"]),
+        )
+    except MigrationError as e:
+        raise click.ClickException(str(e))
+
+    for name in found:
+        click.echo(name)
+    if not found:
+        click.echo("Nothing to apply.")
+
+
+@cli.command("seed-standards")
+def seed_standards():
+    """
+    Add the built-in standards (FIPS, GEOIDs, NAICS, ...) to the catalog,
+    updating any that are already there.
+    """
+    from .access import MetadataConnection
+    from .standards import BUILTIN_STANDARDS
+
+    config = get_config()
+    md = MetadataConnection(logging.getLogger(config["app"]["name"]))
+
+    with md.db_engine.begin() as db:
+        for standard in BUILTIN_STANDARDS:
+            md.insert_standard(standard, db)
+            click.echo(standard["name"])
+
+
+def _dataset_ids(md, names, db):
+    ids = {}
+    for name in names:
+        ids[name] = md.get_dataset_id(name, db)
+        if ids[name] is None:
+            raise click.BadParameter(f"There's no registered dataset named {name}.")
+    return ids
+
+
+@cli.command()
+@click.argument("parent")
+@click.argument("child")
+@click.option("--description", help="How CHILD is made from PARENT.")
+def derive(parent, child, description):
+    """
+    Record that dataset CHILD is derived from dataset PARENT.
+    """
+    from .access import MetadataConnection
+
+    config = get_config()
+    md = MetadataConnection(logging.getLogger(config["app"]["name"]))
+
+    with md.db_engine.begin() as db:
+        ids = _dataset_ids(md, [parent, child], db)
+        try:
+            md.add_derivations([(ids[parent], ids[child], description)], db)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+
+@cli.command()
+@click.argument("dataset_name")
+@click.argument("project_name")
+@click.option("--description", help="What the project uses it for.")
+def use(dataset_name, project_name, description):
+    """
+    Record that project PROJECT_NAME uses DATASET_NAME, adding the project
+    if it's new.
+    """
+    from .access import MetadataConnection
+
+    config = get_config()
+    md = MetadataConnection(logging.getLogger(config["app"]["name"]))
+
+    with md.db_engine.begin() as db:
+        dataset_id = _dataset_ids(md, [dataset_name], db)[dataset_name]
+        project_id = md.insert_project({"project_name": project_name}, db)
+        md.insert_usages(
+            [{"dataset_id": dataset_id, "project_id": project_id, "description": description}], db
+        )
+
+
+@cli.command()
+@click.argument("dataset_name")
+def lineage(dataset_name):
+    """
+    List what DATASET_NAME is derived from, what's derived from it, and the
+    projects a change to it would affect.
+    """
+    from .access import MetadataConnection
+
+    config = get_config()
+    md = MetadataConnection(logging.getLogger(config["app"]["name"]))
+
+    with md.db_engine.connect() as db:
+        dataset_id = _dataset_ids(md, [dataset_name], db)[dataset_name]
+        upstream = md.get_upstream(dataset_id, db)
+        downstream = md.get_downstream(dataset_id, db)
+        projects = md.get_affected_projects(dataset_id, db)
+
+    click.echo("Derived from:")
+    for row in upstream:
+        click.echo(f"  {row['depth']:>3}  {row['table_name']}")
+    click.echo("Derived into:")
+    for row in downstream:
+        click.echo(f"  {row['depth']:>3}  {row['table_name']}")
+    click.echo("Affected projects:")
+    for row in projects:
+        click.echo(f"  {row['project_name']} (through {row['table_name']})")
+
+
+@cli.command()
+@click.argument("frame")
+@click.argument("period")
+@click.option("--partial", is_flag=True, help="Include datasets that cover only part of PERIOD.")
+def covering(frame, period, partial):
+    """
+    List the datasets of unit of analysis FRAME (e.g. tract) that cover
+    PERIOD: 2019, 2019-Q3, 2019-07 or a date.
+    """
+    from .access import MetadataConnection
+    from .autotime import Autotime, parse_period
+
+    config = get_config()
+    md = MetadataConnection(logging.getLogger(config["app"]["name"]))
+
+    try:
+        start, end = parse_period(period)
+    except ValueError:
+        raise click.BadParameter(f"{period} isn't a year, quarter, month or date.")
+
+    with md.db_engine.connect() as db:
+        for row in Autotime(md).covering(frame, start, end, db, partial=partial):
+            click.echo(row["table_name"])
+
+
+@cli.command()
+@click.argument("dataset_name")
+def autotime(dataset_name):
+    """
+    Show the time DATASET_NAME's editions cover and the gaps in it.
+    """
+    from .access import MetadataConnection
+    from .autotime import Autotime, describe_gaps
+
+    config = get_config()
+    md = MetadataConnection(logging.getLogger(config["app"]["name"]))
+
+    with md.db_engine.connect() as db:
+        dataset_id = _dataset_ids(md, [dataset_name], db)[dataset_name]
+        summary = Autotime(md).summary(dataset_id, db)
+
+    click.echo(f"Frame:      {summary['frame_type'] or '(no unit of analysis)'}")
+    click.echo(f"Resolution: {summary['resolution']}")
+    if summary["available_from"] is None:
+        click.echo("No edition has collection dates.")
+        return
+    click.echo(f"Available:  {summary['available_from']} to {summary['available_to']}")
+    click.echo(f"Gaps:       {describe_gaps(summary['gaps'], summary['resolution']) or 'none'}")
+
+
+@cli.command()
+@click.argument("file", type=click.Path(exists=True, path_type=Path))
+@click.option("-k", default=5, show_default=True, help="How many to list.")
+def similar(file, k):
+    """
+    List the registered datasets most like FILE, by their names,
+    descriptions, keywords and columns.
+    """
+    from .access import MetadataConnection
+    from .similar import SimilarityIndex
+    from .sources import open_source
+
+    config = get_config()
+    md = MetadataConnection(logging.getLogger(config["app"]["name"]))
+    index = SimilarityIndex(md)
+    with md.db_engine.connect() as db:
+        index.refresh(db)
+
+    for name, score in index.similar_to(open_source(file).columns, file.stem, k=k):
+        click.echo(f"{score:5.0%}  {name}")
+
+
+if __name__ == "__main__":
+    cli()
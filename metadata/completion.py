@@ -0,0 +1,199 @@
+"""
+Completion for the dataset name and keyword prompts.
+
+WordCompleter scans every candidate on every keystroke. Here the names are
+indexed once, on a background thread, into
+
+  - a sorted list of keys (each name, plus each name from every word
+    boundary on, so 'tracts' finds 'census_tracts'), searched with bisect
+    like a trie would be, with the best candidates for one and two
+    character prefixes kept since those ranges are the biggest; and
+  - a trigram index for typos and partial matches, used when the prefixes
+    don't fill the list.
+
+Candidates are ranked by how much they're used (tags per keyword, editions
+per dataset), then by length and name.
+"""
+
+import heapq
+import logging
+import re
+import threading
+from bisect import bisect_left
+
+import numpy as np
+from prompt_toolkit.completion import Completer, Completion
+
+
+logger = logging.getLogger(__name__)
+
+# Prefixes this short have their best candidates kept once looked up.
+CACHED_PREFIX = 2
+LIMIT = 20
+
+# Fuzzy matches need at least this Dice similarity over trigrams.
+MIN_SIMILARITY = 0.3
+
+_BOUNDARY = re.compile(r"[\s_\-./:]+")
+
+
+def _keys(name):
+    """
+    The lowercased name and its tail from each word boundary.
+    """
+    lowered = name.lower()
+    yield lowered
+    for boundary in _BOUNDARY.finditer(lowered):
+        if boundary.end() < len(lowered):
+            yield lowered[boundary.end():]
+
+
+def trigrams(text):
+    padded = f"  {text.lower()} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class PrefixIndex:
+    """
+    `names`, best first, searchable by prefix. Ids are positions in
+    `names`, so the smallest ids are the best matches.
+    """
+
+    def __init__(self, names, cache_size=LIMIT):
+        self.names = names
+        self.cache_size = cache_size
+
+        pairs = sorted((key, i) for i, name in enumerate(names) for key in _keys(name))
+        self.keys = [key for key, _ in pairs]
+        self.ids = [i for _, i in pairs]
+        self.cached = {}
+
+    def search(self, prefix, limit=LIMIT):
+        """
+        Ids of the best names with a key starting with `prefix`. The
+        shortest prefixes cover the most keys, so their results are kept.
+        """
+        prefix = prefix.lower()
+        cache = len(prefix) <= CACHED_PREFIX and limit <= self.cache_size
+        if cache and prefix in self.cached:
+            return self.cached[prefix][:limit]
+
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + "\uffff", lo)
+        best = heapq.nsmallest(self.cache_size if cache else limit, set(self.ids[lo:hi]))
+
+        if cache:
+            self.cached[prefix] = best
+        return best[:limit]
+
+
+class TrigramIndex:
+    def __init__(self, names):
+        grams = [trigrams(name) for name in names]
+        counts = np.array([len(name_grams) for name_grams in grams], dtype="int64")
+
+        # Every (gram, name) pair, grouped by gram with one sort.
+        vocabulary = {}
+        codes = np.array(
+            [vocabulary.setdefault(gram, len(vocabulary)) for name_grams in grams for gram in name_grams],
+            dtype="int64",
+        )
+        ids = np.repeat(np.arange(len(names), dtype="int32"), counts)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(vocabulary) + 1))
+
+        self.size = len(names)
+        self.lengths = counts.astype("float64")
+        self.postings = {
+            gram: ids[order[bounds[code] : bounds[code + 1]]]
+            for gram, code in vocabulary.items()
+        }
+
+    def search(self, text, limit=LIMIT, min_similarity=MIN_SIMILARITY):
+        """
+        [(id, similarity), ...], most similar first.
+        """
+        grams = trigrams(text)
+        hits = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not hits or not self.size:
+            return []
+
+        shared = np.bincount(np.concatenate(hits), minlength=self.size)
+        similarity = 2 * shared / (len(grams) + self.lengths)
+        candidates = np.flatnonzero(similarity >= min_similarity)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-similarity[candidates], limit)[:limit]]
+
+        return sorted(
+            ((int(i), float(similarity[i])) for i in candidates),
+            key=lambda hit: -hit[1],
+        )
+
+
+class CatalogCompleter(Completer):
+    """
+    Completes the whole text typed so far against names from `load`, a
+    callable returning {name: usage count}. Loading and indexing happen
+    on a background thread started here; until they finish, there are no
+    completions rather than a slow prompt.
+    """
+
+    def __init__(self, load, limit=LIMIT, background=True):
+        self.load = load
+        self.limit = limit
+
+        self.names = []
+        self.usage = {}
+        self.prefixes = None
+        self.trigrams = None
+
+        self.ready = threading.Event()
+        if background:
+            threading.Thread(target=self.build, daemon=True).start()
+        else:
+            self.build()
+
+    def build(self):
+        try:
+            usage = self.load()
+        except Exception:
+            logger.exception("Couldn't load completions.")
+            usage = {}
+
+        try:
+            names = sorted(usage, key=lambda name: (-usage[name], len(name), name))
+            self.prefixes = PrefixIndex(names)
+            self.trigrams = TrigramIndex(names)
+            self.names = names
+            self.usage = usage
+        finally:
+            self.ready.set()
+
+    def complete(self, text, limit=None):
+        """
+        The best names for `text`: prefix matches first, then (for three
+        or more characters) fuzzy ones.
+        """
+        limit = limit or self.limit
+        if not self.ready.is_set() or self.prefixes is None:
+            return []
+
+        ids = self.prefixes.search(text, limit)
+        if len(ids) < limit and len(text) >= 3:
+            seen = set(ids)
+            ids += [
+                i
+                for i, _ in self.trigrams.search(text, limit)
+                if i not in seen
+            ][: limit - len(ids)]
+
+        return [self.names[i] for i in ids]
+
+    def get_completions(self, document, complete_event):
+        text = document.text_before_cursor
+        for name in self.complete(text.strip()):
+            yield Completion(
+                name,
+                start_position=-len(text),
+                display_meta=str(self.usage[name]) if self.usage[name] else "",
+            )
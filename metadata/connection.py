@@ -1,16 +1,59 @@
+from functools import cache
 from pathlib import Path
-from sqlalchemy import create_engine
+
 import tomli
 
-# Walk out the the module base path
-config_path = Path.cwd() / "config.toml"
 
-with open(config_path, "rb") as f:
-    app_config = tomli.load(f)
+# Nothing is read or connected at import. The config is loaded the first
+# time something asks for it, and the engine the first time something needs
+# to talk to the database.
+
+
+@cache
+def get_config(config_path=None):
+    """
+    The app config, read from config.toml in the working directory unless
+    a path is given.
+    """
+    config_path = Path(config_path) if config_path else Path.cwd() / "config.toml"
+
+    with open(config_path, "rb") as f:
+        return tomli.load(f)
+
+
+@cache
+def get_engine():
+    from sqlalchemy import create_engine
+
+    app_config = get_config()
+
+    engine = create_engine(
+        f"postgresql+psycopg2://{app_config['db']['user']}:{app_config['db']['password']}"
+        f"@{app_config['db']['host']}:{app_config['db']['port']}/{app_config['db']['name']}",
+        connect_args={
+            'options': '-csearch_path={}'.format(app_config["db"]["metadata_schema"]),
+            # Fail over to the local replica (metadata/replica.py) quickly.
+            'connect_timeout': app_config["db"].get("connect_timeout", 10),
+        },
+        # Bounds the connections a long-running process (metadata serve) holds.
+        pool_size=app_config["db"].get("pool_size", 5),
+        max_overflow=app_config["db"].get("max_overflow", 10),
+    )
+
+    instrumentation = app_config.get("instrumentation", {})
+    if instrumentation.get("enabled"):
+        from .instrument import enable
+
+        enable(engine, instrumentation.get("prometheus_file"))
+
+    return engine
 
 
-db_engine = create_engine(
-    f"postgresql+psycopg2://{app_config['db']['user']}:{app_config['db']['password']}"
-    f"@{app_config['db']['host']}:{app_config['db']['port']}/{app_config['db']['name']}",
-    connect_args={'options': '-csearch_path={}'.format(app_config["db"]["metadata_schema"])}
-)
+def __getattr__(name):
+    # Keeps 'from .connection import db_engine' (and app_config) working for
+    # scripts written before the engine was lazy.
+    if name == "db_engine":
+        return get_engine()
+    if name == "app_config":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,148 @@
+"""
+Content digests: a sha256 of a file's bytes, stored on each edition so a
+file that's already been documented (a nightly download of a source that
+hasn't changed) isn't registered again as a new edition.
+
+The digest is taken in one pass over a memory map of the file, in large
+slices, so it runs at about the speed of the disk (hashlib lets go of the
+GIL while it hashes). Files that were digested before are usually not read
+at all: a DigestCache in the cache directory remembers each path's size,
+modification time, sample and digest, and the digest is reused when the
+size and modification time are unchanged and the sample (a hash of a few
+blocks from the start, middle and end) still matches, which catches a
+rewrite that kept the old timestamp.
+
+New digests are written out every SAVE_EVERY of them and when the cache
+is flushed (the shared one is when the interpreter exits), not one file
+rewrite per digest.
+"""
+
+import atexit
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from .catalog import default_cache_dir
+
+
+CHUNK = 8 * 1024 * 1024
+SAMPLE_BLOCK = 64 * 1024
+# New digests kept in memory before the cache file is rewritten.
+SAVE_EVERY = 100
+
+
+def file_digest(path):
+    """
+    The sha256 of the file's contents, as 64 hex digits.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        # An empty file can't be mapped.
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, "madvise"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                view = memoryview(mapped)
+                try:
+                    for start in range(0, size, CHUNK):
+                        digest.update(view[start : start + CHUNK])
+                finally:
+                    view.release()
+    return digest.hexdigest()
+
+
+def sample_digest(path, size):
+    """
+    A hash of the size and the blocks at the start, middle and end of the
+    file: cheap, and different for most files that aren't the same.
+    """
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as f:
+        for offset in sorted({0, max(size // 2 - SAMPLE_BLOCK // 2, 0), max(size - SAMPLE_BLOCK, 0)}):
+            f.seek(offset)
+            digest.update(f.read(SAMPLE_BLOCK))
+    return digest.hexdigest()
+
+
+def cache_path(cache_dir=None):
+    return Path(cache_dir or default_cache_dir()) / "digests.json"
+
+
+class DigestCache:
+    def __init__(self, path=None):
+        self.path = Path(path) if path else cache_path()
+        self._entries = None
+        self._unsaved = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save(self):
+        # Write-then-rename so a crash never leaves half a cache behind.
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp, self.path)
+        self._unsaved = 0
+
+    def flush(self):
+        """
+        Writes out the digests taken since the cache file was last saved.
+        """
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def content_digest(self, path):
+        """
+        {"content_digest": ..., "content_size": ...} for the file at `path`,
+        as the editions table stores them.
+        """
+        path = Path(path).resolve()
+        stat = path.stat()
+        key = str(path)
+        sample = sample_digest(path, stat.st_size)
+
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            cached = self._entries.get(key)
+        if cached is not None and cached[:3] == [stat.st_size, stat.st_mtime_ns, sample]:
+            return {"content_digest": cached[3], "content_size": stat.st_size}
+
+        digest = file_digest(path)
+        with self._lock:
+            self._entries[key] = [stat.st_size, stat.st_mtime_ns, sample, digest]
+            self._unsaved += 1
+            if self._unsaved >= SAVE_EVERY:
+                self._save()
+
+        return {"content_digest": digest, "content_size": stat.st_size}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def content_digest(path):
+    """
+    DigestCache.content_digest with a cache shared by the whole process.
+    """
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = DigestCache()
+            atexit.register(_cache.flush)
+    return _cache.content_digest(path)
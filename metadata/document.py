@@ -0,0 +1,339 @@
+"""
+Documenting datasets from ETL scripts without waiting on the database.
+
+    from metadata.document import document, document_edition
+
+    document_edition("exports/tracts.parquet", "acs_tracts", publish_date=..., ...)
+    document(frame, {"dataset": {...}, "variables": [...], "edition": {...}})
+
+Only the catalog writes happen in the background. `document` (a
+pre-filled registration in the same shape as a bulk spec file, see
+metadata/bulk.py) and `document_edition` (a new edition of a dataset
+that's already registered) run parse_spec on the caller's thread first:
+validating, profiling and digesting the data, so a big file costs the
+script that time, and anything wrong raises SpecError there and then.
+The registration then goes to a DocumentWriter, which commits it on a
+background thread, and the caller gets a Future for the dataset's id.
+
+The writer collects registrations for up to `linger` seconds after the
+first one arrives (or until it has `batch_size`, or something flushes)
+and writes them in one transaction on a connection it keeps: new
+datasets through register, then every edition's dataset id and columns
+in one lookup (an edition whose file's columns aren't the dataset's
+fails), the batch's content digests in another, fingerprints as one
+executemany and the editions as another. If that transaction fails, the
+batch is retried one registration per transaction so only the ones at
+fault fail.
+
+An edition from a file the dataset already has an edition of (by content
+digest, see metadata/digest.py), or that comes earlier in the same batch,
+isn't written again and its Future resolves to None.
+
+The module level functions share a writer that's flushed when the
+interpreter exits; scripts that want to know everything went in call
+flush(), or use their own writer as a context manager:
+
+    with DocumentWriter(md, "etl") as writer:
+        for path in paths:
+            document_edition(path, name, writer=writer, **dates)
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from .bulk import SpecError, check_columns, parse_spec
+from .instrument import span
+from .replica import OFFLINE_ERRORS
+
+
+BATCH_SIZE = 500
+LINGER = 0.1
+
+# Markers that end a batch early.
+_FLUSH = object()
+_STOP = object()
+
+
+class DocumentWriter:
+    def __init__(self, md, topic, batch_size=BATCH_SIZE, linger=LINGER):
+        self.md = md
+        self.topic = topic
+        self.batch_size = batch_size
+        self.linger = linger
+
+        self.queue = queue.Queue()
+        self._db = None
+        self._closed = False
+        self._standards = None
+        self._standards_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="document-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def standards(self):
+        """
+        A StandardMatcher for new datasets' variables, loaded (in the
+        caller's thread) the first time one is documented.
+        """
+        with self._standards_lock:
+            if self._standards is None:
+                from .standards import StandardMatcher
+
+                with self.md.db_engine.connect() as db:
+                    self._standards = StandardMatcher(self.md.get_current_standards(db))
+            return self._standards
+
+    def submit(self, registration):
+        """
+        Queues a registration as parse_spec returns it. The Future resolves
+        to the dataset's id once it's committed.
+        """
+        if self._closed or not self._thread.is_alive():
+            raise RuntimeError("This writer is closed.")
+        future = Future()
+        self.queue.put((registration, future))
+        return future
+
+    def flush(self):
+        """
+        Waits until everything submitted so far has been written (or has
+        failed). Raises RuntimeError if the writer has stopped, rather than
+        waiting for it.
+        """
+        if not self._thread.is_alive():
+            raise RuntimeError("This writer is closed.")
+        self.queue.put((_FLUSH, None))
+
+        # queue.join(), but giving up if the writer thread dies.
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                if not self._thread.is_alive():
+                    raise RuntimeError("The writer stopped before everything was written.")
+                self.queue.all_tasks_done.wait(0.1)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put((_STOP, None))
+        self._thread.join()
+        if self._db is not None:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        try:
+            while True:
+                batch, markers = [], []
+                try:
+                    item = self.queue.get()
+                    deadline = time.monotonic() + self.linger
+                    while True:
+                        if item[0] is _FLUSH or item[0] is _STOP:
+                            markers.append(item[0])
+                            break
+                        batch.append(item)
+                        if len(batch) == self.batch_size:
+                            break
+                        try:
+                            item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                        except queue.Empty:
+                            break
+
+                    if batch:
+                        self._write_batch(batch)
+                finally:
+                    for _ in range(len(batch) + len(markers)):
+                        self.queue.task_done()
+                if _STOP in markers:
+                    return
+        finally:
+            self._fail_queued()
+
+    def _fail_queued(self):
+        """
+        Fails whatever's still queued once the writer thread is done, so
+        nothing waits on it forever.
+        """
+        while True:
+            try:
+                registration, future = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            if future is not None and not future.done():
+                future.set_exception(RuntimeError("The writer stopped before this was written."))
+            self.queue.task_done()
+
+    def _connection(self):
+        if self._db is None:
+            self._db = self.md.db_engine.connect()
+        return self._db
+
+    def _write_batch(self, batch):
+        with span("document.write", registrations=len(batch)):
+            try:
+                ids = self._write(batch)
+            except (SpecError, SQLAlchemyError) as e:
+                self._reset(e)
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    return
+                for item in batch:
+                    self._write_batch([item])
+                return
+            except BaseException as e:
+                self._reset(e)
+                for _, future in batch:
+                    future.set_exception(e)
+                raise
+
+        for (_, future), dataset_id in zip(batch, ids):
+            future.set_result(dataset_id)
+
+    def _reset(self, error):
+        if isinstance(error, OFFLINE_ERRORS) and self._db is not None:
+            # Start the next batch on a fresh connection.
+            self._db.invalidate()
+            self._db.close()
+            self._db = None
+
+    def _write(self, batch):
+        """
+        Writes the batch in one transaction and returns the dataset ids in
+        batch order.
+        """
+        md = self.md
+        db = self._connection()
+        ids = [None] * len(batch)
+
+        with db.begin():
+            for i, (registration, _) in enumerate(batch):
+                if registration["dataset"] is not None:
+                    ids[i] = md.register(
+                        registration["dataset"],
+                        registration["variables"],
+                        registration["keywords"],
+                        registration["edition"],
+                        db,
+                    )
+
+            editions = [
+                (i, registration)
+                for i, (registration, _) in enumerate(batch)
+                if registration["dataset"] is None
+            ]
+            if not editions:
+                return ids
+
+            names = {registration["dataset_name"] for _, registration in editions}
+            ds = md.dataset_table
+            known = md.get_available_datasets(db, names=names)
+            # The new datasets in this batch, too.
+            known.update(
+                (
+                    registration["dataset_name"],
+                    (ids[i], [variable["variable_name"] for variable, _ in registration["variables"]]),
+                )
+                for i, (registration, _) in enumerate(batch)
+                if registration["dataset"] is not None
+            )
+
+            unknown = names - set(known)
+            if unknown:
+                raise SpecError(
+                    ", ".join(sorted(unknown)), ["There's no registered dataset by this name."]
+                )
+            for _, registration in editions:
+                name = registration["dataset_name"]
+                check_columns(name, known[name][1], registration["columns"])
+
+            # Files documented before, or earlier in this batch.
+            digests = {registration["edition"]["content_digest"] for registration, _ in batch} - {None}
+            documented = md.get_documented_digests(digests, db) if digests else set()
+            fresh = []
+            for i, (registration, _) in enumerate(batch):
+                key = (registration["dataset_name"], registration["edition"]["content_digest"])
+                if registration["dataset"] is None and key not in documented:
+                    fresh.append((i, registration))
+                if key[1] is not None:
+                    documented.add(key)
+            editions = fresh
+
+            fingerprints = [
+                {"dataset": known[registration["dataset_name"]][0], "fingerprint": registration["fingerprint"]}
+                for _, registration in editions
+                if registration["fingerprint"]
+            ]
+            if fingerprints:
+                db.execute(
+                    update(ds)
+                    .where(ds.c.id == bindparam("dataset"))
+                    .values(schema_fingerprint=bindparam("fingerprint")),
+                    fingerprints,
+                )
+
+            rows = []
+            for i, registration in editions:
+                ids[i] = known[registration["dataset_name"]][0]
+                rows.append({**registration["edition"], "dataset_id": ids[i]})
+            if rows:
+                md.insert_editions(rows, db)
+
+        return ids
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def default_writer():
+    global _writer
+
+    with _writer_lock:
+        if _writer is None:
+            from .access import MetadataConnection
+            from .connection import get_config
+
+            topic = get_config()["app"]["name"]
+            _writer = DocumentWriter(MetadataConnection(logging.getLogger(topic)), topic)
+            atexit.register(_writer.close)
+        return _writer
+
+
+def document(file, spec: dict, writer=None):
+    """
+    Queues a registration given as a bulk spec (without `file`) for `file`,
+    a path or DataFrame, and returns a Future for the dataset's id (or
+    None, for an edition that's already documented).
+    """
+    writer = writer or default_writer()
+    # What SpecErrors are reported against.
+    label = file if isinstance(file, (str, Path)) else "<DataFrame>"
+    standards = writer.standards if "dataset" in spec else None
+    return writer.submit(parse_spec(spec, label, writer.topic, source=file, standards=standards))
+
+
+def document_edition(file, dataset_name, writer=None, **edition):
+    """
+    Queues a new edition of a registered dataset. `edition` holds the
+    fields of a spec's [edition] table; num_records defaults to the file's.
+    """
+    return document(file, {"dataset_name": dataset_name, "edition": edition}, writer)
+
+
+def flush():
+    if _writer is not None:
+        _writer.flush()
@@ -0,0 +1,190 @@
+"""
+Per-edition statistics and drift between editions.
+
+Each edition stores a snapshot of its file: per column counts, nulls, a
+distinct-count estimate, the range, a quantile sketch (values at evenly
+spaced quantiles, read from the source's uniform sample) and the most
+common values. Comparing a new file against the last edition only needs
+the new file's snapshot, which comes from the same single pass that
+profiles it for registration, and the old snapshot from the database.
+"""
+
+import numpy as np
+
+from .profile import json_safe, numeric_block
+
+
+SNAPSHOT_VERSION = 1
+
+# 0, 1%, ..., 100%: the two-sample KS statistic read off two of these
+# grids is within a percentage point of the one between the samples.
+SNAPSHOT_QUANTILES = np.linspace(0, 1, 101)
+TOP_VALUES = 20
+
+# A column is reported as drifted past any of these.
+MAX_KS = 0.1  # largest gap between the two distributions' CDFs
+MAX_TOP_SHIFT = 0.1  # total variation distance over the most common values
+MAX_NULL_RATE_CHANGE = 0.05
+MAX_DISTINCT_RATIO = 2.0
+
+
+def edition_snapshot(source):
+    """
+    The statistics stored with an edition, as a json-ready dict.
+    """
+    profile = source.profile()
+    sample = source.sample()
+    top = source.top_values(TOP_VALUES)
+
+    numeric = [
+        name
+        for name in source.columns
+        if profile.loc[name, "inferred_type"] == "numeric" and name in sample
+    ]
+    quantiles = (
+        numeric_block(sample, numeric).quantile(list(SNAPSHOT_QUANTILES))
+        if numeric and len(sample)
+        else None
+    )
+
+    columns = {}
+    for name in source.columns:
+        column = profile.loc[name]
+        grid = None
+        if quantiles is not None and name in quantiles and quantiles[name].notna().all():
+            grid = [float(value) for value in quantiles[name]]
+
+        columns[name] = {
+            "type": column["inferred_type"],
+            "count": json_safe(column["count"]),
+            "null_count": json_safe(column["null_count"]),
+            "distinct_count": json_safe(column["distinct_count"]),
+            "min": json_safe(column["min"]),
+            "max": json_safe(column["max"]),
+            "quantiles": grid,
+            "top": [
+                [json_safe(value), int(count)] for value, count in top.get(name, [])
+            ],
+        }
+
+    return {
+        "version": SNAPSHOT_VERSION,
+        "num_records": int(source.num_records),
+        "columns": columns,
+    }
+
+
+def ks_distance(previous, current):
+    """
+    The largest gap between the CDFs described by two quantile grids.
+    """
+    previous, current = np.asarray(previous), np.asarray(current)
+    points = np.union1d(previous, current)
+
+    def cdf(grid):
+        return np.searchsorted(grid, points, side="right") / len(grid)
+
+    return float(np.abs(cdf(previous) - cdf(current)).max())
+
+
+def top_shift(previous, current):
+    """
+    Total variation distance between the shares of each column's most
+    common values, with everything else lumped into one bucket.
+    """
+    if not previous["count"] or not current["count"]:
+        return None
+
+    shares = []
+    for column in (previous, current):
+        counts = {value: count for value, count in column["top"]}
+        shares.append({value: count / column["count"] for value, count in counts.items()})
+
+    values = set(shares[0]) | set(shares[1])
+    other = [1 - sum(share.values()) for share in shares]
+    distance = sum(abs(shares[0].get(v, 0) - shares[1].get(v, 0)) for v in values)
+    return (distance + abs(other[0] - other[1])) / 2
+
+
+def _rate(column, field):
+    total = column["count"] + column["null_count"]
+    return column[field] / total if total else 0
+
+
+def compare_columns(previous, current):
+    """
+    The changes between two snapshots of one column and the reasons (if
+    any) that they count as drift.
+    """
+    result = {
+        "null_rate": (_rate(previous, "null_count"), _rate(current, "null_count")),
+        "distinct_count": (previous["distinct_count"], current["distinct_count"]),
+        "ks": None,
+        "top_shift": None,
+        "reasons": [],
+    }
+    reasons = result["reasons"]
+
+    if previous["type"] != current["type"]:
+        reasons.append(f"type changed from {previous['type']} to {current['type']}")
+
+    before, after = result["null_rate"]
+    if abs(after - before) > MAX_NULL_RATE_CHANGE:
+        reasons.append(f"null rate went from {before:.1%} to {after:.1%}")
+
+    before, after = result["distinct_count"]
+    if before and after and max(before, after) / min(before, after) > MAX_DISTINCT_RATIO:
+        reasons.append(f"distinct values went from {before} to {after}")
+
+    if previous["quantiles"] and current["quantiles"]:
+        result["ks"] = ks_distance(previous["quantiles"], current["quantiles"])
+        if result["ks"] > MAX_KS:
+            reasons.append(f"distribution shifted (KS {result['ks']:.2f})")
+    elif current["type"] != "numeric" or previous["type"] != "numeric":
+        result["top_shift"] = top_shift(previous, current)
+        if result["top_shift"] is not None and result["top_shift"] > MAX_TOP_SHIFT:
+            reasons.append(f"common values shifted (TVD {result['top_shift']:.2f})")
+
+    return result
+
+
+def drift_report(previous, current):
+    """
+    Compares two edition snapshots. Returns
+
+        {
+            "num_records": (previous, current),
+            "added": [columns only in current],
+            "removed": [columns only in previous],
+            "columns": {name: compare_columns(...) for shared columns},
+            "drifted": [names of shared columns with any reasons],
+        }
+    """
+    before, after = previous["columns"], current["columns"]
+    columns = {
+        name: compare_columns(before[name], after[name])
+        for name in after
+        if name in before
+    }
+
+    return {
+        "num_records": (previous["num_records"], current["num_records"]),
+        "added": [name for name in after if name not in before],
+        "removed": [name for name in before if name not in after],
+        "columns": columns,
+        "drifted": [name for name, column in columns.items() if column["reasons"]],
+    }
+
+
+def describe_drift(report):
+    before, after = report["num_records"]
+    lines = [f"Records: {before} -> {after}"]
+    if report["added"]:
+        lines.append(f"New columns: {', '.join(report['added'])}")
+    if report["removed"]:
+        lines.append(f"Dropped columns: {', '.join(report['removed'])}")
+    for name in report["drifted"]:
+        lines.append(f"{name}: {'; '.join(report['columns'][name]['reasons'])}")
+    if len(lines) == 1:
+        lines.append("No drift since the last edition.")
+    return "\n".join(lines)
@@ -0,0 +1,197 @@
+"""
+Bulk export of the catalog to JSON Lines or Parquet, one file per table
+plus a manifest.
+
+Rows are read through a server-side cursor (yield_per) and written a
+batch at a time, so memory is bounded by the batch size however large
+the catalog is. All tables are read in one repeatable-read transaction on
+postgres, so the files agree with each other.
+
+With `since`, only rows changed after it are written: datasets, variables,
+keywords and editions by their updated_at, and the tags of the changed
+datasets (tags only change when their dataset does). Deleted rows can't
+show up in an incremental export; the manifest's full table counts let a
+consumer notice and re-export everything. The manifest's `exported_at` is
+the database's clock when the export started. Registrations still in
+flight then commit with an earlier updated_at, so the next `since` should
+be a few minutes before it (catalog.SYNC_OVERLAP is what the cache uses),
+with rows de-duplicated by id downstream.
+"""
+
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import JSON, Date, DateTime, Integer, Numeric, func, select
+
+from . import schema
+
+
+FORMATS = ("jsonl", "parquet")
+BATCH_SIZE = 10_000
+
+MANIFEST_VERSION = 1
+
+# Generated for postgres' full text search; nothing downstream needs them.
+SKIPPED_COLUMNS = {"search_vector"}
+
+TABLES = [schema.datasets, schema.variables, schema.editions, schema.keywords, schema.tags]
+
+
+def export_columns(table):
+    return [column for column in table.columns if column.name not in SKIPPED_COLUMNS]
+
+
+def _changed_since(stmt, table, since):
+    if "updated_at" in table.c:
+        return stmt.where(table.c.updated_at > since)
+
+    # tags: rows of the datasets that changed.
+    changed = select(schema.datasets.c.id).where(schema.datasets.c.updated_at > since)
+    return stmt.where(table.c.dataset_id.in_(changed))
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Can't export {type(value).__name__} values.")
+
+
+class JsonLinesWriter:
+    suffix = ".jsonl"
+
+    def __init__(self, path, columns):
+        self.file = open(path, "w")
+        self.names = [column.name for column in columns]
+        # json.dumps with a default builds a new encoder every call.
+        self.encode = json.JSONEncoder(default=_json_default).encode
+
+    def write(self, rows):
+        self.file.writelines(
+            self.encode(dict(zip(self.names, row))) + "\n" for row in rows
+        )
+
+    def close(self):
+        self.file.close()
+
+
+def _arrow_type(column):
+    import pyarrow as pa
+
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us", tz="UTC") if column.type.timezone else pa.timestamp("us")
+    if isinstance(column.type, Date):
+        return pa.date32()
+    if isinstance(column.type, Numeric):
+        return pa.float64()
+    # Text, and json columns as their serialized text.
+    return pa.string()
+
+
+class ParquetWriter:
+    suffix = ".parquet"
+
+    def __init__(self, path, columns):
+        from .sources import _import_pyarrow
+
+        pa = _import_pyarrow()
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.columns = columns
+        self.json_columns = {
+            i for i, column in enumerate(columns) if isinstance(column.type, JSON)
+        }
+        self.schema = pa.schema(
+            [pa.field(column.name, _arrow_type(column), column.nullable) for column in columns]
+        )
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        arrays = []
+        for i, field in enumerate(self.schema):
+            values = [row[i] for row in rows]
+            if i in self.json_columns:
+                values = [
+                    None if value is None else json.dumps(value, default=_json_default)
+                    for value in values
+                ]
+            elif field.type == self.pa.float64():
+                values = [None if value is None else float(value) for value in values]
+            arrays.append(self.pa.array(values, type=field.type))
+
+        # Each batch becomes one row group.
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"jsonl": JsonLinesWriter, "parquet": ParquetWriter}
+
+
+def export_catalog(md, out_dir, format="jsonl", since=None, batch_size=BATCH_SIZE):
+    """
+    Writes every catalog table into out_dir and returns the manifest,
+    which is also written there as manifest.json.
+    """
+    if format not in WRITERS:
+        raise ValueError(f"The format must be one of {', '.join(FORMATS)}.")
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    writer_class = WRITERS[format]
+
+    with md.db_engine.connect() as db:
+        if db.dialect.name == "postgresql":
+            db = db.execution_options(isolation_level="REPEATABLE READ")
+
+        with db.begin():
+            exported_at = db.execute(select(func.now())).scalar()
+            if isinstance(exported_at, str):
+                # sqlite hands back text.
+                exported_at = datetime.fromisoformat(exported_at)
+
+            tables = {}
+            for table in TABLES:
+                columns = export_columns(table)
+                stmt = select(*columns).order_by(*table.primary_key.columns)
+                if since is not None:
+                    stmt = _changed_since(stmt, table, since)
+
+                path = out_dir / f"{table.name}{writer_class.suffix}"
+                tmp = path.with_name(path.name + ".tmp")
+                written = 0
+
+                writer = writer_class(tmp, columns)
+                try:
+                    result = db.execute(stmt.execution_options(yield_per=batch_size))
+                    for rows in result.partitions():
+                        writer.write(rows)
+                        written += len(rows)
+                finally:
+                    writer.close()
+                os.replace(tmp, path)
+
+                tables[table.name] = {
+                    "file": path.name,
+                    "rows": written,
+                    "total_rows": db.execute(select(func.count()).select_from(table)).scalar(),
+                }
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "format": format,
+        "exported_at": exported_at.isoformat(),
+        "since": since.isoformat() if since is not None else None,
+        "tables": tables,
+    }
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, indent=2) + "\n")
+
+    return manifest
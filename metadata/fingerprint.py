@@ -0,0 +1,47 @@
+"""
+Schema fingerprints: a canonical hash of a file's column names and inferred
+types, stored on each dataset so an incoming file can be matched to the
+dataset it's an edition of with one indexed lookup.
+"""
+
+import hashlib
+
+
+def schema_fingerprint(column_types: dict):
+    """
+    sha256 over the sorted 'name<TAB>type' lines, so column order doesn't
+    matter but names and types do.
+    """
+    canonical = "\n".join(
+        f"{name}\t{data_type}" for name, data_type in sorted(column_types.items())
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def source_fingerprint(source):
+    profile = source.profile()
+    return schema_fingerprint(
+        {name: profile.loc[name, "inferred_type"] for name in source.columns}
+    )
+
+
+def column_diff(expected, actual):
+    """
+    Returns (missing, extra): the expected columns the file doesn't have
+    and the file's columns that weren't expected, each in its original
+    order.
+    """
+    expected_set, actual_set = set(expected), set(actual)
+    return (
+        [name for name in expected if name not in actual_set],
+        [name for name in actual if name not in expected_set],
+    )
+
+
+def describe_diff(missing, extra):
+    lines = []
+    if missing:
+        lines.append(f"Missing from the file: {', '.join(missing)}")
+    if extra:
+        lines.append(f"Not in the registered dataset: {', '.join(extra)}")
+    return "\n".join(lines)
@@ -0,0 +1,192 @@
+"""
+Parent variable detection. In census-style tables a parent is usually the
+exact sum of its children (total = male + female), and a child is always
+at most its parent, so both can be found from the data:
+
+  1. Screening. On SCREEN_ROWS rows drawn at random from the sample (which
+     comes in file order, often sorted), a dominance matrix says which
+     columns are >= which others in every row, computed a block of columns
+     at a time against all of them.
+     Unrelated columns almost never survive even this many rows.
+  2. Verification. The pairs that survive are checked against the whole
+     sample (the profile's sample of up to 100,000 rows).
+  3. Direct parents. Dominance is transitive (total >= male >= male_u18),
+     so a column's direct parents are the ones with nothing dominating it
+     in between: D & ~(D @ D).
+  4. Sums. Every parent's direct children are summed a row at a time
+     and compared with the parent. Where that isn't exact
+     (a parent with a stray dominated column), least squares on the first
+     SOLVE_ROWS rows picks the subset with weights of one, which is then
+     verified against the whole sample.
+
+Only non-negative, non-constant numeric columns take part. A parent that
+only dominates a column (no exact sum) has to be a plausible total for
+it: the column's median share of it must be at least MIN_SHARE, which
+keeps ids and years from being everything's parent, and the two have to
+rise and fall together (MIN_CORRELATION).
+"""
+
+import numpy as np
+import pandas as pd
+
+from .profile import numeric_block
+
+
+SCREEN_ROWS = 64
+SOLVE_ROWS = 1_000
+
+# Columns of the dominance matrix computed at once, and cells per chunk when
+# verifying pairs, to keep the temporary arrays to tens of megabytes.
+BLOCK = 32
+VERIFY_CELLS = 4_000_000
+VERIFY_STAGE = 1_000
+
+# Rows where both columns have a value before one can be the other's parent.
+MIN_ROWS = 10
+MIN_SHARE = 0.01
+MIN_CORRELATION = 0.3
+
+# Least squares weights this close to one are taken as part of a sum.
+WEIGHT_TOLERANCE = 0.01
+
+
+def _candidate_columns(sample: pd.DataFrame, columns):
+    X = numeric_block(sample, columns).to_numpy()
+    with np.errstate(invalid="ignore"):
+        lo, hi = np.nanmin(X, axis=0, initial=np.inf), np.nanmax(X, axis=0, initial=-np.inf)
+    keep = (lo >= 0) & (hi > lo) & np.isfinite(hi)
+    return [name for name, kept in zip(columns, keep) if kept], X[:, keep]
+
+
+def dominance(X):
+    """
+    D[p, c] is True when column p >= column c in every row where both have
+    a value (at least MIN_ROWS of them) and > in at least one.
+    """
+    present = ~np.isnan(X)
+    m = X.shape[1]
+    D = np.zeros((m, m), dtype=bool)
+
+    for start in range(0, m, BLOCK):
+        block = slice(start, start + BLOCK)
+        P, C = X[:, block, None], X[:, None, :]
+        both = present[:, block, None] & present[:, None, :]
+        with np.errstate(invalid="ignore"):
+            ge = ((P >= C) | ~both).all(axis=0)
+            gt = ((P > C) & both).any(axis=0)
+        D[block] = ge & gt & (both.sum(axis=0) >= MIN_ROWS)
+
+    return D
+
+
+def _verify(X, parents, children):
+    """
+    Which of the (parent, child) pairs hold in every row of X. Pairs are
+    checked on the first VERIFY_STAGE rows before the rest, since the
+    screen lets through pairs that only held by chance and those rarely
+    last that long.
+    """
+    if len(X) > VERIFY_STAGE:
+        ok = _verify(X[:VERIFY_STAGE], parents, children)
+        ok[ok] = _verify(X[VERIFY_STAGE:], parents[ok], children[ok])
+        return ok
+
+    ok = np.empty(len(parents), dtype=bool)
+    step = max(1, VERIFY_CELLS // max(len(X), 1))
+    for start in range(0, len(parents), step):
+        p, c = parents[start : start + step], children[start : start + step]
+        Xp, Xc = X[:, p], X[:, c]
+        with np.errstate(invalid="ignore"):
+            ok[start : start + step] = ((Xp >= Xc) | np.isnan(Xp) | np.isnan(Xc)).all(axis=0)
+    return ok
+
+
+def _exact(total, parts):
+    return bool(np.allclose(parts, total, rtol=1e-9, atol=1e-6))
+
+
+def _sums(X, direct):
+    """
+    {parent: [children]} for parents that are exactly the sum of some of
+    their direct children.
+    """
+    sums_found = {}
+
+    for p in np.flatnonzero(direct.sum(axis=1) >= 2):
+        kids = np.flatnonzero(direct[p])
+        rows = ~np.isnan(X[:, p])
+        total, parts = X[rows, p], np.nan_to_num(X[:, kids][rows])
+        if _exact(total, parts.sum(axis=1)):
+            sums_found[p] = list(kids)
+            continue
+
+        # Some of the dominated columns aren't parts; find the ones that are.
+        weights, *_ = np.linalg.lstsq(parts[:SOLVE_ROWS], total[:SOLVE_ROWS], rcond=None)
+        chosen = np.abs(weights - 1) < WEIGHT_TOLERANCE
+        if chosen.sum() >= 2 and _exact(total, parts[:, chosen].sum(axis=1)):
+            sums_found[p] = list(kids[chosen])
+
+    return sums_found
+
+
+def _correlation(a, b):
+    both = ~(np.isnan(a) | np.isnan(b))
+    a, b = a[both], b[both]
+    if a.std() == 0 or b.std() == 0:
+        return 0.0
+    return float(np.corrcoef(a, b)[0, 1])
+
+
+def detect_parents(sample: pd.DataFrame, columns=None, screen_rows=SCREEN_ROWS):
+    """
+    Candidate parents for each column that has any, best first:
+
+        {child: [{"parent": name, "kind": "sum" or "subset", "parts": [...]}, ...]}
+
+    "sum" means the parent is exactly the sum of `parts`, this column among
+    them; "subset" only that the column never exceeds the parent. Exact
+    sums come first, then the parents the column makes up most of.
+    """
+    names, X = _candidate_columns(sample, list(columns or sample.columns))
+    if len(names) < 2:
+        return {}
+
+    # At random rather than the first rows: a file sorted by one column
+    # starts with the rows where it and its parts are all zero.
+    screen = np.random.default_rng(0).choice(len(X), min(screen_rows, len(X)), replace=False)
+    D = dominance(X[np.sort(screen)])
+
+    parents, children = np.nonzero(D)
+    held = _verify(X, parents, children)
+    D[parents[~held], children[~held]] = False
+
+    Di = D.astype("int32")
+    direct = D & ((Di @ Di) == 0)
+
+    sums = _sums(X, direct)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        candidates = {}
+        for p, c in zip(*np.nonzero(direct)):
+            if c in sums.get(p, ()):
+                kind, parts = "sum", [names[i] for i in sums[p]]
+                share = 1.0
+            else:
+                kind, parts = "subset", []
+                share = np.nanmedian(X[:, c] / X[:, p])
+                if not share >= MIN_SHARE or not _correlation(X[:, p], X[:, c]) >= MIN_CORRELATION:
+                    continue
+            candidates.setdefault(names[c], []).append(
+                ({"parent": names[p], "kind": kind, "parts": parts}, kind != "sum", -share)
+            )
+
+    return {
+        child: [candidate for candidate, *_ in sorted(found, key=lambda item: item[1:])]
+        for child, found in candidates.items()
+    }
+
+
+def describe_candidate(candidate):
+    if candidate["kind"] == "sum":
+        return f"{candidate['parent']} = {' + '.join(candidate['parts'])}"
+    return f"never more than {candidate['parent']}"
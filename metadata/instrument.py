@@ -0,0 +1,279 @@
+"""
+Timing for queries and registration phases.
+
+Nothing is measured until enable() is called, either directly or by
+get_engine when config.toml has
+
+    [instrumentation]
+    enabled = true
+    prometheus_file = "logs/metrics.prom"   # optional
+
+Once enabled, every statement the engine runs is timed through its
+cursor events, and every span() is timed. Each one is logged as a JSON
+line on the 'metadata.metrics' logger (see logging_config.json) and
+added to running totals that prometheus() renders in the Prometheus
+text format. While disabled, span() hands back the same no-op context
+manager and no engine has listeners, so the cost is a global lookup.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+
+logger = logging.getLogger("metadata.metrics")
+
+_metrics = None
+_disabled = nullcontext()
+
+
+class Metrics:
+    """
+    Running totals, keyed by statement verb (SELECT, INSERT, ...) and span
+    name. Safe to update from the bulk registration workers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.statements = defaultdict(lambda: {"count": 0, "seconds": 0.0, "rows": 0})
+        self.errors = defaultdict(int)
+        self.spans = defaultdict(lambda: {"count": 0, "seconds": 0.0})
+
+    def record_statement(self, verb, seconds, rows):
+        with self.lock:
+            totals = self.statements[verb]
+            totals["count"] += 1
+            totals["seconds"] += seconds
+            totals["rows"] += max(rows, 0)
+
+    def record_error(self, verb):
+        with self.lock:
+            self.errors[verb] += 1
+
+    def record_span(self, name, seconds):
+        with self.lock:
+            totals = self.spans[name]
+            totals["count"] += 1
+            totals["seconds"] += seconds
+
+    @property
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+
+def _verb(statement):
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "EMPTY"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["metrics_started"].pop()
+    if _metrics is None:
+        return
+    verb = _verb(statement)
+    # -1 when the driver can't say, e.g. SELECTs in most DBAPIs before fetching.
+    rows = cursor.rowcount
+
+    _metrics.record_statement(verb, seconds, rows)
+    logger.info(
+        "sql",
+        extra={
+            "metrics": {
+                "event": "sql",
+                "verb": verb,
+                "ms": round(seconds * 1000, 3),
+                "rows": rows,
+                "executemany": executemany,
+                "span": _metrics.stack[-1] if _metrics.stack else None,
+                "statement": " ".join(statement.split())[:200],
+            }
+        },
+    )
+
+
+def _handle_error(context):
+    started = context.connection.info.get("metrics_started") if context.connection else None
+    if started:
+        started.pop()
+    if _metrics is not None:
+        _metrics.record_error(_verb(context.statement or ""))
+
+
+def instrument_engine(engine):
+    """
+    Times the engine's statements. Only does anything once enable() has
+    been called, and attaching twice is harmless.
+    """
+    from sqlalchemy import event
+
+    if _metrics is None or event.contains(
+        engine, "before_cursor_execute", _before_cursor_execute
+    ):
+        return engine
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    return engine
+
+
+def enable(engine=None, prometheus_file=None):
+    """
+    Starts collecting. Pass the engine to time its statements (get_engine
+    does this itself), and a file to write prometheus() to at exit.
+    """
+    global _metrics
+
+    if _metrics is None:
+        _metrics = Metrics()
+        if prometheus_file:
+            atexit.register(write_prometheus, prometheus_file)
+
+    if engine is not None:
+        instrument_engine(engine)
+    return _metrics
+
+
+def disable():
+    """
+    Stops collecting and forgets the totals. Engines already instrumented
+    keep their listeners, so this is meant for tests.
+    """
+    global _metrics
+    _metrics = None
+
+
+def enabled():
+    return _metrics is not None
+
+
+def span(name, **fields):
+    """
+    Times a block as one phase of a larger operation:
+
+        with span("registration.variables", dataset=name):
+            ...
+
+    Spans nest; statements and inner spans record the innermost one.
+    """
+    if _metrics is None:
+        return _disabled
+    return _timed_span(name, fields)
+
+
+@contextmanager
+def _timed_span(name, fields):
+    metrics = _metrics
+    parent = metrics.stack[-1] if metrics.stack else None
+    metrics.stack.append(name)
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        metrics.stack.pop()
+        metrics.record_span(name, seconds)
+        logger.info(
+            name,
+            extra={
+                "metrics": {
+                    "event": "span",
+                    "span": name,
+                    "parent": parent,
+                    "ms": round(seconds * 1000, 3),
+                    "failed": failed,
+                    **fields,
+                }
+            },
+        )
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus(metrics=None):
+    """
+    The running totals in the Prometheus text exposition format.
+    """
+    metrics = metrics or _metrics
+    if metrics is None:
+        return ""
+
+    with metrics.lock:
+        statements = {verb: dict(totals) for verb, totals in metrics.statements.items()}
+        errors = dict(metrics.errors)
+        spans = {name: dict(totals) for name, totals in metrics.spans.items()}
+
+    lines = []
+
+    def family(name, kind, help, label, samples):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, value in sorted(samples.items()):
+            lines.append(f'{name}{{{label}="{_label(key)}"}} {value}')
+
+    family(
+        "metadata_sql_statements_total",
+        "counter",
+        "Statements sent to the database (one round trip each).",
+        "verb",
+        {verb: totals["count"] for verb, totals in statements.items()},
+    )
+    family(
+        "metadata_sql_seconds_total",
+        "counter",
+        "Time spent executing statements.",
+        "verb",
+        {verb: round(totals["seconds"], 6) for verb, totals in statements.items()},
+    )
+    family(
+        "metadata_sql_rows_total",
+        "counter",
+        "Rows the driver reported as affected or returned.",
+        "verb",
+        {verb: totals["rows"] for verb, totals in statements.items()},
+    )
+    family(
+        "metadata_sql_errors_total",
+        "counter",
+        "Statements that raised.",
+        "verb",
+        errors,
+    )
+    family(
+        "metadata_span_total",
+        "counter",
+        "Completed spans.",
+        "span",
+        {name: totals["count"] for name, totals in spans.items()},
+    )
+    family(
+        "metadata_span_seconds_total",
+        "counter",
+        "Time spent in spans, including nested ones.",
+        "span",
+        {name: round(totals["seconds"], 6) for name, totals in spans.items()},
+    )
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(prometheus())
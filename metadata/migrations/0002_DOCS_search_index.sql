@@ -0,0 +1,41 @@
+-- Full-text search over the catalog. The vectors are generated columns so
+-- they're kept current by postgres on every insert/update, and each one
+-- gets a GIN index so '@@' lookups don't scan the table.
+--
+-- Weights follow ts_rank's defaults: A = 1.0, B = 0.4, C = 0.2, D = 0.1.
+
+ALTER TABLE datasets
+    ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(table_name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(universe, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(notes, '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS datasets_search_vector_idx
+    ON datasets USING GIN (search_vector);
+
+
+ALTER TABLE variables
+    ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(variable_name, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'A')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS variables_search_vector_idx
+    ON variables USING GIN (search_vector);
+
+
+ALTER TABLE keywords
+    ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(content, '')), 'A')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS keywords_search_vector_idx
+    ON keywords USING GIN (search_vector);
+
+CREATE INDEX IF NOT EXISTS tags_kw_id_idx ON tags (kw_id);
+CREATE INDEX IF NOT EXISTS variables_dataset_id_idx ON variables (dataset_id);
@@ -0,0 +1,3 @@
+-- Column profiles computed at registration (see metadata/profile.py).
+
+ALTER TABLE variables ADD COLUMN IF NOT EXISTS profile JSONB;
@@ -0,0 +1,32 @@
+-- Keyword registration upserts on content (ON CONFLICT (content)), which
+-- needs a unique constraint to target. Any duplicates that already exist
+-- are folded into the lowest id first, carrying their tags along.
+
+CREATE TEMPORARY TABLE keyword_merges ON COMMIT DROP AS
+SELECT dup.id AS old_id, keep.id AS new_id
+FROM keywords dup
+JOIN (
+    SELECT min(id) AS id, content FROM keywords GROUP BY content
+) keep ON keep.content = dup.content AND keep.id <> dup.id;
+
+-- Move each dataset's tag over once, unless it already has the kept keyword.
+UPDATE tags t
+SET kw_id = m.new_id
+FROM keyword_merges m
+WHERE t.kw_id = m.old_id
+  AND NOT EXISTS (
+      SELECT 1 FROM tags kept
+      WHERE kept.dataset_id = t.dataset_id AND kept.kw_id = m.new_id
+  )
+  AND t.kw_id = (
+      SELECT min(other.kw_id)
+      FROM tags other
+      JOIN keyword_merges om ON om.old_id = other.kw_id
+      WHERE other.dataset_id = t.dataset_id AND om.new_id = m.new_id
+  );
+
+DELETE FROM tags t USING keyword_merges m WHERE t.kw_id = m.old_id;
+DELETE FROM keywords k USING keyword_merges m WHERE k.id = m.old_id;
+
+ALTER TABLE keywords
+    ADD CONSTRAINT keywords_content_key UNIQUE (content);
@@ -0,0 +1,64 @@
+-- Change tracking for the local catalog cache (metadata/catalog.py), which
+-- only re-reads rows changed since its last sync. A dataset counts as
+-- changed whenever one of its variables is added, edited or removed.
+
+ALTER TABLE datasets ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+ALTER TABLE variables ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+ALTER TABLE keywords ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS datasets_updated_at_idx ON datasets (updated_at);
+CREATE INDEX IF NOT EXISTS keywords_updated_at_idx ON keywords (updated_at);
+
+
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables only exist for the events that have them, so the
+-- dataset touch is split into one statement-level trigger per event.
+CREATE OR REPLACE FUNCTION touch_inserted_variable_dataset() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE datasets SET updated_at = now()
+    WHERE id IN (SELECT DISTINCT dataset_id FROM new_rows);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION touch_deleted_variable_dataset() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE datasets SET updated_at = now()
+    WHERE id IN (SELECT DISTINCT dataset_id FROM old_rows);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE TRIGGER datasets_touch_updated_at
+    BEFORE UPDATE ON datasets
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+CREATE TRIGGER variables_touch_updated_at
+    BEFORE UPDATE ON variables
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+CREATE TRIGGER keywords_touch_updated_at
+    BEFORE UPDATE ON keywords
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+CREATE TRIGGER variables_touch_dataset_on_insert
+    AFTER INSERT ON variables
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_inserted_variable_dataset();
+
+CREATE TRIGGER variables_touch_dataset_on_update
+    AFTER UPDATE ON variables
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_inserted_variable_dataset();
+
+CREATE TRIGGER variables_touch_dataset_on_delete
+    AFTER DELETE ON variables
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_deleted_variable_dataset();
@@ -0,0 +1,8 @@
+-- sha256 of a dataset's column names and inferred types (see
+-- metadata/fingerprint.py), used to match incoming files to datasets.
+-- Existing datasets get theirs the next time an edition is registered.
+
+ALTER TABLE datasets ADD COLUMN IF NOT EXISTS schema_fingerprint CHAR(64);
+
+CREATE INDEX IF NOT EXISTS datasets_schema_fingerprint_idx
+    ON datasets (schema_fingerprint);
@@ -0,0 +1,7 @@
+-- Registration treats table_name as the dataset's key, and concurrent bulk
+-- registrations need the database to enforce that. If this fails, rename
+-- the duplicates reported by:
+--     SELECT table_name, count(*) FROM datasets GROUP BY 1 HAVING count(*) > 1;
+
+ALTER TABLE datasets
+    ADD CONSTRAINT datasets_table_name_key UNIQUE (table_name);
@@ -0,0 +1,9 @@
+-- A per-column statistics snapshot for each edition (see metadata/drift.py):
+-- counts, nulls, distinct estimate, range, quantile grid and top values.
+-- New editions are compared against the previous one's snapshot, so older
+-- files never need to be read again. Existing editions stay NULL.
+
+ALTER TABLE editions ADD COLUMN IF NOT EXISTS statistics JSONB;
+
+CREATE INDEX IF NOT EXISTS editions_dataset_publish_idx
+    ON editions (dataset_id, publish_date DESC);
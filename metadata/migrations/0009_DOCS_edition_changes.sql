@@ -0,0 +1,12 @@
+-- Editions get the same change tracking as the other catalog tables (see
+-- 0005_DOCS_catalog_changes.sql) so incremental exports can pick up new
+-- and corrected editions. Existing editions are stamped with the time this
+-- runs, so the first incremental export after it includes all of them.
+
+ALTER TABLE editions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS editions_updated_at_idx ON editions (updated_at);
+
+CREATE TRIGGER editions_touch_updated_at
+    BEFORE UPDATE ON editions
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
@@ -0,0 +1,26 @@
+-- Standards registry (see metadata/standards.py). A standard is a name
+-- plus what its values look like: a regular expression every value must
+-- match in full and/or a reference list of codes. `width` zero-pads
+-- integer columns back out before matching, since CSV readers turn FIPS
+-- codes like 01001 into 1001. Variables link to at most one standard.
+
+ALTER TABLE standards ADD COLUMN IF NOT EXISTS name VARCHAR(256);
+ALTER TABLE standards ADD COLUMN IF NOT EXISTS pattern TEXT;
+ALTER TABLE standards ADD COLUMN IF NOT EXISTS codes JSONB;
+ALTER TABLE standards ADD COLUMN IF NOT EXISTS width INTEGER;
+ALTER TABLE standards ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+-- Standards that predate names are known by their description.
+UPDATE standards SET name = coalesce(description, 'standard ' || id) WHERE name IS NULL;
+ALTER TABLE standards ALTER COLUMN name SET NOT NULL;
+ALTER TABLE standards ADD CONSTRAINT standards_name_key UNIQUE (name);
+
+CREATE INDEX IF NOT EXISTS standards_updated_at_idx ON standards (updated_at);
+
+CREATE TRIGGER standards_touch_updated_at
+    BEFORE UPDATE ON standards
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+ALTER TABLE variables ADD COLUMN IF NOT EXISTS standard_id INTEGER REFERENCES standards (id);
+
+CREATE INDEX IF NOT EXISTS variables_standard_id_idx ON variables (standard_id);
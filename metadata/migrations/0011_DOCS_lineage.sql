@@ -0,0 +1,50 @@
+-- Lineage: which datasets are derived from which, and which projects use
+-- them. Replaces the sketch that was in migration_drafts/phase_two.sql, whose
+-- `sources` are datasets here.
+--
+-- `derivations` holds the edges as they're recorded. `lineage` is their
+-- transitive closure, one row per (ancestor, descendant) pair with the
+-- length of the shortest path between them, kept up to date as edges are
+-- added (MetadataConnection.add_derivations) so upstream, downstream and
+-- impact questions are a single indexed lookup rather than a recursive
+-- walk. MetadataConnection.rebuild_lineage recomputes it from scratch.
+
+CREATE TABLE IF NOT EXISTS projects
+(
+    id                  SERIAL PRIMARY KEY,
+    project_name        VARCHAR(256) NOT NULL UNIQUE,
+    project_description TEXT,
+    start_date          TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS usages
+(
+    dataset_id  INTEGER REFERENCES datasets (id),
+    project_id  INTEGER REFERENCES projects (id),
+    description TEXT,
+    PRIMARY KEY (dataset_id, project_id)
+);
+
+CREATE INDEX IF NOT EXISTS usages_project_id_idx ON usages (project_id);
+
+CREATE TABLE IF NOT EXISTS derivations
+(
+    parent_id   INTEGER REFERENCES datasets (id),
+    child_id    INTEGER REFERENCES datasets (id),
+    description TEXT,
+    PRIMARY KEY (parent_id, child_id),
+    CHECK (parent_id <> child_id)
+);
+
+CREATE INDEX IF NOT EXISTS derivations_child_id_idx ON derivations (child_id);
+
+CREATE TABLE IF NOT EXISTS lineage
+(
+    ancestor_id   INTEGER REFERENCES datasets (id),
+    descendant_id INTEGER REFERENCES datasets (id),
+    depth         INTEGER NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id)
+);
+
+-- The primary key serves downstream lookups; this one upstream.
+CREATE INDEX IF NOT EXISTS lineage_descendant_idx ON lineage (descendant_id, ancestor_id);
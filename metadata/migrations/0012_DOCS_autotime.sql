@@ -0,0 +1,153 @@
+-- Autotime: the stretch of time each dataset covers (see
+-- metadata/autotime.py, which does the same derivation for the local
+-- path). `autotime` is the per-dataset summary from the design doc;
+-- `coverage` holds its contiguous intervals, one row each, for "which
+-- tract-level datasets cover 2019-Q3" lookups through the GiST index on
+-- (frame_type, period).
+--
+-- Both are kept up to date by triggers rather than by the application, so
+-- registering an edition costs no extra round trips: refresh_coverage
+-- rewrites the given datasets' rows from their editions, widening each
+-- edition to whole periods of the cadence and merging them with
+-- range_agg (postgres 14+).
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+CREATE TABLE IF NOT EXISTS autotime
+(
+    dataset_id     INTEGER PRIMARY KEY REFERENCES datasets (id),
+    frame_type     VARCHAR(256),
+    resolution     VARCHAR(32),
+    available_from DATE,
+    available_to   DATE,
+    gaps           JSONB
+);
+
+CREATE TABLE IF NOT EXISTS coverage
+(
+    id           SERIAL PRIMARY KEY,
+    dataset_id   INTEGER NOT NULL REFERENCES datasets (id),
+    frame_type   VARCHAR(256),
+    period_start DATE NOT NULL,
+    period_end   DATE NOT NULL,
+    period       DATERANGE GENERATED ALWAYS AS (daterange(period_start, period_end, '[]')) STORED
+);
+
+CREATE INDEX IF NOT EXISTS coverage_dataset_id_idx ON coverage (dataset_id);
+CREATE INDEX IF NOT EXISTS coverage_period_idx ON coverage USING gist (frame_type, period);
+
+-- What refresh_coverage reads a dataset's editions by.
+CREATE INDEX IF NOT EXISTS editions_dataset_id_idx ON editions (dataset_id);
+
+CREATE OR REPLACE FUNCTION refresh_coverage(dataset_ids INTEGER[]) RETURNS void AS $$
+BEGIN
+    DELETE FROM coverage WHERE dataset_id = ANY (dataset_ids);
+    DELETE FROM autotime WHERE dataset_id = ANY (dataset_ids);
+
+    WITH frames AS (
+        SELECT
+            id AS dataset_id,
+            nullif(
+                regexp_replace(
+                    regexp_replace(lower(trim(both from unit_of_analysis)), '\s+', ' ', 'g'),
+                    '[ -]level$', ''
+                ),
+                ''
+            ) AS frame_type,
+            CASE WHEN cadence IN ('month', 'quarter', 'year') THEN cadence ELSE 'none' END AS resolution
+        FROM datasets
+        WHERE id = ANY (dataset_ids)
+    ),
+    steps AS (
+        SELECT
+            *,
+            CASE resolution
+                WHEN 'month' THEN interval '1 month'
+                WHEN 'quarter' THEN interval '3 months'
+                WHEN 'year' THEN interval '1 year'
+            END AS step
+        FROM frames
+    ),
+    spans AS (
+        SELECT
+            steps.dataset_id,
+            CASE WHEN step IS NULL THEN first_day
+                 ELSE date_trunc(resolution, first_day)::date END AS span_start,
+            CASE WHEN step IS NULL THEN last_day
+                 ELSE (date_trunc(resolution, last_day) + step - interval '1 day')::date END AS span_end
+        FROM steps
+        JOIN LATERAL (
+            SELECT
+                least(coalesce(collection_start, collection_end), coalesce(collection_end, collection_start)) AS first_day,
+                greatest(coalesce(collection_start, collection_end), coalesce(collection_end, collection_start)) AS last_day
+            FROM editions
+            WHERE editions.dataset_id = steps.dataset_id
+        ) AS edition ON edition.first_day IS NOT NULL
+    ),
+    merged AS (
+        SELECT dataset_id, range_agg(daterange(span_start, span_end, '[]')) AS covered
+        FROM spans
+        GROUP BY dataset_id
+    ),
+    intervals AS (
+        INSERT INTO coverage (dataset_id, frame_type, period_start, period_end)
+        SELECT merged.dataset_id, frames.frame_type, lower(piece), upper(piece) - 1
+        FROM merged
+        JOIN frames USING (dataset_id)
+        CROSS JOIN LATERAL unnest(covered) AS piece
+    )
+    INSERT INTO autotime (dataset_id, frame_type, resolution, available_from, available_to, gaps)
+    SELECT
+        frames.dataset_id,
+        frames.frame_type,
+        frames.resolution,
+        lower(covered),
+        upper(covered) - 1,
+        coalesce(
+            (
+                SELECT jsonb_agg(jsonb_build_array(lower(gap), upper(gap) - 1) ORDER BY lower(gap))
+                FROM unnest(datemultirange(range_merge(covered)) - covered) AS gap
+            ),
+            '[]'
+        )
+    FROM frames
+    LEFT JOIN merged USING (dataset_id);
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION editions_refresh_coverage() RETURNS trigger AS $$
+BEGIN
+    PERFORM refresh_coverage(ARRAY(SELECT DISTINCT dataset_id FROM changed_editions));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION datasets_refresh_coverage() RETURNS trigger AS $$
+BEGIN
+    PERFORM refresh_coverage(ARRAY[NEW.id]);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- Once per statement, so an executemany of editions refreshes each
+-- dataset once.
+CREATE TRIGGER editions_insert_coverage
+    AFTER INSERT ON editions
+    REFERENCING NEW TABLE AS changed_editions
+    FOR EACH STATEMENT EXECUTE FUNCTION editions_refresh_coverage();
+
+CREATE TRIGGER editions_update_coverage
+    AFTER UPDATE ON editions
+    REFERENCING NEW TABLE AS changed_editions
+    FOR EACH STATEMENT EXECUTE FUNCTION editions_refresh_coverage();
+
+CREATE TRIGGER editions_delete_coverage
+    AFTER DELETE ON editions
+    REFERENCING OLD TABLE AS changed_editions
+    FOR EACH STATEMENT EXECUTE FUNCTION editions_refresh_coverage();
+
+CREATE TRIGGER datasets_coverage
+    AFTER INSERT OR UPDATE OF cadence, unit_of_analysis ON datasets
+    FOR EACH ROW EXECUTE FUNCTION datasets_refresh_coverage();
+
+SELECT refresh_coverage(ARRAY(SELECT id FROM datasets));
@@ -0,0 +1,9 @@
+-- sha256 of each edition's file (see metadata/digest.py), so a file that's
+-- already been documented isn't registered as a new edition again. Older
+-- editions, and editions documented from a DataFrame, have none.
+
+ALTER TABLE editions ADD COLUMN IF NOT EXISTS content_digest CHAR(64);
+ALTER TABLE editions ADD COLUMN IF NOT EXISTS content_size BIGINT;
+
+CREATE INDEX IF NOT EXISTS editions_content_digest_idx
+    ON editions (content_digest, dataset_id);
@@ -0,0 +1,7 @@
+-- What metadata/run_migrations.py records about each migration it applies:
+-- a sha256 of the file, so one that's edited after it ran is caught, and
+-- how long it took. Files applied before this get their checksum the next
+-- time the runner takes its lock.
+
+ALTER TABLE operations ADD COLUMN IF NOT EXISTS checksum CHAR(64);
+ALTER TABLE operations ADD COLUMN IF NOT EXISTS duration_ms DOUBLE PRECISION;
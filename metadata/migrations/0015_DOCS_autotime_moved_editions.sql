@@ -0,0 +1,30 @@
+-- An edition moved to another dataset (its dataset_id updated) left the
+-- dataset it came from with coverage it no longer has: the update trigger
+-- from 0012_DOCS_autotime.sql only refreshed the new dataset_id. Updates
+-- now refresh the datasets on both sides.
+--
+-- 0012 also needs the btree_gist extension for its GiST index on
+-- (frame_type, period). btree_gist is a trusted extension (postgres 13+;
+-- 0012 needs 14+ for range_agg anyway), so a role with CREATE on the
+-- database can install it. Where the migrations run as a role without it,
+-- have a superuser or the database owner run
+--     CREATE EXTENSION IF NOT EXISTS btree_gist;
+-- before migrating.
+
+CREATE OR REPLACE FUNCTION editions_update_refresh_coverage() RETURNS trigger AS $$
+BEGIN
+    PERFORM refresh_coverage(ARRAY(
+        SELECT dataset_id FROM old_editions
+        UNION
+        SELECT dataset_id FROM new_editions
+    ));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS editions_update_coverage ON editions;
+
+CREATE TRIGGER editions_update_coverage
+    AFTER UPDATE ON editions
+    REFERENCING OLD TABLE AS old_editions NEW TABLE AS new_editions
+    FOR EACH STATEMENT EXECUTE FUNCTION editions_update_refresh_coverage();
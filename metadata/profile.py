@@ -0,0 +1,436 @@
+"""
+Column profiling for registration. Everything here works a whole frame
+(or a block of columns) at a time so wide tables don't cost a python loop
+over millions of cells per column.
+"""
+
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+
+# Cells with a value strictly between zero and this are the ones our tools
+# would normally suppress, so they're counted to suggest a threshold.
+SMALL_COUNT_THRESHOLD = 5
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Quantiles and the range of dates stored as text are read from a uniform
+# sample rather than the full column, and types from the head of that sample.
+SAMPLE_ROWS = 100_000
+TYPE_SAMPLE_ROWS = 1_000
+
+# Columns are reduced in blocks of this many so temporary boolean frames
+# stay a bounded multiple of one block rather than the whole table.
+COLUMN_BLOCK = 64
+
+QUANTILE_FIELDS = [f"q{int(q * 100):02d}" for q in QUANTILES]
+
+PROFILE_FIELDS = [
+    "inferred_type",
+    "count",
+    "null_count",
+    "distinct_count",
+    "min",
+    "max",
+    *QUANTILE_FIELDS,
+    "small_count",
+]
+
+
+def sample_rows(df: pd.DataFrame, n=SAMPLE_ROWS, seed=0):
+    if len(df) <= n:
+        return df
+    return df.sample(n=n, random_state=seed)
+
+
+def _all_parse(parsed: pd.Series, original: pd.Series):
+    present = original.notna()
+    return bool(present.any()) and bool(parsed[present].notna().all())
+
+
+def infer_types(df: pd.DataFrame, sample: pd.DataFrame | None = None):
+    """
+    Maps each column to one of the data types registration accepts:
+    'numeric', 'string' or 'date'. Object columns are checked against
+    the sample, numbers first so that '2019' reads as a number. Digits
+    with a leading zero are codes (FIPS, zip), so those stay strings.
+    """
+    sample = (sample_rows(df) if sample is None else sample).head(TYPE_SAMPLE_ROWS)
+    types = {}
+
+    for name in df.columns:
+        dtype = df[name].dtype
+        if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_numeric_dtype(dtype):
+            types[name] = "numeric"
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            types[name] = "date"
+        else:
+            values = sample[name]
+            if values.astype("string").str.match(r"0\d").any():
+                types[name] = "string"
+            elif _all_parse(pd.to_numeric(values, errors="coerce"), values):
+                types[name] = "numeric"
+            elif _all_parse(
+                pd.to_datetime(values, errors="coerce", format="mixed"), values
+            ):
+                types[name] = "date"
+            else:
+                types[name] = "string"
+
+    return pd.Series(types, dtype="object")
+
+
+def numeric_block(df: pd.DataFrame, columns):
+    """
+    The columns as float64, anything that isn't a number as NaN.
+    """
+    block = df[columns]
+    coerce = [
+        name
+        for name in columns
+        if not pd.api.types.is_numeric_dtype(block[name].dtype)
+    ]
+    if coerce:
+        block = block.assign(
+            **{
+                name: pd.to_numeric(block[name], errors="coerce")
+                for name in coerce
+            }
+        )
+    return block.astype("float64")
+
+
+def _numeric_extremes(df: pd.DataFrame, columns, threshold):
+    """
+    Min, max and small-count cells for the given columns, one block of
+    COLUMN_BLOCK columns at a time.
+    """
+    blocks = []
+    for start in range(0, len(columns), COLUMN_BLOCK):
+        block = numeric_block(df, columns[start : start + COLUMN_BLOCK])
+        blocks.append(
+            pd.DataFrame(
+                {
+                    "min": block.min(),
+                    "max": block.max(),
+                    "small_count": ((block > 0) & (block < threshold)).sum(),
+                }
+            )
+        )
+
+    if not blocks:
+        return pd.DataFrame(columns=["min", "max", "small_count"], dtype="object")
+    return pd.concat(blocks)
+
+
+def _fill_from_sample(profile: pd.DataFrame, sample: pd.DataFrame):
+    """
+    Quantiles for numeric columns and the range of text dates, neither of
+    which is worth an exact pass over the full data.
+    """
+    types = profile["inferred_type"]
+
+    numeric_columns = list(types.index[types == "numeric"])
+    for start in range(0, len(numeric_columns), COLUMN_BLOCK):
+        columns = numeric_columns[start : start + COLUMN_BLOCK]
+        quantiles = numeric_block(sample, columns).quantile(list(QUANTILES))
+        profile.loc[columns, QUANTILE_FIELDS] = quantiles.T.to_numpy()
+
+    for name in types.index[types == "date"]:
+        if pd.api.types.is_datetime64_any_dtype(sample[name].dtype):
+            continue
+        values = pd.to_datetime(sample[name], errors="coerce", format="mixed")
+        profile.loc[name, "min"] = values.min()
+        profile.loc[name, "max"] = values.max()
+
+
+def _empty_profile(columns):
+    return pd.DataFrame(index=columns, columns=PROFILE_FIELDS, dtype="object")
+
+
+def profile_frame(df: pd.DataFrame, threshold=SMALL_COUNT_THRESHOLD):
+    """
+    Profiles every column of df and returns a frame indexed by column name
+    with the PROFILE_FIELDS as columns.
+
+    Counts, min/max and small-count cells are exact; quantiles (and the
+    range of dates stored as text) come from a sample of SAMPLE_ROWS rows.
+    """
+    sample = sample_rows(df)
+    types = infer_types(df, sample)
+
+    profile = _empty_profile(df.columns)
+    profile["inferred_type"] = types
+    profile["null_count"] = df.isna().sum()
+    profile["count"] = len(df) - profile["null_count"]
+    profile["distinct_count"] = df.nunique(dropna=True)
+    profile["small_count"] = 0
+
+    numeric_columns = list(types.index[types == "numeric"])
+    extremes = _numeric_extremes(df, numeric_columns, threshold)
+    profile.loc[numeric_columns, ["min", "max", "small_count"]] = extremes
+
+    for name in types.index[types == "date"]:
+        if pd.api.types.is_datetime64_any_dtype(df[name].dtype):
+            profile.loc[name, "min"] = df[name].min()
+            profile.loc[name, "max"] = df[name].max()
+
+    _fill_from_sample(profile, sample)
+
+    return profile
+
+
+class DistinctSketch:
+    """
+    A k-minimum-values sketch of the distinct values in a column. Exact
+    while the column has fewer than k distinct values, and within a few
+    percent above that, in memory that doesn't grow with the data.
+    """
+
+    def __init__(self, k=4096):
+        self.k = k
+        self.hashes = np.empty(0, dtype="uint64")
+
+    def update(self, values: pd.Series):
+        values = values.dropna()
+        if pd.api.types.is_integer_dtype(values.dtype):
+            hashes = pd.util.hash_array(values.to_numpy(dtype="int64"))
+        elif pd.api.types.is_float_dtype(values.dtype):
+            # A chunk of whole numbers reads as int64, or as float64 when a
+            # value is missing; 5.0 is hashed as 5 so both count once.
+            array = values.to_numpy(dtype="float64")
+            whole = (array == np.round(array)) & (np.abs(array) < 2.0**63)
+            hashes = np.concatenate(
+                [
+                    pd.util.hash_array(array[whole].astype("int64")),
+                    pd.util.hash_array(array[~whole]),
+                ]
+            )
+        else:
+            hashes = pd.util.hash_array(values.to_numpy())
+        merged = np.unique(np.concatenate([self.hashes, hashes]))
+        self.hashes = merged[: self.k]
+
+    def estimate(self):
+        if len(self.hashes) < self.k:
+            return len(self.hashes)
+        kth = float(self.hashes[-1]) / 2.0**64
+        return int(round((self.k - 1) / kth))
+
+
+class TopValues:
+    """
+    A Misra-Gries summary of a column's most frequent values. At most
+    `capacity` counters are kept; every value that's more than
+    1/(capacity + 1) of the column is guaranteed a counter, and each
+    count is low by at most that fraction of the values seen.
+    """
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype="int64")
+        self.seen = 0
+
+    def update(self, values: pd.Series):
+        counts = values.value_counts(dropna=True)
+        self.seen += int(counts.sum())
+        merged = self.counts.add(counts, fill_value=0)
+
+        # Merging two summaries: subtract the (capacity + 1)th largest
+        # count from everything and keep what's still positive.
+        if len(merged) > self.capacity:
+            cut = merged.nlargest(self.capacity + 1).iloc[-1]
+            merged = merged[merged > cut] - cut
+
+        self.counts = merged.astype("int64")
+
+    def most_common(self, k):
+        return list(self.counts.nlargest(k).items())
+
+
+def _merge_type(current, new):
+    if current is None or current == new:
+        return new
+    return "string"
+
+
+class ProfileAccumulator:
+    """
+    Builds the same profile as profile_frame from a stream of chunks,
+    holding only running totals, a distinct-count and top-values sketch
+    per column and a bounded uniform sample of rows, so memory doesn't
+    depend on how many chunks go through it.
+
+    Distinct counts are estimates once a column has more than
+    DistinctSketch.k distinct values.
+    """
+
+    def __init__(self, threshold=SMALL_COUNT_THRESHOLD, sample_size=SAMPLE_ROWS, seed=0):
+        self.threshold = threshold
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(seed)
+
+        self.columns = None
+        self.num_records = 0
+        self.types = {}
+        self.null_count = None
+        self.small_count = None
+        self.minimum = {}
+        self.maximum = {}
+        self.sketches = {}
+        self.top = {}
+
+        self.sample = None
+        self._sample_keys = None
+
+    def update(self, chunk: pd.DataFrame):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            self.null_count = pd.Series(0, index=chunk.columns)
+            self.small_count = pd.Series(0, index=chunk.columns)
+            self.sketches = {name: DistinctSketch() for name in chunk.columns}
+            self.top = {name: TopValues() for name in chunk.columns}
+
+        self.num_records += len(chunk)
+        nulls = chunk.isna().sum()
+        self.null_count += nulls
+
+        # Columns with nothing in them this chunk don't get a say in the type.
+        present = nulls.index[nulls < len(chunk)]
+        for name, inferred in infer_types(chunk[present]).items():
+            self.types[name] = _merge_type(self.types.get(name), inferred)
+
+        numeric_columns = [
+            name for name in present if self.types[name] == "numeric"
+        ]
+        extremes = _numeric_extremes(chunk, numeric_columns, self.threshold)
+        self.small_count = self.small_count.add(extremes["small_count"], fill_value=0)
+        for name, row in extremes.iterrows():
+            self._extend(name, row["min"], row["max"])
+
+        for name in present:
+            if pd.api.types.is_datetime64_any_dtype(chunk[name].dtype):
+                self._extend(name, chunk[name].min(), chunk[name].max())
+            self.sketches[name].update(chunk[name])
+            self.top[name].update(chunk[name])
+
+        self._sample(chunk)
+        return self
+
+    def _extend(self, name, low, high):
+        if pd.isna(low):
+            return
+        if name not in self.minimum:
+            self.minimum[name], self.maximum[name] = low, high
+        else:
+            self.minimum[name] = min(self.minimum[name], low)
+            self.maximum[name] = max(self.maximum[name], high)
+
+    def _sample(self, chunk: pd.DataFrame):
+        """
+        Bottom-k sampling: every row draws a random key and the rows with
+        the smallest keys seen so far are kept, which is a uniform sample
+        of everything streamed.
+        """
+        keys = self.rng.random(len(chunk))
+        if self.sample is not None:
+            chunk = pd.concat([self.sample, chunk], ignore_index=True)
+            keys = np.concatenate([self._sample_keys, keys])
+
+        if len(keys) > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size)[: self.sample_size]
+            chunk = chunk.iloc[keep].reset_index(drop=True)
+            keys = keys[keep]
+
+        self.sample = chunk
+        self._sample_keys = keys
+
+    def result(self):
+        profile = _empty_profile(self.columns or [])
+        if self.columns is None:
+            return profile
+
+        profile["inferred_type"] = pd.Series(
+            {name: self.types.get(name, "string") for name in self.columns}
+        )
+        profile["null_count"] = self.null_count
+        profile["count"] = self.num_records - self.null_count
+        profile["distinct_count"] = pd.Series(
+            {name: sketch.estimate() for name, sketch in self.sketches.items()}
+        )
+        profile["small_count"] = 0
+
+        for name in self.minimum:
+            if profile.loc[name, "inferred_type"] in {"numeric", "date"}:
+                profile.loc[name, "min"] = self.minimum[name]
+                profile.loc[name, "max"] = self.maximum[name]
+                if profile.loc[name, "inferred_type"] == "numeric":
+                    profile.loc[name, "small_count"] = self.small_count[name]
+
+        _fill_from_sample(profile, self.sample)
+
+        return profile
+
+
+def json_safe(value):
+    """
+    A profile value as something json.dumps takes: numpy scalars and
+    decimals (parquet and arrow decimal128 columns) as Python numbers, NaN
+    as None and dates as ISO strings.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return None if pd.isna(value) else pd.Timestamp(value).isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (np.integer, np.bool_)):
+        return int(value)
+    if isinstance(value, Decimal):
+        return None if value.is_nan() else float(value)
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else float(value)
+    return value
+
+
+def column_profile(profile: pd.DataFrame, variable_name):
+    """
+    One column of a profile as a plain dict, ready to be stored in the
+    variables.profile json column.
+    """
+    return {
+        field: json_safe(value)
+        for field, value in profile.loc[variable_name].items()
+    }
+
+
+def describe_column(column: dict):
+    """
+    A one-line summary of a column profile for the registration prompts.
+    """
+    summary = (
+        f"{column['inferred_type']}, {column['count']} values, "
+        f"{column['null_count']} nulls"
+    )
+    if column["distinct_count"] is not None:
+        summary += f", {column['distinct_count']} distinct"
+    if column["min"] is not None:
+        summary += f", range {column['min']} to {column['max']}"
+    if column["q50"] is not None:
+        summary += f", median {column['q50']}"
+    return summary
+
+
+def suggested_threshold(column: dict, threshold=SMALL_COUNT_THRESHOLD):
+    """
+    Count-like columns with small cells get the default threshold as a
+    suggestion; everything else gets nothing.
+    """
+    if column["inferred_type"] != "numeric" or not column["small_count"]:
+        return None
+    if column["min"] is not None and column["min"] < 0:
+        return None
+    return threshold
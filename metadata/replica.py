@@ -0,0 +1,400 @@
+"""
+A local sqlite copy of the catalog, so registration can run without the
+central database.
+
+The replica has the same tables as the catalog (built from
+metadata.schema) and is kept in the cache directory. The first refresh
+copies everything, later ones only the rows whose updated_at moved
+(0005_DOCS_catalog_changes.sql), and a count of any replicated table that
+doesn't line up afterwards (something was deleted, or tagged) means a
+full reload. Everything registration reads up front, from completions to
+fingerprint matches, standards and the previous edition's statistics, can
+then come from here through an ordinary MetadataConnection.
+
+Registrations that can't be committed (no connection, or the connection
+dropped) are queued in the same file instead. sync() sends the queue in
+one transaction, one savepoint per registration, after checking each
+against the catalog as it is now:
+
+  - a new dataset whose name was taken in the meantime is a conflict;
+  - so is an edition of a dataset that's gone or whose columns changed;
+  - a keyword that only differs in case or spacing from one that exists
+    now is replaced by the existing one rather than added as a near
+    duplicate.
+
+Conflicting registrations stay queued with the reason, for someone to
+look at (`metadata sync`) and discard. A registration is only removed from
+the queue once the central commit has gone through. If the process dies
+between the two, the next sync finds it already there: a dataset is
+reported as a conflict (its name is taken), and an edition documented
+from a file is recognized by its content digest and dequeued as sent.
+An edition documented from a DataFrame has no digest to be recognized
+by, and would be registered again.
+"""
+
+import hashlib
+import json
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+from returns.result import Success, Failure
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    delete,
+    func,
+    insert,
+    select,
+)
+from sqlalchemy.exc import IntegrityError, InterfaceError, OperationalError
+
+from . import schema
+from .access import MetadataConnection
+from .catalog import SYNC_OVERLAP, default_cache_dir
+from .fingerprint import column_diff, describe_diff
+
+
+# What a dropped or unreachable database raises.
+OFFLINE_ERRORS = (OperationalError, InterfaceError)
+
+BATCH = 10_000
+
+# Copied in this order; variables and tags follow their dataset.
+REPLICATED = [
+    schema.standards,
+    schema.datasets,
+    schema.keywords,
+    schema.variables,
+    schema.tags,
+    schema.editions,
+]
+
+local_metadata = MetaData()
+
+pending = Table(
+    "pending_registrations",
+    local_metadata,
+    Column("id", Integer, primary_key=True),
+    # 'dataset' or 'edition'
+    Column("kind", String(16), nullable=False),
+    Column("dataset_name", String(256), nullable=False),
+    Column("payload", Text, nullable=False),
+    Column("queued_at", DateTime(timezone=True), nullable=False),
+    # Why the last sync couldn't send it, if it couldn't.
+    Column("conflict", Text),
+)
+
+replica_state = Table(
+    "replica_state",
+    local_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("synced_at", DateTime(timezone=True)),
+)
+
+
+class SyncConflict(Exception):
+    pass
+
+
+def replica_path(db_engine, cache_dir=None):
+    """
+    One replica per database, so pointing at a different database never
+    reuses another one's catalog.
+    """
+    url = db_engine.url.render_as_string(hide_password=True)
+    digest = hashlib.sha1(url.encode()).hexdigest()[:12]
+    return Path(cache_dir or default_cache_dir()) / f"replica-{digest}.db"
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Can't queue {type(value).__name__} values.")
+
+
+def _restore_dates(row: dict, table):
+    """
+    Turns the ISO strings a queued row's date columns came back as into
+    dates again.
+    """
+    restored = dict(row)
+    for name, value in row.items():
+        if isinstance(value, str) and name in table.c and isinstance(table.c[name].type, Date):
+            restored[name] = date.fromisoformat(value)
+    return restored
+
+
+def _columns(table):
+    return [column for column in table.columns if column.name != "search_vector"]
+
+
+class LocalReplica:
+    def __init__(self, md, path=None):
+        self.md = md
+        self.path = Path(path) if path else replica_path(md.db_engine)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.engine = create_engine(f"sqlite:///{self.path}")
+        schema.metadata.create_all(self.engine)
+        local_metadata.create_all(self.engine)
+
+        # The catalog's own queries, run against the replica.
+        self.local = MetadataConnection(md.logger, self.engine)
+
+    @property
+    def synced_at(self):
+        with self.engine.connect() as local:
+            synced_at = local.execute(select(replica_state.c.synced_at)).scalar()
+        # sqlite keeps no offset; it's stored in UTC.
+        return synced_at.replace(tzinfo=timezone.utc) if synced_at else None
+
+    def refresh(self, full=False):
+        """
+        Brings the replica up to date from the central database. Returns
+        True if this was a full reload rather than a delta.
+        """
+        synced_at = self.synced_at
+        full = full or synced_at is None
+
+        with self.md.db_engine.connect() as db, self.engine.begin() as local:
+            state = self.md.get_catalog_state(db)
+
+            if full:
+                self._reload(db, local)
+            else:
+                self._apply_changes(db, local, synced_at - SYNC_OVERLAP)
+
+                # Deletes don't leave an updated_at behind, and tags have
+                # none, so a count that doesn't line up means start over.
+                counted = [table for table in REPLICATED if table.name in state]
+                counts = local.execute(
+                    select(
+                        *(select(func.count()).select_from(table).scalar_subquery() for table in counted)
+                    )
+                ).one()
+                if list(counts) != [state[table.name] for table in counted]:
+                    full = True
+                    self._reload(db, local)
+
+            watermark = max(
+                (
+                    state[f"{table}_updated"]
+                    for table in ("datasets", "keywords", "editions", "standards")
+                    if state[f"{table}_updated"]
+                ),
+                default=None,
+            )
+            # An empty catalog has nothing to be a delta against yet.
+            if watermark is not None:
+                if isinstance(watermark, str):
+                    # sqlite hands back text.
+                    watermark = datetime.fromisoformat(watermark)
+                if watermark.tzinfo is not None:
+                    watermark = watermark.astimezone(timezone.utc)
+                local.execute(delete(replica_state))
+                local.execute(insert(replica_state).values(id=1, synced_at=watermark))
+
+        return full
+
+    def _reload(self, db, local):
+        for table in reversed(REPLICATED):
+            local.execute(delete(table))
+        for table in REPLICATED:
+            self._copy(db, local, select(*_columns(table)))
+
+    def _apply_changes(self, db, local, since):
+        ds = schema.datasets
+
+        changed = db.execute(select(ds.c.id).where(ds.c.updated_at > since)).scalars().all()
+        for start in range(0, len(changed), BATCH):
+            ids = changed[start : start + BATCH]
+            # Variables and tags only change along with their dataset.
+            for table in (schema.tags, schema.variables):
+                local.execute(delete(table).where(table.c.dataset_id.in_(ids)))
+            local.execute(delete(ds).where(ds.c.id.in_(ids)))
+
+            self._copy(db, local, select(*_columns(ds)).where(ds.c.id.in_(ids)))
+            for table in (schema.variables, schema.tags):
+                self._copy(db, local, select(*_columns(table)).where(table.c.dataset_id.in_(ids)))
+
+        for table in (schema.keywords, schema.editions, schema.standards):
+            stmt = select(*_columns(table)).where(table.c.updated_at > since)
+            result = db.execute(stmt.execution_options(yield_per=BATCH))
+            for rows in result.partitions():
+                rows = [row._asdict() for row in rows]
+                local.execute(delete(table).where(table.c.id.in_([row["id"] for row in rows])))
+                local.execute(insert(table), rows)
+
+    def _copy(self, db, local, stmt):
+        result = db.execute(stmt.execution_options(yield_per=BATCH))
+        table = stmt.get_final_froms()[0]
+        for rows in result.partitions():
+            local.execute(insert(table), [row._asdict() for row in rows])
+
+    def datasets(self):
+        """
+        Same shape as get_available_datasets, plus datasets that are only
+        queued so far (with an id of None).
+        """
+        with self.engine.connect() as local:
+            datasets = self.local.get_available_datasets(local)
+            for entry in self.pending(local, kind="dataset"):
+                variables = [variable["variable_name"] for variable, _ in entry["variables"]]
+                datasets.setdefault(entry["dataset_name"], (None, variables))
+        return datasets
+
+    def keywords(self):
+        with self.engine.connect() as local:
+            keywords = self.local.get_all_keywords(local)
+            for entry in self.pending(local, kind="dataset"):
+                for keyword in entry["keywords"]:
+                    keywords.setdefault(keyword, None)
+        return keywords
+
+    def queue_dataset(self, dataset: dict, variables, keywords, edition: dict):
+        self._queue(
+            "dataset",
+            dataset["table_name"],
+            {
+                "dataset": dataset,
+                "variables": variables,
+                "keywords": keywords,
+                "edition": edition,
+            },
+        )
+
+    def queue_edition(self, dataset_name, edition: dict, columns, fingerprint=None):
+        self._queue(
+            "edition",
+            dataset_name,
+            {"edition": edition, "columns": list(columns), "fingerprint": fingerprint},
+        )
+
+    def _queue(self, kind, dataset_name, payload):
+        with self.engine.begin() as local:
+            local.execute(
+                insert(pending).values(
+                    kind=kind,
+                    dataset_name=dataset_name,
+                    payload=json.dumps(payload, default=_json_default),
+                    queued_at=datetime.now(timezone.utc),
+                )
+            )
+
+    def pending(self, local=None, kind=None):
+        """
+        Queued registrations, oldest first, as dicts of their payload plus
+        id, kind, dataset_name, queued_at and conflict.
+        """
+        if local is None:
+            with self.engine.connect() as local:
+                return self.pending(local, kind)
+
+        stmt = select(pending).order_by(pending.c.id)
+        if kind is not None:
+            stmt = stmt.where(pending.c.kind == kind)
+
+        entries = []
+        for row in local.execute(stmt):
+            entry = {**json.loads(row.payload), **row._asdict()}
+            del entry["payload"]
+            entry["edition"] = _restore_dates(entry["edition"], schema.editions)
+            entries.append(entry)
+        return entries
+
+    def discard(self, entry_id):
+        with self.engine.begin() as local:
+            return local.execute(delete(pending).where(pending.c.id == entry_id)).rowcount
+
+    def sync(self):
+        """
+        Sends the queue to the central database in one transaction and
+        returns [(entry, Success(dataset_id) or Failure(SyncConflict)),
+        ...]. Raises one of OFFLINE_ERRORS if it still can't connect, with
+        nothing sent.
+        """
+        entries = self.pending()
+        if not entries:
+            return []
+
+        results = []
+        with self.md.db_engine.begin() as db:
+            existing = self.md.get_available_datasets(
+                db, names={entry["dataset_name"] for entry in entries}
+            )
+            queued = [keyword for entry in entries for keyword in entry.get("keywords", [])]
+            keywords = {
+                keyword.strip().lower(): keyword
+                for keyword in (self.md.get_all_keywords(db, contents=queued) if queued else {})
+            }
+
+            for entry in entries:
+                try:
+                    with db.begin_nested():
+                        dataset_id = self._send(entry, existing, keywords, db)
+                except SyncConflict as e:
+                    results.append((entry, Failure(e)))
+                    continue
+                except IntegrityError as e:
+                    # Someone else got there between the check and the insert.
+                    results.append((entry, Failure(SyncConflict(str(e.orig)))))
+                    continue
+
+                results.append((entry, Success(dataset_id)))
+
+        # Only now that the registrations are committed.
+        with self.engine.begin() as local:
+            for entry, result in results:
+                if isinstance(result, Success):
+                    local.execute(delete(pending).where(pending.c.id == entry["id"]))
+                else:
+                    local.execute(
+                        pending.update()
+                        .where(pending.c.id == entry["id"])
+                        .values(conflict=str(result.failure()))
+                    )
+
+        return results
+
+    def _send(self, entry, existing, keywords, db):
+        name = entry["dataset_name"]
+
+        if entry["kind"] == "dataset":
+            if name in existing:
+                raise SyncConflict(f"'{name}' was registered by someone else in the meantime.")
+
+            chosen = [keywords.get(keyword.strip().lower(), keyword) for keyword in entry["keywords"]]
+            variables = [(variable, standard) for variable, standard in entry["variables"]]
+            dataset_id = self.md.register(
+                entry["dataset"], variables, chosen, entry["edition"], db
+            )
+            existing[name] = (dataset_id, [variable["variable_name"] for variable, _ in variables])
+            keywords.update({keyword.strip().lower(): keyword for keyword in chosen})
+            return dataset_id
+
+        if name not in existing:
+            raise SyncConflict(f"There's no dataset named '{name}' any more.")
+
+        dataset_id, columns = existing[name]
+        missing, extra = column_diff(columns, entry["columns"])
+        if missing or extra:
+            raise SyncConflict(
+                f"The columns of '{name}' changed in the meantime.\n{describe_diff(missing, extra)}"
+            )
+
+        # Sent by a sync that died before it could dequeue it.
+        digest = entry["edition"].get("content_digest")
+        if digest and self.md.find_edition_by_digest(digest, db, name):
+            return dataset_id
+
+        if entry["fingerprint"] is not None:
+            self.md.set_schema_fingerprint(dataset_id, entry["fingerprint"], db)
+        self.md.insert_edition(entry["edition"], dataset_id, db)
+        return dataset_id
@@ -1,77 +1,219 @@
-import os
-from pathlib import Path
+"""
+Applies the files in metadata/migrations that the database hasn't run yet.
+
+    python -m metadata.run_migrations [--dry-run] [--savepoints]
+
+(or `metadata migrate`). Each applied file is recorded in operations with
+a sha256 of its contents and how long it took to run
+(0014_DOCS_migration_checksums.sql). A start with nothing to do costs one
+query: the recorded files and checksums are compared with the directory,
+and nothing is locked or run.
+
+Anything pending is applied in one transaction that holds a postgres
+advisory lock, so workers started together wait on the lock and the ones
+after the first find nothing left to do once they get it. By default the
+run is all or nothing; with `savepoints` each file runs in a savepoint of
+its own, and the files before one that fails are kept.
+
+A recorded file whose contents have changed since it ran raises
+MigrationError before anything is applied; change the database with a
+new migration instead. Files applied before checksums were recorded get
+theirs from their current contents the next time the lock is taken.
+"""
+
+import argparse
+import hashlib
 import logging
-from sqlalchemy import text
-from sqlalchemy.exc import ProgrammingError
-import tomli
+import time
+from pathlib import Path
+
+from sqlalchemy import bindparam, func, inspect, insert, null, select, text, update
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from .instrument import span
+from .schema import check_schema, operations
+
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# Creates the operations table itself.
+FIRST_MIGRATION = "0000_DB_create_ops.sql"
+
+# Taken with pg_advisory_xact_lock, so it's released at commit or rollback.
+# Any constant works as long as every runner uses the same one.
+LOCK_KEY = 0x6D657461
+
+
+class MigrationError(Exception):
+    pass
+
+
+def checksum(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def available_migrations(directory=MIGRATIONS_DIR):
+    """
+    {file name: checksum} of the migrations in `directory`, in the order
+    they run.
+    """
+    return {path.name: checksum(path) for path in sorted(Path(directory).glob("*.sql"))}
 
-from connection import db_engine
-from app_logger import setup_logging
 
+def plan(recorded, available):
+    """
+    Returns (pending, edited): the available files that haven't run, in
+    order, and the recorded ones whose checksum no longer matches.
+    `recorded` is {file: checksum}, None for files recorded without one,
+    or None itself when there's no operations table yet.
+    """
+    recorded = recorded or {}
+    pending = [name for name in available if name not in recorded]
+    edited = [
+        name
+        for name, recorded_checksum in recorded.items()
+        if recorded_checksum is not None and name in available and available[name] != recorded_checksum
+    ]
+    return pending, edited
 
-with open("config.toml", "rb") as f:
-    app_config = tomli.load(f)
 
-logger = logging.getLogger(app_config["app"]["name"])
+def _recorded(db):
+    """
+    {file: checksum} from operations, read the careful way: None if there's
+    no operations table yet, and checksums of None if it predates them.
+    """
+    inspector = inspect(db)
+    if not inspector.has_table(operations.name):
+        return None
 
+    columns = {column["name"] for column in inspector.get_columns(operations.name)}
+    stmt = select(operations.c.file, operations.c.checksum if "checksum" in columns else null())
+    return {file: recorded_checksum for file, recorded_checksum in db.execute(stmt)}
+
+
+def _quick_check(engine, available):
+    """
+    True if every available migration has run, unedited, according to a
+    single query. False if there's anything to do or it can't tell (no
+    operations table, or one without checksums).
+    """
+    try:
+        with engine.connect() as db:
+            recorded = {
+                row.file: row.checksum
+                for row in db.execute(select(operations.c.file, operations.c.checksum))
+            }
+    except (ProgrammingError, OperationalError):
+        return False
+
+    pending, edited = plan(recorded, available)
+    return not pending and not edited and all(recorded[name] is not None for name in available)
+
+
+def migrate(engine, directory=MIGRATIONS_DIR, dry_run=False, savepoints=False, logger=None):
+    """
+    Applies the pending migrations in `directory` and returns their file
+    names (with `dry_run`, the ones that would be applied; nothing is
+    locked or written).
+    """
+    logger = logger or logging.getLogger(__name__)
+    directory = Path(directory)
+    available = available_migrations(directory)
+
+    if _quick_check(engine, available):
+        logger.info("Database is up to date!")
+        return []
+
+    if dry_run:
+        with engine.connect() as db:
+            recorded = _recorded(db)
+        pending, edited = plan(recorded, available)
+        if edited:
+            raise MigrationError(f"Changed since they were applied: {', '.join(edited)}")
+        return pending
+
+    applied, failure = [], None
+    with engine.begin() as db:
+        if db.dialect.name == "postgresql":
+            db.execute(select(func.pg_advisory_xact_lock(LOCK_KEY)))
+
+        # Again, now that nobody else can be applying anything.
+        recorded = _recorded(db)
+        pending, edited = plan(recorded, available)
+        if edited:
+            raise MigrationError(f"Changed since they were applied: {', '.join(edited)}")
+        if recorded is None and FIRST_MIGRATION not in available:
+            raise MigrationError(f"There's no operations table, and no {FIRST_MIGRATION} to create it.")
+
+        if pending:
+            logger.debug(f"Running migrations: {', '.join(pending)}")
+        for name in pending:
+            script = text((directory / name).read_text())
+            started = time.perf_counter()
+            try:
+                with span("migration.apply", file=name):
+                    if savepoints:
+                        with db.begin_nested():
+                            db.execute(script)
+                    else:
+                        db.execute(script)
+            except Exception as e:
+                if not savepoints:
+                    raise
+                failure = (name, e)
+                break
+            duration_ms = (time.perf_counter() - started) * 1000
+            applied.append({"file": name, "checksum": available[name], "duration_ms": duration_ms})
+            logger.info(f"Applied {name} in {duration_ms:.0f} ms.")
+
+        # Recorded after the scripts, which may be what adds these columns.
+        if applied:
+            db.execute(insert(operations).values(ran_at=func.now()), applied)
+        unrecorded = [
+            {"name": name, "file_checksum": available[name]}
+            for name, recorded_checksum in (recorded or {}).items()
+            if recorded_checksum is None and name in available
+        ]
+        if unrecorded:
+            db.execute(
+                update(operations)
+                .where(operations.c.file == bindparam("name"))
+                .values(checksum=bindparam("file_checksum")),
+                unrecorded,
+            )
+
+        # The only time the tables get reflected: once, after they change.
+        if applied:
+            for problem in check_schema(db):
+                logger.warning(problem)
+
+    if failure is not None:
+        name, error = failure
+        raise MigrationError(f"{name} failed, so it and the ones after it weren't applied: {error}") from error
+    return [row["file"] for row in applied]
+
+
+def main(argv=None):
+    from .app_logger import setup_logging
+    from .connection import get_config, get_engine
+
+    parser = argparse.ArgumentParser(description="Apply pending catalog migrations.")
+    parser.add_argument("--dry-run", action="store_true", help="List what would be applied.")
+    parser.add_argument(
+        "--savepoints", action="store_true", help="Keep the migrations before one that fails."
+    )
+    args = parser.parse_args(argv)
 
-def main():
     setup_logging()
-    migrations_dir = Path.cwd() / app_config["app"]["name"] / "migrations"
-    available_migrations = sorted(os.listdir(migrations_dir))
-
-    stmt = text("""
-    SELECT *
-    FROM operations
-    ORDER BY ran_at DESC
-    LIMIT 1;
-    """)
+    logger = logging.getLogger(get_config()["app"]["name"])
     try:
-        try:
-            with db_engine.connect() as db:
-                result = db.execute(stmt)
-                row = result.fetchone()
-
-                last_ran = row.file
-                to_run = available_migrations[available_migrations.index(last_ran) + 1:]
-
-                if not to_run:
-                    logger.warning("Database is up to date!")
-
-        except ProgrammingError:
-            with db_engine.connect() as db:
-                initial_file = "0000_DB_create_ops.sql"
-                start_script = text((migrations_dir / initial_file).read_text())
-                db.execute(start_script)
-                insert = text(
-                    """
-                    INSERT INTO operations VALUES (default, :filename, default);
-                    """
-                )
-                db.execute(insert, {"filename": initial_file})
-                db.commit()
-                logger.debug("Database Initialized.")
-
-                result = db.execute(stmt)
-                row = result.fetchone()
-                last_ran = row.file
-                to_run = available_migrations[available_migrations.index(last_ran) + 1:]
-
-        with db_engine.connect() as db:
-            logger.debug(f"Running migrations: {', '.join(to_run)}")
-            for migration in to_run:
-                script = text((migrations_dir / migration).read_text())
-                db.execute(script)
-                stmt = text(
-                    """
-                    INSERT INTO operations VALUES (default, :filename, default);
-                    """
-                )
-                db.execute(stmt, {"filename": migration})
-                db.commit()
-
-    except FileNotFoundError:
-        logger.error("Database initial migration failed. Provide first migration.")
+        found = migrate(get_engine(), dry_run=args.dry_run, savepoints=args.savepoints, logger=logger)
+    except MigrationError as e:
+        logger.error(str(e))
+        raise SystemExit(1)
+
+    if args.dry_run:
+        print("\n".join(found) if found else "Nothing to apply.")
 
 
 if __name__ == "__main__":
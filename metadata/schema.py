@@ -0,0 +1,239 @@
+"""
+Static definitions of the catalog tables, kept in step with the files in
+metadata/migrations. Using these instead of reflecting the tables means
+building a MetadataConnection doesn't query the database at all.
+
+When a migration changes a table, change it here too. run_migrations
+calls check_schema after applying anything, which reflects the database
+once and reports any drift between it and these definitions.
+"""
+
+from sqlalchemy import (
+    MetaData,
+    Table,
+    Column,
+    Integer,
+    BigInteger,
+    String,
+    Text,
+    Date,
+    DateTime,
+    Numeric,
+    Float,
+    JSON,
+    ForeignKey,
+    Index,
+    CheckConstraint,
+    inspect,
+    func,
+)
+from sqlalchemy.dialects.postgresql import DATERANGE, JSONB, TSVECTOR
+
+
+metadata = MetaData()
+
+# Postgres-only types fall back to something generic so the same tables can
+# be created in sqlite (local replicas, benchmarks, tests).
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+SearchVector = Text().with_variant(TSVECTOR(), "postgresql")
+DateRange = Text().with_variant(DATERANGE(), "postgresql")
+
+
+operations = Table(
+    "operations",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("file", String(256)),
+    Column("ran_at", DateTime),
+    # 0014_DOCS_migration_checksums.sql, see metadata/run_migrations.py
+    Column("checksum", String(64)),
+    Column("duration_ms", Float),
+)
+
+datasets = Table(
+    "datasets",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    # unique as of 0007_DOCS_unique_dataset_names.sql
+    Column("table_name", String(256), nullable=False, unique=True),
+    Column("description", Text),
+    Column("unit_of_analysis", Text),
+    Column("universe", Text),
+    Column("owner", Text),
+    Column("collector", Text),
+    Column("collection_method", Text),
+    Column("collection_reason", Text),
+    Column("source_url", Text),
+    Column("notes", Text),
+    Column("use_conditions", Text),
+    Column("cadence", String(32)),
+    Column("topic", String(256)),
+    # 0002_DOCS_search_index.sql, generated by postgres
+    Column("search_vector", SearchVector),
+    # 0005_DOCS_catalog_changes.sql, touched by triggers
+    Column("updated_at", DateTime(timezone=True), nullable=False, server_default=func.now(), index=True),
+    # 0006_DOCS_schema_fingerprints.sql
+    Column("schema_fingerprint", String(64), index=True),
+)
+
+variables = Table(
+    "variables",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("dataset_id", Integer, ForeignKey("datasets.id"), index=True),
+    Column("variable_name", String(256), nullable=False),
+    Column("description", Text),
+    Column("data_type", String(32)),
+    Column("parent_variable", String(256)),
+    Column("suppression_threshold", Numeric),
+    # 0002_DOCS_search_index.sql, generated by postgres
+    Column("search_vector", SearchVector),
+    # 0003_DOCS_variable_profiles.sql
+    Column("profile", JSONType),
+    # 0005_DOCS_catalog_changes.sql, touched by triggers
+    Column("updated_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    # 0010_DOCS_standards.sql
+    Column("standard_id", Integer, ForeignKey("standards.id"), index=True),
+)
+
+editions = Table(
+    "editions",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    # indexed as of 0012_DOCS_autotime.sql
+    Column("dataset_id", Integer, ForeignKey("datasets.id"), index=True),
+    Column("num_records", Integer),
+    Column("notes", Text),
+    Column("publish_date", Date),
+    Column("collection_start", Date),
+    Column("collection_end", Date),
+    Column("acquisition_date", Date),
+    # 0008_DOCS_edition_statistics.sql, see metadata/drift.py
+    Column("statistics", JSONType),
+    # 0013_DOCS_content_digests.sql, see metadata/digest.py
+    Column("content_digest", String(64)),
+    Column("content_size", BigInteger),
+    # 0009_DOCS_edition_changes.sql, touched by triggers
+    Column("updated_at", DateTime(timezone=True), nullable=False, server_default=func.now(), index=True),
+    Index("editions_content_digest_idx", "content_digest", "dataset_id"),
+)
+
+keywords = Table(
+    "keywords",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    # unique as of 0004_DOCS_unique_keywords.sql
+    Column("content", String(256), nullable=False, unique=True),
+    # 0002_DOCS_search_index.sql, generated by postgres
+    Column("search_vector", SearchVector),
+    # 0005_DOCS_catalog_changes.sql, touched by triggers
+    Column("updated_at", DateTime(timezone=True), nullable=False, server_default=func.now(), index=True),
+)
+
+tags = Table(
+    "tags",
+    metadata,
+    Column("dataset_id", Integer, ForeignKey("datasets.id"), primary_key=True),
+    Column("kw_id", Integer, ForeignKey("keywords.id"), primary_key=True, index=True),
+)
+
+standards = Table(
+    "standards",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("description", Text),
+    Column("maintainer", Text),
+    # 0010_DOCS_standards.sql, see metadata/standards.py
+    Column("name", String(256), nullable=False, unique=True),
+    Column("pattern", Text),
+    Column("codes", JSONType),
+    Column("width", Integer),
+    Column("updated_at", DateTime(timezone=True), nullable=False, server_default=func.now(), index=True),
+)
+
+# 0011_DOCS_lineage.sql, see MetadataConnection.add_derivations
+projects = Table(
+    "projects",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("project_name", String(256), nullable=False, unique=True),
+    Column("project_description", Text),
+    Column("start_date", DateTime),
+)
+
+usages = Table(
+    "usages",
+    metadata,
+    Column("dataset_id", Integer, ForeignKey("datasets.id"), primary_key=True),
+    Column("project_id", Integer, ForeignKey("projects.id"), primary_key=True, index=True),
+    Column("description", Text),
+)
+
+derivations = Table(
+    "derivations",
+    metadata,
+    Column("parent_id", Integer, ForeignKey("datasets.id"), primary_key=True),
+    Column("child_id", Integer, ForeignKey("datasets.id"), primary_key=True, index=True),
+    Column("description", Text),
+    CheckConstraint("parent_id <> child_id"),
+)
+
+# The transitive closure of derivations, with the shortest path's length.
+lineage = Table(
+    "lineage",
+    metadata,
+    Column("ancestor_id", Integer, ForeignKey("datasets.id"), primary_key=True),
+    Column("descendant_id", Integer, ForeignKey("datasets.id"), primary_key=True),
+    Column("depth", Integer, nullable=False),
+    Index("lineage_descendant_idx", "descendant_id", "ancestor_id"),
+)
+
+# 0012_DOCS_autotime.sql, see metadata/autotime.py
+autotime = Table(
+    "autotime",
+    metadata,
+    Column("dataset_id", Integer, ForeignKey("datasets.id"), primary_key=True),
+    Column("frame_type", String(256)),
+    Column("resolution", String(32)),
+    Column("available_from", Date),
+    Column("available_to", Date),
+    Column("gaps", JSONType),
+)
+
+coverage = Table(
+    "coverage",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("dataset_id", Integer, ForeignKey("datasets.id"), nullable=False, index=True),
+    Column("frame_type", String(256)),
+    Column("period_start", Date, nullable=False),
+    Column("period_end", Date, nullable=False),
+    # generated by postgres, with a GiST index on (frame_type, period);
+    # both tables are maintained by triggers there
+    Column("period", DateRange),
+)
+
+
+def check_schema(db):
+    """
+    Compares these definitions with what's actually in the database and
+    returns a list of human readable differences (empty when they agree).
+    This is the only place the tables are reflected.
+    """
+    inspector = inspect(db)
+    problems = []
+
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            problems.append(f"Table '{table.name}' is missing from the database.")
+            continue
+
+        actual = {column["name"] for column in inspector.get_columns(table.name)}
+        expected = set(table.columns.keys())
+
+        for name in sorted(expected - actual):
+            problems.append(f"Column '{table.name}.{name}' is missing from the database.")
+        for name in sorted(actual - expected):
+            problems.append(f"Column '{table.name}.{name}' isn't in metadata/schema.py.")
+
+    return problems
@@ -1,13 +1,418 @@
+import re
+import heapq
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from math import log
+
+from sqlalchemy import select, func, union_all
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Same weights postgres' ts_rank uses for the A, B, C and D classes, so the
+# local index orders results roughly the way the database would.
+FIELD_WEIGHTS = {"A": 1.0, "B": 0.4, "C": 0.2, "D": 0.1}
+
+STOPWORDS = frozenset(
+    {
+        "a", "an", "and", "are", "as", "at", "be", "by", "for", "from",
+        "in", "is", "it", "of", "on", "or", "the", "this", "to", "with",
+    }
+)
+
+
+def stem(term):
+    """
+    Just enough stemming for plurals to match their singular, which is
+    the bulk of what the 'english' text search config buys us.
+    """
+    if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+        return term[:-1]
+    return term
+
+
+def tokenize(text, stemmed=True):
+    """
+    Prefixes are tokenized with stemmed=False: a partly typed word isn't
+    a word yet ('hous' isn't the plural of 'hou').
+    """
+    if not text:
+        return []
+    return [
+        stem(term) if stemmed else term
+        for term in TOKEN_PATTERN.findall(text.lower())
+        if term not in STOPWORDS
+    ]
+
+
+def prefix_tsquery(query):
+    """
+    Turns free text into a tsquery string where every term is a prefix
+    match, e.g. 'hous val' -> 'hous:* & val:*'. Terms are reduced to
+    [a-z0-9] so nothing in the input can break the tsquery syntax.
+    """
+    return " & ".join(f"{term}:*" for term in tokenize(query, stemmed=False))
+
+
+class InvertedIndex:
+    """
+    An in-process stand-in for the tsvector/GIN indexes, for catalogs that
+    live somewhere without full-text search (the sqlite replica, tests).
+
+    Each document is a dict of weight class ('A'-'D') to text. Queries are
+    AND-ed across terms like websearch_to_tsquery, and scored with a
+    saturating, idf-weighted sum of the field weights.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self._vocabulary = None
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, doc_id, fields: dict, payload=None):
+        for weight, text in fields.items():
+            for term in tokenize(text):
+                postings = self.postings[term]
+                postings[doc_id] = postings.get(doc_id, 0.0) + FIELD_WEIGHTS[weight]
+
+        self.documents[doc_id] = payload
+        self._vocabulary = None
+
+    def _expand(self, term, prefix):
+        if not prefix:
+            return [term] if term in self.postings else []
+
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+
+        matches = []
+        i = bisect_left(self._vocabulary, term)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(term):
+            matches.append(self._vocabulary[i])
+            i += 1
+
+        # The vocabulary is stemmed, so a whole plural ('parcels') matches
+        # its stem ('parcel') rather than prefixing it.
+        if stem(term) != term and stem(term) in self.postings:
+            matches.append(stem(term))
+
+        return matches
+
+    def _score_term(self, term, prefix):
+        scores = {}
+        n_docs = len(self.documents)
+        for expanded in self._expand(term, prefix):
+            postings = self.postings[expanded]
+            idf = log(1 + n_docs / len(postings))
+            for doc_id, weight in postings.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * weight / (weight + 1)
+
+        return scores
+
+    def search(self, query, limit=20, offset=0, prefix=False):
+        """
+        Returns a page of (doc_id, rank, payload) tuples, best first.
+        """
+        terms = tokenize(query, stemmed=not prefix)
+        if not terms:
+            return []
+
+        # Intersect starting from the rarest term so the candidate set
+        # shrinks as fast as possible.
+        per_term = sorted(
+            (self._score_term(term, prefix) for term in terms), key=len
+        )
+        scores = per_term[0]
+        for term_scores in per_term[1:]:
+            scores = {
+                doc_id: score + term_scores[doc_id]
+                for doc_id, score in scores.items()
+                if doc_id in term_scores
+            }
+            if not scores:
+                return []
+
+        page = heapq.nlargest(
+            offset + limit, scores.items(), key=lambda item: item[1]
+        )[offset:]
+
+        return [
+            (doc_id, rank, self.documents[doc_id]) for doc_id, rank in page
+        ]
+
+
 class MetadataSearch:
-    def search_datasets(self, query):
-        pass
+    """
+    Ranked, paginated search over datasets, variables, keywords and
+    standards.
+
+    On postgres everything runs against the generated tsvector columns
+    and GIN indexes from '0002_DOCS_search_index.sql'. On any other
+    backend an InvertedIndex is built from the catalog on first use and
+    kept until refresh() is called. One instance can be shared between
+    threads (the API server does): an index is only built once, and
+    searches only read it.
+    """
+
+    def __init__(self, md, language="english"):
+        self.md = md
+        self.language = language
+        self._local_indexes = {}
+        self._local_lock = threading.Lock()
+
+    def refresh(self):
+        with self._local_lock:
+            self._local_indexes.clear()
+
+    def search_datasets(self, query, db, limit=20, offset=0):
+        """
+        A dataset's rank is the sum of how well its own text matches, the
+        best match among its variables (at half weight) and the matches
+        among its keywords.
+        """
+        if not has_full_text(db):
+            return self._search_local("datasets", query, db, limit, offset)
+
+        ds = self.md.dataset_table
+        var = self.md.variable_table
+        kw = self.md.keyword_table
+        tags = self.md.tags_table
+
+        q = select(
+            func.websearch_to_tsquery(self.language, query).label("query")
+        ).cte("q")
+
+        dataset_hits = select(
+            ds.c.id.label("dataset_id"),
+            func.ts_rank_cd(ds.c.search_vector, q.c.query).label("rank"),
+        ).where(ds.c.search_vector.op("@@")(q.c.query))
+
+        variable_hits = (
+            select(
+                var.c.dataset_id,
+                (0.5 * func.max(func.ts_rank_cd(var.c.search_vector, q.c.query))).label(
+                    "rank"
+                ),
+            )
+            .where(var.c.search_vector.op("@@")(q.c.query))
+            .group_by(var.c.dataset_id)
+        )
+
+        keyword_hits = (
+            select(
+                tags.c.dataset_id,
+                func.sum(func.ts_rank_cd(kw.c.search_vector, q.c.query)).label("rank"),
+            )
+            .select_from(kw.join(tags, tags.c.kw_id == kw.c.id))
+            .where(kw.c.search_vector.op("@@")(q.c.query))
+            .group_by(tags.c.dataset_id)
+        )
+
+        hits = union_all(dataset_hits, variable_hits, keyword_hits).subquery("hits")
+        rank = func.sum(hits.c.rank).label("rank")
+
+        stmt = (
+            select(ds.c.id, ds.c.table_name, ds.c.description, rank)
+            .select_from(hits.join(ds, ds.c.id == hits.c.dataset_id))
+            .group_by(ds.c.id)
+            .order_by(rank.desc(), ds.c.id)
+            .limit(limit)
+            .offset(offset)
+        )
+
+        return [dict(row._mapping) for row in db.execute(stmt)]
+
+    def search_variables(self, query, db, limit=20, offset=0):
+        if not has_full_text(db):
+            return self._search_local("variables", query, db, limit, offset)
+
+        ds = self.md.dataset_table
+        var = self.md.variable_table
+
+        tsquery = func.websearch_to_tsquery(self.language, query)
+        rank = func.ts_rank_cd(var.c.search_vector, tsquery).label("rank")
+
+        stmt = (
+            select(
+                var.c.id,
+                var.c.variable_name,
+                var.c.description,
+                ds.c.table_name,
+                rank,
+            )
+            .select_from(var.join(ds, ds.c.id == var.c.dataset_id))
+            .where(var.c.search_vector.op("@@")(tsquery))
+            .order_by(rank.desc(), var.c.id)
+            .limit(limit)
+            .offset(offset)
+        )
+
+        return [dict(row._mapping) for row in db.execute(stmt)]
+
+    def search_keywords(self, query, db, limit=20, offset=0):
+        """
+        Keywords are short, so every term is matched as a prefix to make
+        this usable for completion as well as lookup.
+        """
+        if not has_full_text(db):
+            return self._search_local(
+                "keywords", query, db, limit, offset, prefix=True
+            )
+
+        tsquery_text = prefix_tsquery(query)
+        if not tsquery_text:
+            return []
+
+        kw = self.md.keyword_table
+        tsquery = func.to_tsquery("simple", tsquery_text)
+        rank = func.ts_rank_cd(kw.c.search_vector, tsquery).label("rank")
+
+        stmt = (
+            select(kw.c.id, kw.c.content, rank)
+            .where(kw.c.search_vector.op("@@")(tsquery))
+            .order_by(rank.desc(), kw.c.content)
+            .limit(limit)
+            .offset(offset)
+        )
+
+        return [dict(row._mapping) for row in db.execute(stmt)]
+
+    def search_standards(self, query, db, limit=20, offset=0):
+        """
+        The standards table is tiny, so this vectorizes on the fly rather
+        than keeping an index.
+        """
+        if not has_full_text(db):
+            return self._search_local("standards", query, db, limit, offset)
+
+        std = self.md.standards
+        document = func.to_tsvector(
+            self.language,
+            func.coalesce(std.c.name, "") + " " + func.coalesce(std.c.description, ""),
+        )
+        tsquery = func.websearch_to_tsquery(self.language, query)
+        rank = func.ts_rank_cd(document, tsquery).label("rank")
+
+        stmt = (
+            select(std.c.id, std.c.name, std.c.description, rank)
+            .where(document.op("@@")(tsquery))
+            .order_by(rank.desc(), std.c.id)
+            .limit(limit)
+            .offset(offset)
+        )
+
+        return [dict(row._mapping) for row in db.execute(stmt)]
+
+    def _search_local(self, kind, query, db, limit, offset, prefix=False):
+        with self._local_lock:
+            if kind not in self._local_indexes:
+                build = getattr(self, f"_build_{kind}_index")
+                self._local_indexes[kind] = build(db)
+            index = self._local_indexes[kind]
+
+        return [
+            {**payload, "rank": rank}
+            for _, rank, payload in index.search(
+                query, limit=limit, offset=offset, prefix=prefix
+            )
+        ]
+
+    def _build_datasets_index(self, db):
+        ds = self.md.dataset_table
+        var = self.md.variable_table
+        kw = self.md.keyword_table
+        tags = self.md.tags_table
+
+        variable_text = defaultdict(list)
+        for row in db.execute(
+            select(var.c.dataset_id, var.c.variable_name, var.c.description)
+        ):
+            variable_text[row.dataset_id].append(
+                f"{row.variable_name} {row.description or ''}"
+            )
+
+        keyword_text = defaultdict(list)
+        for row in db.execute(
+            select(tags.c.dataset_id, kw.c.content).select_from(
+                tags.join(kw, tags.c.kw_id == kw.c.id)
+            )
+        ):
+            keyword_text[row.dataset_id].append(row.content)
+
+        index = InvertedIndex()
+        for row in db.execute(
+            select(
+                ds.c.id,
+                ds.c.table_name,
+                ds.c.description,
+                ds.c.universe,
+                ds.c.notes,
+            )
+        ):
+            index.add(
+                row.id,
+                {
+                    "A": f"{row.table_name} {row.description or ''}",
+                    "B": " ".join([row.universe or "", *keyword_text[row.id]]),
+                    "C": row.notes or "",
+                    "D": " ".join(variable_text[row.id]),
+                },
+                payload={
+                    "id": row.id,
+                    "table_name": row.table_name,
+                    "description": row.description,
+                },
+            )
+
+        return index
+
+    def _build_variables_index(self, db):
+        ds = self.md.dataset_table
+        var = self.md.variable_table
+
+        index = InvertedIndex()
+        for row in db.execute(
+            select(
+                var.c.id,
+                var.c.variable_name,
+                var.c.description,
+                ds.c.table_name,
+            ).select_from(var.join(ds, ds.c.id == var.c.dataset_id))
+        ):
+            index.add(
+                row.id,
+                {"A": row.description or "", "B": row.variable_name},
+                payload=dict(row._mapping),
+            )
+
+        return index
+
+    def _build_keywords_index(self, db):
+        kw = self.md.keyword_table
+
+        index = InvertedIndex()
+        for row in db.execute(select(kw.c.id, kw.c.content)):
+            index.add(row.id, {"A": row.content}, payload=dict(row._mapping))
 
-    def search_keywords(self, query):
-        pass
+        return index
 
-    def search_standards(self, query):
-        pass
+    def _build_standards_index(self, db):
+        std = self.md.standards
 
+        index = InvertedIndex()
+        for row in db.execute(select(std.c.id, std.c.name, std.c.description)):
+            index.add(
+                row.id,
+                {"A": row.name, "B": row.description or ""},
+                payload=dict(row._mapping),
+            )
 
+        return index
 
 
+def has_full_text(db):
+    return db.dialect.name == "postgresql"
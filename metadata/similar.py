@@ -0,0 +1,290 @@
+"""
+"Similar datasets": which registered datasets a new file most resembles,
+so a near duplicate gets noticed before it's registered under a new name.
+
+Every dataset is a bag of terms from its name, description, universe,
+keywords and variable names (each variable also counts whole, so an
+identical column is worth more than a shared word). The index keeps the
+raw term counts as a sparse matrix, one row per dataset in CSR form
+(indptr, indices, counts), and persists it in the cache directory next to
+the local replica. refresh() works like LocalReplica's: after the first
+build only datasets whose updated_at moved are re-read, and their rows
+replaced.
+
+Weights are TF-IDF ((1 + log tf) * idf, rows scaled to unit length),
+computed from the counts when the index is first searched and laid out by
+term (CSC), so scoring a batch of queries only touches the postings of the
+terms they contain: one gather and one bincount give every query's cosine
+similarity to every dataset.
+"""
+
+import hashlib
+import os
+import tempfile
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .catalog import SYNC_OVERLAP, default_cache_dir
+from .search import STOPWORDS, TOKEN_PATTERN, stem, tokenize
+
+
+SNAPSHOT_VERSION = 1
+TOP_K = 5
+
+# Below this cosine similarity a dataset isn't worth mentioning.
+MIN_SIMILARITY = 0.2
+
+
+def index_path(db_engine, cache_dir=None):
+    url = db_engine.url.render_as_string(hide_password=True)
+    digest = hashlib.sha1(url.encode()).hexdigest()[:12]
+    return Path(cache_dir or default_cache_dir()) / f"similar-{digest}.npz"
+
+
+def _text(table_name="", description=None, universe=None, keywords=(), variables=()):
+    return " ".join([table_name or "", description or "", universe or "", *keywords, *variables])
+
+
+def dataset_terms(table_name="", description=None, universe=None, keywords=(), variables=()):
+    terms = tokenize(_text(table_name, description, universe, keywords, variables))
+    terms.extend(f"column:{name.lower()}" for name in variables)
+    return terms
+
+
+def _distinct_map(values: pd.Series, function):
+    """
+    `function` applied to each distinct value only; None drops the value.
+    """
+    codes, distinct = pd.factorize(values)
+    mapped = np.array([function(value) for value in distinct] + [None], dtype=object)[codes]
+    keep = mapped != None  # noqa: E711, elementwise
+    return values.index.to_numpy()[keep], mapped[keep]
+
+
+def _term_table(entries):
+    """
+    dataset_terms for many datasets at once, as arrays of (position of the
+    dataset in `entries`, term). Catalog text repeats itself a lot, so
+    stemming and stopwords are applied once per distinct word.
+    """
+    words = (
+        pd.Series([_text(**entry) for entry in entries], dtype=object)
+        .str.lower()
+        .str.findall(TOKEN_PATTERN)
+        .explode()
+        .dropna()
+    )
+    columns = pd.Series([entry["variables"] for entry in entries], dtype=object).explode().dropna()
+
+    word_positions, word_terms = _distinct_map(words, lambda word: None if word in STOPWORDS else stem(word))
+    column_positions, column_terms = _distinct_map(columns, lambda name: f"column:{name.lower()}")
+
+    return (
+        np.concatenate([word_positions, column_positions]).astype(np.int64),
+        np.concatenate([word_terms, column_terms]),
+    )
+
+
+class SimilarityIndex:
+    def __init__(self, md, path=None):
+        self.md = md
+        self.path = Path(path) if path else index_path(md.db_engine)
+
+        self.vocabulary = {}
+        self.ids = np.empty(0, dtype=np.int64)
+        self.names = []
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.float32)
+        self.synced_at = None
+
+        self._loaded = False
+        self._postings = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def load(self):
+        self._loaded = True
+        try:
+            with np.load(self.path, allow_pickle=False) as snapshot:
+                if int(snapshot["version"]) != SNAPSHOT_VERSION:
+                    return self
+                self.vocabulary = {term: i for i, term in enumerate(snapshot["vocabulary"].tolist())}
+                self.ids = snapshot["ids"]
+                self.names = snapshot["names"].tolist()
+                self.indptr = snapshot["indptr"]
+                self.indices = snapshot["indices"]
+                self.counts = snapshot["counts"]
+                self.synced_at = datetime.fromisoformat(str(snapshot["synced_at"]))
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return self
+
+        self._postings = None
+        return self
+
+    def save(self):
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+
+        # Write-then-rename so a crash never leaves half an index behind.
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f,
+                version=SNAPSHOT_VERSION,
+                synced_at=self.synced_at.isoformat(),
+                vocabulary=np.array(vocabulary, dtype=str),
+                ids=self.ids,
+                names=np.array(self.names, dtype=str),
+                indptr=self.indptr,
+                indices=self.indices,
+                counts=self.counts,
+            )
+        os.replace(tmp, self.path)
+
+    def refresh(self, db, full=False):
+        """
+        Brings the index up to date and saves it. Returns True if this was
+        a full rebuild rather than a delta.
+        """
+        if not self._loaded:
+            self.load()
+
+        state = self.md.get_catalog_state(db)
+
+        if full or self.synced_at is None:
+            self._clear()
+            self._apply(self.md.get_dataset_text(db))
+            full = True
+        else:
+            self._apply(self.md.get_dataset_text(db, since=self.synced_at - SYNC_OVERLAP))
+
+            # Deletes don't leave an updated_at behind; see LocalReplica.refresh.
+            if len(self.ids) != state["datasets"]:
+                return self.refresh(db, full=True)
+
+        if state["datasets_updated"] is not None:
+            self.synced_at = state["datasets_updated"]
+            self.save()
+
+        return full
+
+    def _clear(self):
+        self.vocabulary = {}
+        self.ids = np.empty(0, dtype=np.int64)
+        self.names = []
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.float32)
+
+    def _apply(self, changed):
+        """
+        Replaces the rows of the datasets in `changed` (as
+        get_dataset_text returns them) and appends the new ones.
+        """
+        if not changed:
+            return
+        self._postings = None
+
+        keep = ~np.isin(self.ids, np.fromiter(changed, dtype=np.int64, count=len(changed)))
+        lengths = np.diff(self.indptr)
+        entries = np.repeat(keep, lengths)
+
+        positions, terms = _term_table(list(changed.values()))
+        codes, distinct = pd.factorize(terms)
+        vocabulary = self.vocabulary
+        term_ids = np.fromiter(
+            (vocabulary.setdefault(term, len(vocabulary)) for term in distinct),
+            dtype=np.int64,
+            count=len(distinct),
+        )[codes]
+
+        # One (dataset, term) entry per distinct pair, sorted by dataset.
+        width = len(self.vocabulary)
+        pairs, counts = np.unique(positions * width + term_ids, return_counts=True)
+        added = np.bincount(pairs // width, minlength=len(changed))
+
+        self.ids = np.concatenate([self.ids[keep], np.fromiter(changed, dtype=np.int64, count=len(changed))])
+        self.names = [name for name, kept in zip(self.names, keep) if kept] + [
+            entry["table_name"] for entry in changed.values()
+        ]
+        self.indices = np.concatenate([self.indices[entries], pairs % width])
+        self.counts = np.concatenate([self.counts[entries], counts.astype(np.float32)])
+        self.indptr = np.concatenate([[0], np.cumsum(np.concatenate([lengths[keep], added]))])
+
+    def prepare(self):
+        """
+        TF-IDF weights laid out by term: the datasets and weights of term
+        t are rows[start[t]:start[t + 1]] and weights[start[t]:start[t + 1]].
+        Done by the first search if nothing calls it earlier.
+        """
+        n_terms = len(self.vocabulary)
+        rows = np.repeat(np.arange(len(self.ids)), np.diff(self.indptr))
+        df = np.bincount(self.indices, minlength=n_terms)
+        idf = np.log((1 + len(self.ids)) / (1 + df)) + 1
+
+        weights = (1 + np.log(self.counts)) * idf[self.indices]
+        norms = np.sqrt(np.bincount(rows, weights=weights**2, minlength=len(self.ids)))
+        weights /= np.where(norms > 0, norms, 1)[rows]
+
+        order = np.argsort(self.indices, kind="stable")
+        start = np.concatenate([[0], np.cumsum(df)])
+        self._postings = (start, rows[order], weights[order], idf)
+
+    def most_similar(self, queries, k=TOP_K, exclude=()):
+        """
+        For each query (a list of terms, see dataset_terms) the k most
+        similar datasets as [(table_name, similarity), ...], best first.
+        """
+        if not len(self.ids):
+            return [[] for _ in queries]
+        if self._postings is None:
+            self.prepare()
+        start, rows, weights, idf = self._postings
+        n = len(self.ids)
+
+        # Every query's postings, gathered into one flat array.
+        segments, owners, scales = [], [], []
+        for q, terms in enumerate(queries):
+            found = Counter(self.vocabulary[term] for term in terms if term in self.vocabulary)
+            if not found:
+                continue
+            term_ids = np.fromiter(found.keys(), dtype=np.int64, count=len(found))
+            query = (1 + np.log(np.fromiter(found.values(), dtype=np.float64, count=len(found)))) * idf[term_ids]
+            query /= np.linalg.norm(query)
+
+            lengths = start[term_ids + 1] - start[term_ids]
+            segments.append(np.repeat(start[term_ids] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum()))
+            scales.append(np.repeat(query, lengths))
+            owners.append(np.full(lengths.sum(), q))
+
+        scores = np.zeros((len(queries), n))
+        if segments:
+            at = np.concatenate(segments)
+            flat = np.concatenate(owners) * n + rows[at]
+            scores = np.bincount(flat, weights=weights[at] * np.concatenate(scales), minlength=len(queries) * n)
+            scores = scores.reshape(len(queries), n)
+
+        excluded = np.isin(np.array(self.names, dtype=object), list(exclude)) if exclude else None
+        results = []
+        for row in scores:
+            if excluded is not None:
+                row[excluded] = 0
+            top = np.argpartition(row, -min(k, n))[-min(k, n):] if n > k else np.arange(n)
+            top = top[np.argsort(-row[top], kind="stable")]
+            results.append(
+                [(self.names[i], float(row[i])) for i in top if row[i] >= MIN_SIMILARITY]
+            )
+        return results
+
+    def similar_to(self, columns, text="", k=TOP_K, exclude=()):
+        """
+        The datasets most like a file with these columns (and, optionally,
+        some text about it, e.g. its file name).
+        """
+        return self.most_similar([dataset_terms(text, variables=list(columns))], k, exclude)[0]
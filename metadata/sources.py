@@ -0,0 +1,432 @@
+"""
+Sources are what RegistrationHandler documents. Registration only needs
+the column names, a few rows to show, the row count and a profile (plus a
+sample and the most common values for an edition's statistics), so a
+source can answer those without holding the whole file in memory.
+"""
+
+from pathlib import Path
+
+import pandas as pd
+
+from .profile import profile_frame, sample_rows, ProfileAccumulator
+
+
+DISPLAY_ROWS = 5
+
+# Parquet and Arrow files are profiled from their metadata plus a sample of
+# this many rows, spread over up to FOOTER_SAMPLE_GROUPS row groups/batches.
+FOOTER_SAMPLE_ROWS = 10_000
+FOOTER_SAMPLE_GROUPS = 10
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError(
+            "Reading parquet or arrow files needs pyarrow; "
+            "install it with the 'arrow' extra."
+        ) from e
+    return pyarrow
+
+
+class FrameSource:
+    """
+    A file that's already been read into a DataFrame.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+        self._profile = None
+
+    @property
+    def columns(self):
+        return list(self.frame.columns)
+
+    @property
+    def num_records(self):
+        return len(self.frame)
+
+    def head(self, variable_name, n=DISPLAY_ROWS):
+        return self.frame[variable_name].head(n)
+
+    def profile(self):
+        if self._profile is None:
+            self._profile = profile_frame(self.frame)
+        return self._profile
+
+    def sample(self):
+        return sample_rows(self.frame)
+
+    def top_values(self, k):
+        return {
+            name: list(self.frame[name].value_counts().head(k).items())
+            for name in self.columns
+        }
+
+
+class CsvSource:
+    """
+    A CSV on disk, read in chunks of `chunksize` rows. The first access to
+    anything but the column names makes one pass over the file, after
+    which the counts, profile and display rows are all held in memory
+    that's bounded by the chunk and sample sizes, not the file.
+    """
+
+    def __init__(self, path, chunksize=100_000, **read_csv_kwargs):
+        self.path = Path(path)
+        self.chunksize = chunksize
+        self.read_csv_kwargs = read_csv_kwargs
+
+        self._columns = None
+        self._display = None
+        self._accumulator = None
+        self._profile = None
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            header = pd.read_csv(self.path, nrows=0, **self.read_csv_kwargs)
+            self._columns = list(header.columns)
+        return self._columns
+
+    @property
+    def num_records(self):
+        return self.scan().num_records
+
+    def head(self, variable_name, n=DISPLAY_ROWS):
+        self.scan()
+        return self._display[variable_name].head(n)
+
+    def profile(self):
+        if self._profile is None:
+            self._profile = self.scan().result()
+        return self._profile
+
+    def sample(self):
+        return self.scan().sample
+
+    def top_values(self, k):
+        top = self.scan().top
+        return {name: top[name].most_common(k) for name in self.columns}
+
+    def chunks(self):
+        return pd.read_csv(
+            self.path, chunksize=self.chunksize, **self.read_csv_kwargs
+        )
+
+    def scan(self):
+        if self._accumulator is None:
+            accumulator = ProfileAccumulator()
+            for chunk in self.chunks():
+                if self._display is None:
+                    self._display = chunk.head(DISPLAY_ROWS).copy()
+                accumulator.update(chunk)
+
+            if self._display is None:
+                self._display = pd.DataFrame(columns=self.columns)
+            self._columns = accumulator.columns or self.columns
+            self._accumulator = accumulator
+
+        return self._accumulator
+
+
+def _arrow_type(arrow_type):
+    """
+    The registration data type an arrow type maps to, or None for text
+    (and anything else) where the values have to be looked at.
+    """
+    pa = _import_pyarrow()
+    if (
+        pa.types.is_integer(arrow_type)
+        or pa.types.is_floating(arrow_type)
+        or pa.types.is_decimal(arrow_type)
+        or pa.types.is_boolean(arrow_type)
+    ):
+        return "numeric"
+    if pa.types.is_temporal(arrow_type):
+        return "date"
+    return None
+
+
+def _spread(total, groups=FOOTER_SAMPLE_GROUPS):
+    """
+    Up to `groups` evenly spaced indexes out of range(total).
+    """
+    if total <= groups:
+        return list(range(total))
+    step = total / groups
+    return sorted({int(i * step) for i in range(groups)})
+
+
+def _sample_top_values(sample: pd.DataFrame, num_records, k):
+    """
+    The most common values in a sample, with counts scaled up to the file.
+    """
+    scale = num_records / len(sample) if len(sample) else 0
+    return {
+        name: [
+            (value, round(count * scale))
+            for value, count in sample[name].value_counts().head(k).items()
+        ]
+        for name in sample.columns
+    }
+
+
+def _metadata_profile(schema, num_records, stats, sample: pd.DataFrame):
+    """
+    Builds a profile from file metadata plus a sample. `stats` maps column
+    name to (null_count, min, max), any of which may be None when the file
+    doesn't record it.
+
+    Row and null counts and min/max are exact where the metadata has them.
+    Quantiles come from the sample, small-count cells are the sample's
+    rate scaled to the file, and distinct counts are only known when the
+    sample is the whole file.
+    """
+    profile = profile_frame(sample)
+    whole_file = len(sample) >= num_records
+
+    for field in schema:
+        name = field.name
+        declared = _arrow_type(field.type)
+        if declared is not None:
+            profile.loc[name, "inferred_type"] = declared
+
+        null_count, low, high = stats.get(name, (None, None, None))
+        if null_count is not None:
+            profile.loc[name, "null_count"] = null_count
+            profile.loc[name, "count"] = num_records - null_count
+        if low is not None and profile.loc[name, "inferred_type"] in {"numeric", "date"}:
+            profile.loc[name, "min"] = low
+            profile.loc[name, "max"] = high
+
+        if not whole_file:
+            profile.loc[name, "distinct_count"] = None
+            if len(sample):
+                profile.loc[name, "small_count"] = round(
+                    profile.loc[name, "small_count"] * num_records / len(sample)
+                )
+
+    return profile
+
+
+class ParquetSource:
+    """
+    A parquet file, documented from its footer. Column names and the row
+    count come from the file metadata, min/max and null counts from the
+    row group statistics, and the display rows and sample are read
+    through a memory map, so no full column is ever decoded.
+    """
+
+    def __init__(self, path):
+        _import_pyarrow()
+        import pyarrow.parquet as pq
+
+        self.path = Path(path)
+        self.file = pq.ParquetFile(self.path, memory_map=True)
+        self.schema = [
+            field
+            for field in self.file.schema_arrow
+            if not field.name.startswith("__index_level_")
+        ]
+        self._display = None
+        self._sample = None
+        self._profile = None
+
+    @property
+    def columns(self):
+        return [field.name for field in self.schema]
+
+    @property
+    def num_records(self):
+        return self.file.metadata.num_rows
+
+    def _read(self, row_group, n):
+        batches = self.file.iter_batches(
+            batch_size=n, row_groups=[row_group], columns=self.columns
+        )
+        batch = next(batches, None)
+        return None if batch is None else batch.to_pandas()
+
+    def head(self, variable_name, n=DISPLAY_ROWS):
+        if self._display is None:
+            frame = self._read(0, DISPLAY_ROWS) if self.file.num_row_groups else None
+            self._display = pd.DataFrame(columns=self.columns) if frame is None else frame
+        return self._display[variable_name].head(n)
+
+    def statistics(self):
+        """
+        Folds the row group statistics into (null_count, min, max) per
+        column. A column loses its min/max if any row group with values
+        in it is missing them.
+        """
+        metadata = self.file.metadata
+        stats = {name: [0, None, None] for name in self.columns}
+        unbounded = set()
+
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            for j in range(row_group.num_columns):
+                chunk = row_group.column(j)
+                entry = stats.get(chunk.path_in_schema)
+                if entry is None:
+                    continue
+
+                chunk_stats = chunk.statistics
+                if chunk_stats is None or not chunk_stats.has_null_count:
+                    entry[0] = None
+                elif entry[0] is not None:
+                    entry[0] += chunk_stats.null_count
+
+                if chunk_stats is not None and chunk_stats.has_min_max:
+                    low, high = chunk_stats.min, chunk_stats.max
+                    entry[1] = low if entry[1] is None else min(entry[1], low)
+                    entry[2] = high if entry[2] is None else max(entry[2], high)
+                elif entry[0] is None or chunk_stats.null_count < chunk.num_values:
+                    unbounded.add(chunk.path_in_schema)
+
+        return {
+            name: (nulls, None, None) if name in unbounded else (nulls, low, high)
+            for name, (nulls, low, high) in stats.items()
+        }
+
+    def sample(self):
+        if self._sample is None:
+            groups = _spread(self.file.num_row_groups)
+            per_group = max(1, FOOTER_SAMPLE_ROWS // max(1, len(groups)))
+            frames = [self._read(i, per_group) for i in groups]
+            frames = [frame for frame in frames if frame is not None]
+            self._sample = (
+                pd.concat(frames, ignore_index=True)
+                if frames
+                else pd.DataFrame(columns=self.columns)
+            )
+        return self._sample
+
+    def top_values(self, k):
+        return _sample_top_values(self.sample(), self.num_records, k)
+
+    def profile(self):
+        if self._profile is None:
+            self._profile = _metadata_profile(
+                self.schema, self.num_records, self.statistics(), self.sample()
+            )
+        return self._profile
+
+
+class ArrowSource:
+    """
+    An Arrow IPC (feather v2) file, memory-mapped. Batches are zero-copy
+    views onto the map, so the row count and null counts are read from
+    batch metadata and min/max are computed by arrow over the mapped
+    buffers without building a DataFrame.
+    """
+
+    def __init__(self, path):
+        pa = _import_pyarrow()
+
+        self.path = Path(path)
+        self.reader = pa.ipc.open_file(pa.memory_map(str(self.path), "r"))
+        self.schema = list(self.reader.schema)
+        self._num_records = None
+        self._display = None
+        self._sample = None
+        self._profile = None
+
+    @property
+    def columns(self):
+        return [field.name for field in self.schema]
+
+    def batches(self):
+        for i in range(self.reader.num_record_batches):
+            yield self.reader.get_batch(i)
+
+    @property
+    def num_records(self):
+        if self._num_records is None:
+            self._num_records = sum(batch.num_rows for batch in self.batches())
+        return self._num_records
+
+    def head(self, variable_name, n=DISPLAY_ROWS):
+        if self._display is None:
+            if self.reader.num_record_batches:
+                self._display = self.reader.get_batch(0).slice(0, DISPLAY_ROWS).to_pandas()
+            else:
+                self._display = pd.DataFrame(columns=self.columns)
+        return self._display[variable_name].head(n)
+
+    def statistics(self):
+        import pyarrow.compute as pc
+
+        stats = {}
+        for field in self.schema:
+            nulls, low, high = 0, None, None
+            measurable = _arrow_type(field.type) is not None
+            for batch in self.batches():
+                column = batch.column(field.name)
+                nulls += column.null_count
+                if measurable and column.null_count < len(column):
+                    extremes = pc.min_max(column)
+                    batch_low = extremes["min"].as_py()
+                    batch_high = extremes["max"].as_py()
+                    low = batch_low if low is None else min(low, batch_low)
+                    high = batch_high if high is None else max(high, batch_high)
+            stats[field.name] = (nulls, low, high)
+
+        return stats
+
+    def sample(self):
+        if self._sample is None:
+            pa = _import_pyarrow()
+
+            indexes = _spread(self.reader.num_record_batches)
+            per_batch = max(1, FOOTER_SAMPLE_ROWS // max(1, len(indexes)))
+            batches = [self.reader.get_batch(i).slice(0, per_batch) for i in indexes]
+            self._sample = (
+                pa.Table.from_batches(batches).to_pandas()
+                if batches
+                else pd.DataFrame(columns=self.columns)
+            )
+        return self._sample
+
+    def top_values(self, k):
+        return _sample_top_values(self.sample(), self.num_records, k)
+
+    def profile(self):
+        if self._profile is None:
+            self._profile = _metadata_profile(
+                self.schema, self.num_records, self.statistics(), self.sample()
+            )
+        return self._profile
+
+
+PARQUET_SUFFIXES = {".parquet", ".pq"}
+ARROW_SUFFIXES = {".arrow", ".feather", ".ipc"}
+
+
+def open_source(file, **kwargs):
+    """
+    Wraps whatever was handed to RegistrationHandler in a source: frames
+    are used as-is, CSVs are streamed, and parquet and arrow files are
+    read from their metadata. `kwargs` are CsvSource's (chunksize and
+    read_csv options); nothing else takes any.
+    """
+    if isinstance(file, (str, Path)):
+        path = Path(file)
+        suffix = path.suffix.lower()
+        if suffix == ".csv" or path.suffixes[-2:] == [".csv", ".gz"]:
+            return CsvSource(path, **kwargs)
+    if kwargs:
+        raise TypeError(f"Only CSVs take reading options, not {', '.join(kwargs)}.")
+
+    if isinstance(file, pd.DataFrame):
+        return FrameSource(file)
+    if isinstance(file, (str, Path)):
+        if suffix in PARQUET_SUFFIXES:
+            return ParquetSource(path)
+        if suffix in ARROW_SUFFIXES:
+            return ArrowSource(path)
+        raise ValueError(f"Don't know how to read '{path.name}'.")
+    return file
@@ -0,0 +1,225 @@
+"""
+Recognizing columns that follow a known standard (FIPS codes, census
+GEOIDs, NAICS, ISO dates, parcel numbers...).
+
+A standard is described by a regular expression every value has to match
+in full, a reference list of codes every value has to be in, or both, as
+stored in the standards table (0010_DOCS_standards.sql). BUILTIN_STANDARDS
+are the ones `metadata seed-standards` adds.
+
+StandardMatcher compiles the patterns and hashes the code lists once.
+Matching a file takes the VALUES_PER_COLUMN most common values of every
+column in the first MATCH_ROWS of its sample, stacks them into one Series,
+and runs each pattern and code list over that Series once, so a 300
+column file costs one vectorized pass per standard rather than one per
+column and standard. Each of those values counts as many times as it
+appears, so a column matches when MIN_SHARE of the rows they account for
+do. Rows holding rarer values aren't weighed at all: in a column with
+more distinct values than that, the share is of its commonest ones only.
+
+Integer columns need more than their values: counts, incomes and years
+look like five digit codes as often as not. They're only checked against
+a bare pattern, and have the leading zero a CSV reader stripped put back,
+when the column's name says it holds codes (CODE_NAME); otherwise only
+standards with a code list can match them, as they are.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+
+MIN_SHARE = 0.95
+
+# Rows from the start of the sample that are looked at, and distinct values
+# per column that are checked, most common first.
+MATCH_ROWS = 10_000
+VALUES_PER_COLUMN = 1_000
+
+# A word in a column's name that says its integers are codes.
+CODE_NAME = re.compile(
+    r"(?:^|[^a-z])(fips|geoid|geo|code|cd|id|zip|zipcode|naics|pin|tract|county|cnty|state|block|bg)(?:$|[^a-z])",
+    re.IGNORECASE,
+)
+
+STATE_FIPS = [
+    "01", "02", "04", "05", "06", "08", "09", "10", "11", "12", "13", "15", "16",
+    "17", "18", "19", "20", "21", "22", "23", "24", "25", "26", "27", "28", "29",
+    "30", "31", "32", "33", "34", "35", "36", "37", "38", "39", "40", "41", "42",
+    "44", "45", "46", "47", "48", "49", "50", "51", "53", "54", "55", "56", "60",
+    "66", "69", "72", "78",
+]
+
+BUILTIN_STANDARDS = [
+    {
+        "name": "FIPS state",
+        "description": "Two digit FIPS state code (ANSI INCITS 38)",
+        "maintainer": "US Census Bureau",
+        "pattern": r"\d{2}",
+        "codes": STATE_FIPS,
+        "width": 2,
+    },
+    {
+        "name": "FIPS county",
+        "description": "Five digit FIPS county code: state then county",
+        "maintainer": "US Census Bureau",
+        "pattern": r"\d{5}",
+        "width": 5,
+    },
+    {
+        "name": "Census tract GEOID",
+        "description": "Eleven digit census tract GEOID: state, county, tract",
+        "maintainer": "US Census Bureau",
+        "pattern": r"\d{11}",
+        "width": 11,
+    },
+    {
+        "name": "Census block group GEOID",
+        "description": "Twelve digit census block group GEOID",
+        "maintainer": "US Census Bureau",
+        "pattern": r"\d{12}",
+        "width": 12,
+    },
+    {
+        "name": "Census block GEOID",
+        "description": "Fifteen digit census block GEOID",
+        "maintainer": "US Census Bureau",
+        "pattern": r"\d{15}",
+        "width": 15,
+    },
+    {
+        "name": "ZIP code",
+        "description": "Five digit USPS ZIP code, optionally ZIP+4",
+        "maintainer": "USPS",
+        "pattern": r"\d{5}(-\d{4})?",
+        "width": 5,
+    },
+    {
+        "name": "NAICS",
+        "description": "Six digit North American Industry Classification System code",
+        "maintainer": "US Census Bureau",
+        "pattern": r"[1-9]\d{5}",
+    },
+    {
+        "name": "ISO 8601 date",
+        "description": "Calendar date as YYYY-MM-DD",
+        "maintainer": "ISO",
+        "pattern": r"\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])",
+    },
+    {
+        "name": "Cook County PIN",
+        "description": "Cook County property index number, 14 digits with or without dashes",
+        "maintainer": "Cook County Assessor",
+        "pattern": r"\d{2}-?\d{2}-?\d{3}-?\d{3}-?\d{4}",
+        "width": 14,
+    },
+]
+
+
+class StandardMatcher:
+    def __init__(self, standards):
+        """
+        `standards` as get_current_standards returns them. Ones with
+        neither a pattern nor codes can be linked by hand but never match.
+        """
+        self.standards = [
+            {
+                **standard,
+                "regex": re.compile(standard["pattern"]) if standard.get("pattern") else None,
+                "code_set": frozenset(map(str, standard["codes"])) if standard.get("codes") else None,
+            }
+            for standard in standards
+            if standard.get("pattern") or standard.get("codes")
+        ]
+
+    @property
+    def names(self):
+        return [standard["name"] for standard in self.standards]
+
+    def match(self, sample: pd.DataFrame, columns=None):
+        """
+        {column: [(standard name, share of rows matching), ...]} for the
+        columns that match at least one standard, best first, the share
+        being of the rows holding a column's most common values. A
+        standard with a code list beats one with only a pattern.
+        """
+        columns = list(sample.columns if columns is None else columns)
+        if not self.standards or not columns:
+            return {}
+
+        values, counts, owners, numeric, coded = _stack_values(sample, columns)
+        if not len(values):
+            return {}
+        totals = np.bincount(owners, weights=counts, minlength=len(columns))
+
+        lengths = values.str.len().to_numpy()
+        found = {}
+        for standard in self.standards:
+            text = values
+            if standard.get("width"):
+                # Put back the leading zero a CSV reader strips from integer
+                # columns named as codes; a single one, so a short number
+                # doesn't become a code of any width.
+                pad = numeric & coded & (lengths == standard["width"] - 1)
+                text = values.where(~pad, values.str.zfill(standard["width"]))
+
+            ok = np.ones(len(values), dtype=bool)
+            if standard["code_set"] is None:
+                ok &= ~numeric | coded
+            if standard["regex"] is not None:
+                ok &= text.str.fullmatch(standard["regex"]).to_numpy(dtype=bool, na_value=False)
+            if standard["code_set"] is not None:
+                ok &= text.isin(standard["code_set"]).to_numpy()
+
+            matched = np.bincount(owners, weights=counts * ok, minlength=len(columns))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                shares = matched / totals
+            for i in np.flatnonzero(shares >= MIN_SHARE):
+                found.setdefault(columns[i], []).append(
+                    (standard["name"], float(shares[i]), standard["code_set"] is not None)
+                )
+
+        return {
+            column: [
+                (name, share)
+                for name, share, _ in sorted(matches, key=lambda match: (not match[2], -match[1]))
+            ]
+            for column, matches in found.items()
+        }
+
+
+def _stack_values(sample: pd.DataFrame, columns):
+    """
+    The most common values of every column as one Series of strings, with
+    how often each appears, which column it came from, whether that
+    column held integers and whether its name says they're codes.
+    """
+    values, counts, owners, numeric, coded = [], [], [], [], []
+    for i, name in enumerate(columns):
+        column = sample[name].iloc[:MATCH_ROWS].dropna()
+        is_integer = pd.api.types.is_numeric_dtype(column.dtype) and not pd.api.types.is_bool_dtype(column.dtype)
+        if is_integer and not (column == column.round()).all():
+            # Fractions aren't codes.
+            continue
+
+        # Counted before anything's turned into text, which is the slow part.
+        top = column.value_counts().head(VALUES_PER_COLUMN)
+        index = top.index.astype("int64") if is_integer else top.index
+        values.append(index.astype(str).to_numpy(dtype=object))
+        counts.append(top.to_numpy(dtype="float64"))
+        owners.append(np.full(len(top), i))
+        numeric.append(np.full(len(top), is_integer))
+        coded.append(np.full(len(top), bool(CODE_NAME.search(str(name)))))
+
+    if not values:
+        empty = np.array([], dtype=bool)
+        return pd.Series([], dtype=object), np.array([]), np.array([], dtype=int), empty, empty
+
+    return (
+        pd.Series(np.concatenate(values), dtype=object),
+        np.concatenate(counts),
+        np.concatenate(owners),
+        np.concatenate(numeric),
+        np.concatenate(coded),
+    )
@@ -0,0 +1,41 @@
+"""
+The rules registration values have to follow, shared by the interactive
+prompts in capture.py and the spec files in bulk.py.
+"""
+
+from .autotime import RESOLUTIONS as CADENCES
+
+DATA_TYPES = {"numeric", "string", "date"}
+
+
+def validate_date(date):
+    from dateutil.parser import parse as parse_date, ParserError as DateParseError
+
+    try:
+        parse_date(str(date))
+        return True
+    except (DateParseError, OverflowError):
+        return False
+
+
+def validate_keyword(value):
+    try:
+        return len(value) > 3
+    except TypeError:
+        return False
+
+
+def validate_cadence(cadence):
+    """
+    Cadences are the resolutions autotime divides coverage into, see
+    metadata/autotime.py.
+    """
+    return cadence in CADENCES
+
+
+def validate_data_type(data_type):
+    return data_type in DATA_TYPES
+
+
+def validate_suppression_threshold(value):
+    return str(value).isnumeric()
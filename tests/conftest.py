@@ -0,0 +1,24 @@
+import logging
+
+import pytest
+from sqlalchemy import create_engine
+
+from metadata.access import MetadataConnection
+from metadata.schema import metadata
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    """
+    An empty catalog in a sqlite file rather than in memory, so every
+    connection (and thread) sees the same database.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}", connect_args={"timeout": 30})
+    metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture()
+def md(engine):
+    return MetadataConnection(logging.getLogger("tests"), engine)
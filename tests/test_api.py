@@ -0,0 +1,156 @@
+import json
+
+from sqlalchemy import case, event, update
+
+from metadata.api import CatalogAPI, TTLCache
+from metadata.schema import tags
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_api(md):
+    register(md, "parcels")
+
+    queries = []
+    event.listen(md.db_engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+
+    clock = Clock()
+    return CatalogAPI(md, clock=clock), clock, queries
+
+
+def register(md, name):
+    with md.db_engine.begin() as db:
+        md.register(
+            {"table_name": name, "description": f"All the {name} in the county"},
+            [
+                ({"variable_name": "parcel_id", "description": "Parcel number"}, None),
+                ({"variable_name": "owner", "description": "Owner of record"}, None),
+            ],
+            [f"{name} keyword"],
+            {"num_records": 3, "statistics": {"version": 1}},
+            db,
+        )
+
+
+def get(api, path, query="", etag=None):
+    status, headers, body = api.respond("GET", path, query, etag)
+    return status, dict(headers), json.loads(body) if body else None
+
+
+def test_lookups(md):
+    api, _, _ = make_api(md)
+
+    status, _, dataset = get(api, "/datasets/parcels")
+    assert status == 200
+    assert dataset["variables"] == ["parcel_id", "owner"]
+    assert "search_vector" not in dataset
+
+    _, _, variables = get(api, "/datasets/parcels/variables")
+    assert [variable["variable_name"] for variable in variables] == ["parcel_id", "owner"]
+
+    _, _, editions = get(api, "/datasets/parcels/editions")
+    assert editions[0]["num_records"] == 3
+    assert "statistics" not in editions[0]
+    _, _, editions = get(api, "/datasets/parcels/editions", "statistics=true")
+    assert editions[0]["statistics"] == {"version": 1}
+
+    _, _, available = get(api, "/datasets")
+    assert available["parcels"]["variables"] == ["parcel_id", "owner"]
+
+    _, _, results = get(api, "/search/datasets", "q=parcels")
+    assert results[0]["table_name"] == "parcels"
+
+
+def test_errors(md):
+    api, _, _ = make_api(md)
+
+    assert get(api, "/datasets/schools")[0] == 404
+    assert get(api, "/nowhere")[0] == 404
+    assert get(api, "/search/datasets")[0] == 400
+    assert get(api, "/search/datasets", "q=parcels&limit=many")[0] == 400
+    assert api.respond("POST", "/datasets", "")[0] == 405
+
+
+def test_repeated_lookups_are_cached(md):
+    api, clock, queries = make_api(md)
+
+    get(api, "/datasets/parcels")
+    queries.clear()
+    for _ in range(100):
+        assert get(api, "/datasets/parcels")[0] == 200
+    assert queries == []
+
+    # Once the version is due a re-read, that's the only query.
+    clock.now += 2
+    get(api, "/datasets/parcels")
+    assert len(queries) == 1
+
+
+def test_etags_and_invalidation(md):
+    api, clock, queries = make_api(md)
+
+    _, headers, _ = get(api, "/datasets/parcels")
+    etag = headers["ETag"]
+    queries.clear()
+    status, _, body = get(api, "/datasets/parcels", etag=etag)
+    assert (status, body) == (304, None)
+    assert queries == []
+
+    register(api.md, "schools")
+    # Still within the version TTL, so the old ETag still matches.
+    assert get(api, "/datasets/parcels", etag=etag)[0] == 304
+
+    clock.now += 2
+    assert get(api, "/datasets/parcels", etag=etag)[0] == 200
+    assert get(api, "/datasets/schools")[0] == 200
+    _, _, results = get(api, "/search/datasets", "q=schools")
+    assert results[0]["table_name"] == "schools"
+
+    # Swapping two datasets' keywords leaves every count as it was.
+    etag = get(api, "/datasets/parcels")[1]["ETag"]
+    with api.md.db_engine.begin() as db:
+        db.execute(update(tags).values(kw_id=case((tags.c.kw_id == 1, 2), else_=1)))
+    clock.now += 2
+    assert get(api, "/datasets/parcels", etag=etag)[0] == 200
+
+    # Standards are searchable, so they move the version too.
+    etag = get(api, "/search/standards", "q=ward")[1]["ETag"]
+    with api.md.db_engine.begin() as db:
+        api.md.insert_standard({"name": "City ward", "pattern": r"\d{1,2}"}, db)
+    clock.now += 2
+    status, _, results = get(api, "/search/standards", "q=ward", etag=etag)
+    assert (status, [row["name"] for row in results]) == (200, ["City ward"])
+
+
+def test_wsgi(md):
+    from wsgiref.util import setup_testing_defaults
+
+    api, _, _ = make_api(md)
+    environ = {"PATH_INFO": "/datasets/parcels"}
+    setup_testing_defaults(environ)
+
+    started = {}
+    body = b"".join(api(environ, lambda status, headers: started.update(status=status)))
+
+    assert started["status"] == "200 OK"
+    assert json.loads(body)["table_name"] == "parcels"
+
+
+def test_ttl_cache():
+    clock = Clock()
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+    clock.now += 11
+    assert cache.get("a") is None
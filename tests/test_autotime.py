@@ -0,0 +1,109 @@
+import random
+from datetime import date
+
+from sqlalchemy import insert, select
+
+from metadata.autotime import (
+    Autotime,
+    IntervalTree,
+    coverage,
+    dataset_coverage,
+    describe_gaps,
+    parse_period,
+)
+from metadata.schema import datasets, editions
+from metadata.schema import autotime as autotime_table, coverage as coverage_table
+
+
+def seed(md):
+    with md.db_engine.begin() as db:
+        db.execute(
+            insert(datasets),
+            [
+                {"id": 1, "table_name": "acs_tracts", "unit_of_analysis": " Tract ", "cadence": "year"},
+                {"id": 2, "table_name": "crimes", "unit_of_analysis": "tract-level", "cadence": "quarter"},
+                {"id": 3, "table_name": "permits", "unit_of_analysis": "parcel", "cadence": "month"},
+                {"id": 4, "table_name": "snapshot", "unit_of_analysis": "tract", "cadence": "none"},
+            ],
+        )
+        db.execute(
+            insert(editions),
+            [
+                {"dataset_id": 1, "collection_start": date(2018, 3, 1), "collection_end": date(2018, 5, 1)},
+                {"dataset_id": 1, "collection_start": date(2019, 1, 1), "collection_end": date(2019, 12, 31)},
+                {"dataset_id": 2, "collection_start": date(2019, 1, 1), "collection_end": date(2019, 6, 30)},
+                {"dataset_id": 2, "collection_start": date(2020, 1, 1), "collection_end": None},
+                {"dataset_id": 3, "collection_start": date(2019, 8, 1), "collection_end": date(2019, 8, 31)},
+                {"dataset_id": 4, "collection_start": date(2019, 8, 15), "collection_end": date(2019, 8, 15)},
+            ],
+        )
+
+
+def test_coverage_is_whole_periods_with_gaps():
+    annual = coverage([(date(2018, 3, 1), date(2018, 5, 1)), (date(2020, 2, 1), None)], "year")
+    assert annual == [(date(2018, 1, 1), date(2018, 12, 31)), (date(2020, 1, 1), date(2020, 12, 31))]
+
+    quarterly = coverage(
+        [(date(2019, 1, 1), date(2019, 6, 30)), (date(2019, 7, 1), date(2019, 9, 30)), (None, None)],
+        "quarter",
+    )
+    assert quarterly == [(date(2019, 1, 1), date(2019, 9, 30))]
+
+
+def test_periods():
+    assert parse_period("2019-Q3") == (date(2019, 7, 1), date(2019, 9, 30))
+    assert parse_period("2020-02") == (date(2020, 2, 1), date(2020, 2, 29))
+    assert parse_period("2019") == (date(2019, 1, 1), date(2019, 12, 31))
+    assert parse_period("2019-08-15") == (date(2019, 8, 15), date(2019, 8, 15))
+
+
+def test_which_datasets_cover_a_period(md):
+    seed(md)
+    autotime = Autotime(md)
+    with md.db_engine.connect() as db:
+        assert autotime.covering("tract", *parse_period("2019-Q3"), db) == [
+            {"id": 1, "table_name": "acs_tracts"}
+        ]
+        partly = autotime.covering("Tract", *parse_period("2019-Q3"), db, partial=True)
+        assert [row["table_name"] for row in partly] == ["acs_tracts", "snapshot"]
+        assert [row["table_name"] for row in autotime.covering("tract", *parse_period("2019-Q2"), db)] == [
+            "acs_tracts",
+            "crimes",
+        ]
+        assert autotime.covering("county", *parse_period("2019"), db) == []
+
+        summary = autotime.summary(2, db)
+        assert summary["frame_type"] == "tract"
+        assert (summary["available_from"], summary["available_to"]) == (date(2019, 1, 1), date(2020, 3, 31))
+        assert describe_gaps(summary["gaps"], "quarter") == "2019-Q3 to 2019-Q4"
+
+
+def test_stored_summaries_read_like_computed_ones(md):
+    seed(md)
+    autotime = Autotime(md)
+    with md.db_engine.begin() as db:
+        # What the 0012 triggers keep there on postgres.
+        summaries, intervals = dataset_coverage(
+            db.execute(select(datasets.c.id, datasets.c.unit_of_analysis, datasets.c.cadence)).all(),
+            db.execute(select(editions.c.dataset_id, editions.c.collection_start, editions.c.collection_end)),
+        )
+        db.execute(insert(autotime_table), summaries)
+        db.execute(insert(coverage_table), intervals)
+
+        for dataset_id in (1, 2, 3, 4):
+            assert autotime._stored_summary(dataset_id, db) == autotime.summary(dataset_id, db)
+        assert autotime._stored_summary(99, db) is None
+
+
+def test_interval_tree_matches_a_scan():
+    rng = random.Random(0)
+    intervals = []
+    for i in range(2_000):
+        start = rng.randrange(0, 10_000)
+        intervals.append((start, start + rng.randrange(0, 500), i))
+    tree = IntervalTree(intervals)
+
+    for _ in range(200):
+        a = rng.randrange(0, 10_000)
+        b = a + rng.randrange(0, 100)
+        assert sorted(tree.search(a, b)) == sorted(i for s, e, i in intervals if s <= a and e >= b)
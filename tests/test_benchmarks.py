@@ -0,0 +1,35 @@
+from sqlalchemy import func, select
+
+from benchmarks.bench_catalog import compare, run
+from benchmarks.synthetic import build_catalog
+from metadata.schema import datasets, variables
+
+
+def test_suite_runs_on_a_small_catalog(engine, md, tmp_path):
+    build_catalog(engine, n_datasets=20, n_variables=500, n_keywords=50)
+
+    with engine.connect() as db:
+        assert db.execute(select(func.count()).select_from(datasets)).scalar() == 20
+        assert db.execute(select(func.count()).select_from(variables)).scalar() == 500
+
+    results = run(engine, md, repeat=1, workdir=tmp_path)
+
+    assert results["register_400"]["round_trips"] == 5
+    assert results["get_available_datasets"]["round_trips"] == 1
+
+
+def test_compare_flags_slower_and_chattier_benchmarks():
+    baseline = {
+        "a": {"best_ms": 100.0, "round_trips": 1},
+        "b": {"best_ms": 1.0, "round_trips": 5},
+    }
+    results = {
+        "a": {"best_ms": 200.0, "round_trips": 1},
+        "b": {"best_ms": 3.0, "round_trips": 6},
+        "new": {"best_ms": 1.0, "round_trips": 1},
+    }
+
+    assert compare(results, baseline, tolerance=0.5) == [
+        "a: 100.0 ms -> 200.0 ms",
+        "b: 5 -> 6 round trips",
+    ]
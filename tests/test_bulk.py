@@ -0,0 +1,125 @@
+import json
+
+import pytest
+from returns.result import Success, Failure
+from sqlalchemy import func, select
+
+from metadata.bulk import BulkRegistrar, SpecError, load_spec, parse_spec
+from metadata.schema import datasets, editions, variables
+
+
+SPEC = """
+file = "parcels.csv"
+
+[dataset]
+table_name = "{name}"
+description = "Parcel ownership"
+cadence = "year"
+keywords = ["property", "parcels"]
+
+[[variables]]
+variable_name = "parcel_id"
+data_type = "string"
+
+[[variables]]
+variable_name = "owner"
+data_type = "string"
+
+[edition]
+publish_date = 2024-01-01
+collection_start = 2023-01-01
+collection_end = 2023-12-31
+acquisition_date = 2024-01-02
+"""
+
+
+def test_bulk_registers_specs_concurrently(md, tmp_path):
+    (tmp_path / "parcels.csv").write_text("parcel_id,owner\n01001,smith\n01002,jones\n")
+    (tmp_path / "parcels_2024.csv").write_text("parcel_id,owner\n01001,smith\n01002,brown\n")
+    for i in range(6):
+        (tmp_path / f"parcels_{i}.toml").write_text(SPEC.format(name=f"parcels_{i}"))
+    (tmp_path / "edition.json").write_text(
+        json.dumps(
+            {
+                "dataset_name": "parcels_0",
+                "file": "parcels_2024.csv",
+                "edition": {
+                    "publish_date": "2024-06-01",
+                    "collection_start": "2024-01-01",
+                    "collection_end": "2024-05-31",
+                    "acquisition_date": "2024-06-02",
+                },
+            }
+        )
+    )
+    (tmp_path / "broken.toml").write_text(SPEC.format(name="parcels_0").replace("year", "daily"))
+
+    results = dict(BulkRegistrar(md, "tests", workers=4).run([tmp_path]))
+
+    assert isinstance(results[tmp_path / "broken.toml"], Failure)
+    assert all(
+        isinstance(result, Success)
+        for path, result in results.items()
+        if path.name != "broken.toml"
+    )
+
+    with md.db_engine.connect() as db:
+        assert db.execute(select(func.count()).select_from(datasets)).scalar() == 6
+        assert db.execute(select(func.count()).select_from(variables)).scalar() == 12
+        assert db.execute(select(func.count()).select_from(editions)).scalar() == 7
+        profile = db.execute(
+            select(variables.c.profile).where(variables.c.variable_name == "owner").limit(1)
+        ).scalar()
+        assert profile["inferred_type"] == "string"
+
+
+def test_parse_spec_reports_every_problem(tmp_path):
+    path = tmp_path / "bad.toml"
+    path.write_text(
+        SPEC.format(name="parcels")
+        .replace('file = "parcels.csv"', "")
+        .replace('"property", ', '"tax", ')
+        .replace('data_type = "string"', 'data_type = "text"', 1)
+    )
+
+    with pytest.raises(SpecError) as error:
+        parse_spec(load_spec(path), path, "tests")
+
+    assert error.value.problems == [
+        "Keyword 'tax' must be longer than three characters.",
+        "'parcel_id' needs a data_type of numeric, string or date.",
+        "The edition needs num_records (or a 'file' to count).",
+    ]
+
+
+def test_bad_specs_and_mismatched_editions_fail_on_their_own(md, tmp_path):
+    (tmp_path / "parcels.csv").write_text("parcel_id,owner\n01001,smith\n")
+    (tmp_path / "renamed.csv").write_text("parcel,owner\n01001,smith\n")
+    (tmp_path / "parcels.toml").write_text(SPEC.format(name="parcels"))
+    (tmp_path / "renamed.json").write_text(
+        json.dumps(
+            {
+                "dataset_name": "parcels",
+                "file": "renamed.csv",
+                "edition": {
+                    "publish_date": "2024-06-01",
+                    "collection_start": "2024-01-01",
+                    "collection_end": "2024-05-31",
+                    "acquisition_date": "2024-06-02",
+                },
+            }
+        )
+    )
+    (tmp_path / "not_a_table.json").write_text(json.dumps({"dataset": "parcels", "variables": "owner"}))
+    (tmp_path / "unreadable.toml").write_text("this isn't = = toml")
+
+    results = dict(BulkRegistrar(md, "tests", workers=2).run([tmp_path]))
+
+    assert isinstance(results[tmp_path / "parcels.toml"], Success)
+    for name in ("renamed.json", "not_a_table.json", "unreadable.toml"):
+        assert isinstance(results[tmp_path / name], Failure)
+    assert "parcel_id" in str(results[tmp_path / "renamed.json"].failure())
+
+    with md.db_engine.connect() as db:
+        assert db.execute(select(func.count()).select_from(editions)).scalar() == 1
+        assert db.execute(select(datasets.c.schema_fingerprint)).scalar() is not None
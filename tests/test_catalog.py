@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, update
+
+from metadata.replica import LocalReplica, replica_state
+from metadata.schema import datasets, editions
+
+
+def register(md, name, variables, keywords, db):
+    return md.register(
+        {"table_name": name},
+        [({"variable_name": v}, None) for v in variables],
+        keywords,
+        {"num_records": 1},
+        db,
+    )
+
+
+def test_catalog_groups_and_persists(md, tmp_path):
+    with md.db_engine.begin() as db:
+        a = register(md, "parcels", ["parcel_id", "owner"], ["property"], db)
+        b = register(md, "tracts", ["geoid"], ["census"], db)
+        # Interleave variables so an unordered groupby would split datasets.
+        md.insert_variables([({"variable_name": "zoning"}, None)], a, db)
+        empty = register(md, "empty", [], [], db)
+
+    replica = LocalReplica(md, tmp_path / "replica.db")
+    assert replica.refresh() is True
+
+    assert replica.datasets() == {
+        "parcels": (a, ["parcel_id", "owner", "zoning"]),
+        "tracts": (b, ["geoid"]),
+        "empty": (empty, []),
+    }
+    assert replica.keywords() == {"property": 1, "census": 2}
+
+    reloaded = LocalReplica(md, tmp_path / "replica.db")
+    assert reloaded.datasets() == replica.datasets()
+    assert reloaded.synced_at == replica.synced_at
+
+    with md.db_engine.connect() as db:
+        assert md.get_available_datasets(db, names=["tracts", "gone"]) == {"tracts": (b, ["geoid"])}
+        assert md.get_all_keywords(db, contents=[" Census", "gone"]) == {"census": 2}
+
+
+def test_catalog_refreshes_only_changes(md, tmp_path):
+    with md.db_engine.begin() as db:
+        register(md, "parcels", ["parcel_id"], ["property"], db)
+
+    replica = LocalReplica(md, tmp_path / "replica.db")
+    replica.refresh()
+
+    # Put the last sync a day ahead, and the rows on either side of it: only
+    # tracts, stamped two days ahead, counts as changed since. The change to
+    # parcels, stamped two days back, isn't read.
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    with replica.engine.begin() as local:
+        local.execute(replica_state.delete())
+        local.execute(insert(replica_state).values(id=1, synced_at=now + timedelta(days=1)))
+    with md.db_engine.begin() as db:
+        db.execute(update(datasets).values(description="Changed", updated_at=now - timedelta(days=2)))
+        ds_id = register(md, "tracts", ["geoid"], [], db)
+        for table, column in ((datasets, datasets.c.id), (editions, editions.c.dataset_id)):
+            db.execute(update(table).where(column == ds_id).values(updated_at=now + timedelta(days=2)))
+
+    assert replica.refresh() is False
+
+    assert set(replica.datasets()) == {"parcels", "tracts"}
+    with replica.engine.connect() as local:
+        assert replica.local.get_dataset("parcels", local)["description"] is None
@@ -0,0 +1,48 @@
+from prompt_toolkit.document import Document
+
+from metadata.completion import CatalogCompleter
+
+
+USAGE = {
+    "census_tracts": 12,
+    "census_blocks": 3,
+    "crime incidents": 40,
+    "parcel_ownership": 7,
+    "property_sales": 0,
+}
+
+
+def test_prefixes_rank_by_usage_and_match_word_starts():
+    completer = CatalogCompleter(lambda: USAGE, background=False)
+
+    assert completer.complete("c") == ["crime incidents", "census_tracts", "census_blocks"]
+    # Fuzzy matches fill out the list after the prefix matches.
+    assert completer.complete("CENSUS_T")[:2] == ["census_tracts", "census_blocks"]
+    assert completer.complete("incid")[0] == "crime incidents"
+    assert completer.complete("")[:2] == ["crime incidents", "census_tracts"]
+
+
+def test_typos_fall_back_to_trigrams():
+    completer = CatalogCompleter(lambda: USAGE, background=False)
+
+    assert completer.complete("parcle_owner")[0] == "parcel_ownership"
+    assert completer.complete("zzzz") == []
+
+
+def test_completions_replace_the_whole_input():
+    completer = CatalogCompleter(lambda: USAGE)
+    completer.ready.wait(5)
+
+    completions = list(completer.get_completions(Document("census t"), None))
+
+    assert [c.text for c in completions][0] == "census_tracts"
+    assert completions[0].start_position == -len("census t")
+
+
+def test_failed_loads_leave_no_completions():
+    def load():
+        raise RuntimeError("database is down")
+
+    completer = CatalogCompleter(load, background=False)
+
+    assert completer.complete("census") == []
@@ -0,0 +1,117 @@
+import hashlib
+import os
+
+import pytest
+from sqlalchemy import func, select
+
+from metadata import digest
+from metadata.digest import DigestCache, file_digest
+from metadata.document import DocumentWriter, document, document_edition
+from metadata.schema import editions
+
+
+DATES = {
+    "publish_date": "2024-06-01",
+    "collection_start": "2024-01-01",
+    "collection_end": "2024-05-31",
+    "acquisition_date": "2024-06-02",
+}
+
+SPEC = {
+    "dataset": {"table_name": "parcels", "description": "Parcel ownership", "cadence": "year"},
+    "variables": [
+        {"variable_name": "parcel_id", "data_type": "string"},
+        {"variable_name": "owner", "data_type": "string"},
+    ],
+    "edition": DATES,
+}
+
+
+@pytest.fixture(autouse=True)
+def digest_cache(tmp_path, monkeypatch):
+    # Keep the digests these tests compute out of the real cache directory.
+    monkeypatch.setattr(digest, "_cache", DigestCache(tmp_path / "digests.json"))
+
+
+def test_file_digest_is_the_sha256_of_the_file(tmp_path):
+    path = tmp_path / "data.bin"
+    data = os.urandom(3 * digest.CHUNK + 123)
+    path.write_bytes(data)
+    assert file_digest(path) == hashlib.sha256(data).hexdigest()
+
+    (tmp_path / "empty").write_bytes(b"")
+    assert file_digest(tmp_path / "empty") == hashlib.sha256(b"").hexdigest()
+
+
+def test_cache_is_checked_against_size_mtime_and_sample(tmp_path, monkeypatch):
+    path = tmp_path / "parcels.csv"
+    path.write_text("parcel_id,owner\n01001,smith\n")
+    cache = DigestCache(tmp_path / "digests.json")
+    first = cache.content_digest(path)
+    assert first["content_size"] == path.stat().st_size
+    cache.flush()
+
+    hashed = []
+    monkeypatch.setattr(digest, "file_digest", lambda path: hashed.append(path) or "changed")
+    assert DigestCache(tmp_path / "digests.json").content_digest(path) == first
+    assert hashed == []
+
+    # Same size and timestamp, different bytes.
+    stat = path.stat()
+    path.write_text("parcel_id,owner\n01001,jones\n")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.content_digest(path)["content_digest"] == "changed"
+    assert len(hashed) == 1
+
+
+def test_new_digests_are_saved_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(digest, "SAVE_EVERY", 3)
+    cache = DigestCache(tmp_path / "digests.json")
+    saves = []
+    save = cache._save
+    monkeypatch.setattr(cache, "_save", lambda: saves.append(1) or save())
+
+    for i in range(7):
+        (tmp_path / f"{i}.csv").write_text(f"n\n{i}\n")
+        cache.content_digest(tmp_path / f"{i}.csv")
+    assert len(saves) == 2
+
+    cache.flush()
+    cache.flush()
+    assert len(saves) == 3
+    assert len(DigestCache(tmp_path / "digests.json")._load()) == 7
+
+
+def test_an_unchanged_file_is_not_a_new_edition(md, tmp_path):
+    path = tmp_path / "parcels.csv"
+    path.write_text("parcel_id,owner\n01001,smith\n01002,jones\n")
+
+    with DocumentWriter(md, "tests") as writer:
+        dataset_id = document(path, SPEC, writer=writer).result()
+        assert document_edition(path, "parcels", writer=writer, **DATES).result() is None
+
+        path.write_text("parcel_id,owner\n01001,smith\n01002,brown\n")
+        assert document_edition(path, "parcels", writer=writer, **DATES).result() == dataset_id
+
+    with md.db_engine.connect() as db:
+        assert db.execute(select(func.count()).select_from(editions)).scalar() == 2
+        assert md.find_edition_by_digest(file_digest(path), db, "parcels")["table_name"] == "parcels"
+        assert md.find_edition_by_digest(file_digest(path), db, "tracts") is None
+
+
+def test_a_file_twice_in_one_batch_is_one_edition(md, tmp_path):
+    path = tmp_path / "parcels.csv"
+    path.write_text("parcel_id,owner\n01001,smith\n01002,jones\n")
+
+    with DocumentWriter(md, "tests") as writer:
+        dataset_id = document(path, SPEC, writer=writer).result()
+
+    with DocumentWriter(md, "tests", linger=60) as writer:
+        path.write_text("parcel_id,owner\n01001,smith\n01002,brown\n")
+        first = document_edition(path, "parcels", writer=writer, **DATES)
+        second = document_edition(path, "parcels", writer=writer, **DATES)
+        writer.flush()
+
+    assert (first.result(), second.result()) == (dataset_id, None)
+    with md.db_engine.connect() as db:
+        assert db.execute(select(func.count()).select_from(editions)).scalar() == 2
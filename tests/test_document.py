@@ -0,0 +1,126 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy import event, func, select
+
+from metadata.bulk import SpecError
+from metadata.document import DocumentWriter, document, document_edition
+from metadata.schema import datasets, editions
+
+
+DATES = {
+    "publish_date": "2024-06-01",
+    "collection_start": "2024-01-01",
+    "collection_end": "2024-05-31",
+    "acquisition_date": "2024-06-02",
+}
+
+FRAME = pd.DataFrame({"parcel_id": ["01001", "01002"], "owner": ["smith", "jones"]})
+
+SPEC = {
+    "dataset": {
+        "table_name": "parcels",
+        "description": "Parcel ownership",
+        "cadence": "year",
+        "keywords": ["property"],
+    },
+    "variables": [
+        {"variable_name": "parcel_id", "data_type": "string"},
+        {"variable_name": "owner", "data_type": "string"},
+    ],
+    "edition": DATES,
+}
+
+
+def count(md, table):
+    with md.db_engine.connect() as db:
+        return db.execute(select(func.count()).select_from(table)).scalar()
+
+
+def test_documents_in_batches(md):
+    statements = []
+    event.listen(md.db_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    with DocumentWriter(md, "tests", linger=60) as writer:
+        dataset_id = document(FRAME, SPEC, writer=writer)
+        writer.flush()
+        dataset_id = dataset_id.result()
+        statements.clear()
+
+        futures = [document_edition(FRAME, "parcels", writer=writer, **DATES) for _ in range(50)]
+        writer.flush()
+
+    # The lookup, the fingerprints and the editions.
+    assert len(statements) == 3
+    assert [future.result() for future in futures] == [dataset_id] * 50
+    assert count(md, editions) == 51
+
+    with md.db_engine.connect() as db:
+        assert db.execute(select(datasets.c.schema_fingerprint)).scalar() is not None
+        assert db.execute(select(editions.c.publish_date)).first()[0] == date(2024, 6, 1)
+        assert db.execute(select(editions.c.num_records)).first()[0] == 2
+
+
+def test_failures_only_fail_their_own_registration(md):
+    with DocumentWriter(md, "tests") as writer:
+        futures = [
+            document(FRAME, SPEC, writer=writer),
+            document_edition(FRAME, "parcels", writer=writer, **DATES),
+            document_edition(FRAME, "tracts", writer=writer, **DATES),
+            # The name's taken by the first one.
+            document(FRAME, SPEC, writer=writer),
+        ]
+
+    assert futures[0].result() == futures[1].result()
+    with pytest.raises(SpecError):
+        futures[2].result()
+    assert futures[3].exception() is not None
+    assert count(md, datasets) == 1
+    assert count(md, editions) == 2
+
+
+def test_invalid_registrations_raise_straight_away(md):
+    with DocumentWriter(md, "tests") as writer:
+        with pytest.raises(SpecError, match="publish_date"):
+            document_edition(FRAME, "parcels", writer=writer)
+        with pytest.raises(SpecError, match="columns|Missing|missing"):
+            document(FRAME[["owner"]], SPEC, writer=writer)
+
+    with pytest.raises(RuntimeError):
+        writer.submit({})
+
+
+def test_flush_never_waits_on_a_stopped_writer(md, monkeypatch):
+    writer = DocumentWriter(md, "tests", linger=0)
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.flush()
+
+    writer = DocumentWriter(md, "tests", linger=0)
+
+    def crash(batch):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(writer, "_write", crash)
+    monkeypatch.setattr("threading.excepthook", lambda args: None)
+    future = document(FRAME, SPEC, writer=writer)
+    # Returns or raises, depending on whether the thread was seen dying,
+    # but doesn't hang.
+    try:
+        writer.flush()
+    except RuntimeError:
+        pass
+    assert future.exception() is not None
+    with pytest.raises(RuntimeError):
+        document_edition(FRAME, "parcels", writer=writer, **DATES)
+
+
+def test_editions_must_have_the_datasets_columns(md):
+    with DocumentWriter(md, "tests") as writer:
+        document(FRAME, SPEC, writer=writer).result()
+        renamed = document_edition(FRAME.rename(columns={"owner": "holder"}), "parcels", writer=writer, **DATES)
+        with pytest.raises(SpecError, match="holder"):
+            renamed.result()
+
+    assert count(md, editions) == 1
@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from metadata.drift import edition_snapshot, drift_report, describe_drift
+from metadata.profile import TopValues
+from metadata.sources import open_source
+
+
+def _tracts(n, seed, income_shift=0.0, vacant_share=0.1):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "tract": [f"26163{i:06d}" for i in range(n)],
+            "median_income": rng.normal(50_000 * (1 + income_shift), 10_000, n),
+            "status": rng.choice(
+                ["occupied", "vacant"], n, p=[1 - vacant_share, vacant_share]
+            ),
+        }
+    )
+
+
+def test_streamed_snapshot_round_trips_and_matches_itself(tmp_path):
+    path = tmp_path / "tracts.csv"
+    _tracts(5_000, seed=1).to_csv(path, index=False)
+
+    snapshot = edition_snapshot(open_source(path, chunksize=700))
+    stored = json.loads(json.dumps(snapshot))
+
+    assert stored["num_records"] == 5_000
+    assert len(stored["columns"]["median_income"]["quantiles"]) == 101
+    assert stored["columns"]["status"]["top"][0][0] == "occupied"
+
+    again = edition_snapshot(open_source(_tracts(5_000, seed=2)))
+    report = drift_report(stored, again)
+    assert report["drifted"] == []
+    assert report["columns"]["median_income"]["ks"] < 0.05
+
+
+def test_drift_report_flags_shifted_columns():
+    previous = edition_snapshot(open_source(_tracts(5_000, seed=1)))
+    current = _tracts(5_000, seed=2, income_shift=0.3, vacant_share=0.4)
+    current["median_income"] = current["median_income"].mask(
+        current.index % 5 == 0
+    )
+    current = current.drop(columns="tract").assign(ward=1)
+
+    report = drift_report(previous, edition_snapshot(open_source(current)))
+
+    assert report["added"] == ["ward"]
+    assert report["removed"] == ["tract"]
+    assert report["drifted"] == ["median_income", "status"]
+    reasons = report["columns"]["median_income"]["reasons"]
+    assert reasons[0].startswith("null rate went from 0.0% to 20.0%")
+    assert reasons[1].startswith("distribution shifted")
+    assert "status: common values shifted" in describe_drift(report)
+
+
+def test_top_values_keeps_heavy_hitters():
+    rng = np.random.default_rng(0)
+    values = pd.Series(
+        np.concatenate([np.repeat(["a", "b"], [3000, 2000]), rng.integers(0, 10**6, 20_000).astype(str)])
+    ).sample(frac=1, random_state=0)
+
+    top = TopValues(capacity=50)
+    for start in range(0, len(values), 1000):
+        top.update(values.iloc[start : start + 1000])
+
+    (first, first_count), (second, second_count) = top.most_common(2)
+    assert (first, second) == ("a", "b")
+    # Counts are low by at most seen / (capacity + 1).
+    assert 3000 - 25_000 / 51 <= first_count <= 3000
+    assert len(top.counts) <= 50
@@ -0,0 +1,74 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from metadata.export import export_catalog
+from metadata.schema import datasets, variables, keywords, editions
+
+
+def register(md, name, db):
+    return md.register(
+        {"table_name": name, "description": f"All the {name}"},
+        [
+            ({"variable_name": "id", "suppression_threshold": 5, "profile": {"count": 3}}, None),
+            ({"variable_name": "owner", "suppression_threshold": None, "profile": None}, None),
+        ],
+        [f"{name} keyword"],
+        {"num_records": 3, "statistics": {"version": 1}},
+        db,
+    )
+
+
+def read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_full_and_incremental_jsonl_export(md, tmp_path):
+    with md.db_engine.begin() as db:
+        register(md, "parcels", db)
+        register(md, "tracts", db)
+        # Pretend everything so far is old.
+        for table in (datasets, variables, keywords, editions):
+            db.execute(update(table).values(updated_at=datetime(2024, 1, 1)))
+
+    manifest = export_catalog(md, tmp_path / "full", batch_size=1)
+
+    assert {name: table["rows"] for name, table in manifest["tables"].items()} == {
+        "datasets": 2,
+        "variables": 4,
+        "editions": 2,
+        "keywords": 2,
+        "tags": 2,
+    }
+    rows = read_jsonl(tmp_path / "full" / "variables.jsonl")
+    assert rows[0]["profile"] == {"count": 3}
+    assert rows[0]["suppression_threshold"] == 5
+    assert "search_vector" not in rows[0]
+
+    with md.db_engine.begin() as db:
+        register(md, "schools", db)
+
+    since = datetime(2024, 1, 1) + timedelta(days=1)
+    incremental = export_catalog(md, tmp_path / "delta", since=since)
+
+    assert incremental["tables"]["datasets"]["rows"] == 1
+    assert incremental["tables"]["datasets"]["total_rows"] == 3
+    assert incremental["tables"]["tags"]["rows"] == 1
+    assert [row["table_name"] for row in read_jsonl(tmp_path / "delta" / "datasets.jsonl")] == ["schools"]
+
+
+def test_parquet_export(md, tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    with md.db_engine.begin() as db:
+        register(md, "parcels", db)
+
+    export_catalog(md, tmp_path / "out", format="parquet")
+
+    table = pq.read_table(tmp_path / "out" / "editions.parquet")
+    assert table.num_rows == 1
+    assert json.loads(table.column("statistics")[0].as_py()) == {"version": 1}
+    assert str(table.schema.field("publish_date").type) == "date32[day]"
@@ -0,0 +1,21 @@
+from metadata.fingerprint import schema_fingerprint, column_diff
+
+
+def test_fingerprint_ignores_order_but_not_types():
+    a = schema_fingerprint({"geoid": "string", "population": "numeric"})
+    b = schema_fingerprint({"population": "numeric", "geoid": "string"})
+    c = schema_fingerprint({"population": "string", "geoid": "string"})
+
+    assert a == b
+    assert a != c
+
+
+def test_column_diff():
+    missing, extra = column_diff(
+        ["geoid", "population", "households"],
+        ["geoid", "households", "pop_total", "median_age"],
+    )
+
+    assert missing == ["population"]
+    assert extra == ["pop_total", "median_age"]
+    assert column_diff(["a", "b"], ["b", "a"]) == ([], [])
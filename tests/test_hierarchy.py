@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from metadata.hierarchy import detect_parents, describe_candidate
+
+
+def census(n=2_000, seed=0):
+    rng = np.random.default_rng(seed)
+    male_u18, male_18p, female_u18, female_18p = (rng.integers(0, 500, n) for _ in range(4))
+    return pd.DataFrame(
+        {
+            "geoid": 17031000000 + np.arange(n),
+            "total": male_u18 + male_18p + female_u18 + female_18p,
+            "male": male_u18 + male_18p,
+            "female": female_u18 + female_18p,
+            "male_u18": male_u18,
+            "male_18p": male_18p,
+            "female_u18": female_u18,
+            "female_18p": female_18p,
+            "median_age": rng.uniform(20, 60, n),
+            "name": ["tract"] * n,
+        }
+    )
+
+
+def test_sums_and_direct_parents():
+    detected = detect_parents(census())
+
+    assert detected["male"][0] == {"parent": "total", "kind": "sum", "parts": ["male", "female"]}
+    # The direct parent, not the grand total.
+    assert [candidate["parent"] for candidate in detected["female_u18"]] == ["female"]
+    assert describe_candidate(detected["male_18p"][0]) == "male = male_u18 + male_18p"
+    # Ids and unrelated measures aren't anyone's parent or child.
+    assert "total" not in detected
+    assert "median_age" not in detected
+
+
+def test_sums_with_a_stray_dominated_column():
+    frame = census()
+    # Never more than the total, but not one of its parts.
+    frame["households"] = frame["total"] // 3
+
+    detected = detect_parents(frame)
+
+    assert detected["male"][0]["parts"] == ["male", "female"]
+    assert detected["households"] == [{"parent": "total", "kind": "subset", "parts": []}]
+
+
+def test_pairs_that_only_hold_early_are_dropped():
+    frame = census()
+    frame.loc[1_500, "male_u18"] = frame.loc[1_500, "male"] + 1
+
+    assert "male_u18" not in {
+        child for child, found in detect_parents(frame).items() if found[0]["parent"] == "male"
+    }
+
+
+def test_wide_tables():
+    rng = np.random.default_rng(1)
+    columns = {}
+    for group in range(100):
+        parts = [rng.integers(0, 300, 5_000) for _ in range(4)]
+        columns[f"g{group}_total"] = sum(parts)
+        columns.update({f"g{group}_part{i}": part for i, part in enumerate(parts)})
+
+    detected = detect_parents(pd.DataFrame(columns))
+
+    assert len(detected) == 400
+    assert all(
+        found[0]["parent"] == child.split("_")[0] + "_total" and found[0]["kind"] == "sum"
+        for child, found in detected.items()
+    )
+
+
+def test_sorted_files():
+    frame = census()
+    # Tracts with no men, listed first.
+    frame.loc[:300, ["male", "male_u18", "male_18p"]] = 0
+    frame["total"] = frame["male"] + frame["female"]
+    frame = frame.sort_values("male", kind="stable").reset_index(drop=True)
+
+    detected = detect_parents(frame)
+
+    assert detected["male_u18"][0] == {
+        "parent": "male",
+        "kind": "sum",
+        "parts": ["male_u18", "male_18p"],
+    }
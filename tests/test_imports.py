@@ -0,0 +1,29 @@
+import subprocess
+import sys
+from pathlib import Path
+
+
+REPO = Path(__file__).resolve().parents[1]
+
+
+def test_access_imports_nothing_heavy_and_reads_no_config(tmp_path):
+    # Run from a directory with no config.toml: if anything read the config
+    # or built the engine at import, this would fail.
+    script = (
+        "import sys, logging\n"
+        "from metadata.access import MetadataConnection\n"
+        "from metadata.search import MetadataSearch\n"
+        "MetadataSearch(MetadataConnection(logging.getLogger()))\n"
+        "heavy = {'pandas', 'prompt_toolkit', 'psycopg2', 'dateutil'}\n"
+        "print(sorted(heavy & set(sys.modules)))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=tmp_path,
+        env={"PYTHONPATH": str(REPO)},
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,57 @@
+import json
+import logging
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from metadata import instrument
+from metadata.app_logger import JsonLinesFormatter
+
+
+@pytest.fixture()
+def metrics():
+    metrics = instrument.enable()
+    yield metrics
+    instrument.disable()
+
+
+def test_disabled_spans_are_shared_no_ops():
+    assert not instrument.enabled()
+    assert instrument.span("a") is instrument.span("b")
+
+
+def test_statements_and_spans_are_timed(metrics, caplog):
+    engine = instrument.instrument_engine(create_engine("sqlite://"))
+
+    with caplog.at_level(logging.INFO, logger="metadata.metrics"):
+        with instrument.span("outer"), engine.begin() as db:
+            db.execute(text("CREATE TABLE t (x INTEGER)"))
+            with instrument.span("inner", rows=3):
+                db.execute(text("INSERT INTO t VALUES (:x)"), [{"x": i} for i in range(3)])
+            db.execute(text("SELECT * FROM t")).all()
+
+    assert metrics.statements["INSERT"]["count"] == 1
+    assert metrics.statements["INSERT"]["rows"] == 3
+    assert metrics.spans["outer"]["count"] == 1
+
+    events = [record.metrics for record in caplog.records]
+    insert = next(event for event in events if event.get("verb") == "INSERT")
+    assert insert["span"] == "inner" and insert["executemany"]
+    inner = next(event for event in events if event.get("span") == "inner" and event["event"] == "span")
+    assert inner["parent"] == "outer" and inner["rows"] == 3
+
+    line = json.loads(JsonLinesFormatter().format(caplog.records[0]))
+    assert line["event"] == "sql" and line["logger"] == "metadata.metrics"
+
+    exposition = instrument.prometheus()
+    assert 'metadata_sql_statements_total{verb="INSERT"} 1' in exposition
+    assert 'metadata_span_total{span="outer"} 1' in exposition
+
+
+def test_failed_statements_are_counted(metrics):
+    engine = instrument.instrument_engine(create_engine("sqlite://"))
+
+    with pytest.raises(Exception), engine.connect() as db:
+        db.execute(text("SELECT * FROM missing"))
+
+    assert metrics.errors["SELECT"] == 1
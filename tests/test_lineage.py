@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import insert, select
+
+from metadata.schema import datasets, lineage
+
+
+def add_datasets(md, names):
+    with md.db_engine.begin() as db:
+        db.execute(insert(datasets), [{"id": i, "table_name": name} for i, name in enumerate(names, 1)])
+
+
+def closure(db):
+    return {tuple(row) for row in db.execute(select(lineage))}
+
+
+def test_closure_is_kept_up_to_date(md):
+    # acs -> tracts -> tract_rates -> dashboard, and permits -> tract_rates
+    add_datasets(md, ["acs", "tracts", "tract_rates", "dashboard", "permits"])
+    with md.db_engine.begin() as db:
+        # Added out of order, so both ends of an edge can already have lineage.
+        md.add_derivations([(3, 4), (1, 2, "aggregated to tracts")], db)
+        md.add_derivations([(2, 3), (5, 3), (2, 3)], db)
+
+        assert [(row["table_name"], row["depth"]) for row in md.get_upstream(4, db)] == [
+            ("tract_rates", 1),
+            ("permits", 2),
+            ("tracts", 2),
+            ("acs", 3),
+        ]
+        assert [row["table_name"] for row in md.get_downstream(1, db)] == [
+            "tracts",
+            "tract_rates",
+            "dashboard",
+        ]
+
+        incremental = closure(db)
+        md.rebuild_lineage(db)
+        assert closure(db) == incremental
+
+
+def test_shortest_depth_wins(md):
+    add_datasets(md, ["a", "b", "c"])
+    with md.db_engine.begin() as db:
+        md.add_derivations([(1, 2), (2, 3)], db)
+        assert (1, 3, 2) in closure(db)
+        md.add_derivations([(1, 3)], db)
+        assert (1, 3, 1) in closure(db)
+
+
+def test_cycles_are_refused(md):
+    add_datasets(md, ["a", "b", "c"])
+    with md.db_engine.begin() as db:
+        md.add_derivations([(1, 2), (2, 3)], db)
+
+        with pytest.raises(ValueError, match="cycle"):
+            md.add_derivations([(3, 1)], db)
+        with pytest.raises(ValueError, match="cycle"):
+            md.add_derivations([(2, 2)], db)
+        assert md.get_upstream(1, db) == []
+
+
+def test_affected_projects(md):
+    add_datasets(md, ["acs", "tracts", "tract_rates", "unrelated"])
+    with md.db_engine.begin() as db:
+        md.add_derivations([(1, 2), (2, 3)], db)
+        dashboard = md.insert_project({"project_name": "dashboard"}, db)
+        report = md.insert_project({"project_name": "report"}, db)
+        other = md.insert_project({"project_name": "other"}, db)
+        assert md.insert_project({"project_name": "report", "project_description": "Annual"}, db) == report
+
+        md.insert_usages(
+            [
+                {"dataset_id": 3, "project_id": dashboard},
+                {"dataset_id": 1, "project_id": report, "description": "raw counts"},
+                {"dataset_id": 3, "project_id": report},
+                {"dataset_id": 4, "project_id": other},
+            ],
+            db,
+        )
+
+        assert [
+            (row["project_name"], row["table_name"], row["depth"])
+            for row in md.get_affected_projects(1, db)
+        ] == [("dashboard", "tract_rates", 2), ("report", "acs", 0)]
+        assert md.get_affected_projects(3, db)[0]["project_name"] == "dashboard"
@@ -0,0 +1,88 @@
+import logging
+
+import pytest
+from sqlalchemy import create_engine, event, select
+
+from metadata.run_migrations import FIRST_MIGRATION, MigrationError, migrate
+from metadata.schema import operations
+
+
+CREATE_OPS = """
+CREATE TABLE operations (
+    id INTEGER PRIMARY KEY, file VARCHAR(256), ran_at DATETIME, checksum CHAR(64), duration_ms FLOAT
+)
+"""
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+
+    # pysqlite's own transaction handling gets in the way of savepoints.
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    return engine
+
+
+@pytest.fixture()
+def migrations(tmp_path):
+    directory = tmp_path / "migrations"
+    directory.mkdir()
+    (directory / FIRST_MIGRATION).write_text(CREATE_OPS)
+    (directory / "0001_DOCS_things.sql").write_text("CREATE TABLE things (id INTEGER PRIMARY KEY)")
+    return directory
+
+
+def applied(engine):
+    with engine.connect() as db:
+        return db.execute(select(operations.c.file, operations.c.duration_ms)).all()
+
+
+def test_applies_pending_migrations_once(engine, migrations):
+    log = logging.getLogger("tests")
+    assert migrate(engine, migrations, dry_run=True) == [FIRST_MIGRATION, "0001_DOCS_things.sql"]
+    assert migrate(engine, migrations, logger=log) == [FIRST_MIGRATION, "0001_DOCS_things.sql"]
+    assert [file for file, _ in applied(engine)] == [FIRST_MIGRATION, "0001_DOCS_things.sql"]
+    assert all(duration_ms >= 0 for _, duration_ms in applied(engine))
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert migrate(engine, migrations, logger=log) == []
+    # Besides the BEGIN the fixture adds.
+    assert len([statement for statement in statements if statement != "BEGIN"]) == 1
+
+    (migrations / "0002_DOCS_more.sql").write_text("CREATE TABLE more (id INTEGER PRIMARY KEY)")
+    assert migrate(engine, migrations, dry_run=True) == ["0002_DOCS_more.sql"]
+    assert migrate(engine, migrations, logger=log) == ["0002_DOCS_more.sql"]
+
+
+def test_an_edited_migration_stops_the_run(engine, migrations):
+    migrate(engine, migrations)
+    (migrations / "0001_DOCS_things.sql").write_text("CREATE TABLE things (id BIGINT PRIMARY KEY)")
+    (migrations / "0002_DOCS_more.sql").write_text("CREATE TABLE more (id INTEGER PRIMARY KEY)")
+
+    with pytest.raises(MigrationError, match="0001_DOCS_things.sql"):
+        migrate(engine, migrations)
+    assert len(applied(engine)) == 2
+
+
+def test_a_failure_rolls_back_the_run_or_just_its_savepoint(engine, migrations):
+    (migrations / "0002_DOCS_broken.sql").write_text("CREATE TABLE things (id INTEGER)")
+
+    with pytest.raises(Exception):
+        migrate(engine, migrations)
+    assert migrate(engine, migrations, dry_run=True) == [
+        FIRST_MIGRATION,
+        "0001_DOCS_things.sql",
+        "0002_DOCS_broken.sql",
+    ]
+
+    with pytest.raises(MigrationError, match="0002_DOCS_broken.sql"):
+        migrate(engine, migrations, savepoints=True)
+    assert [file for file, _ in applied(engine)] == [FIRST_MIGRATION, "0001_DOCS_things.sql"]
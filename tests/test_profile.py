@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from metadata.profile import DistinctSketch, profile_frame, column_profile, suggested_threshold
+
+
+def test_profile_frame():
+    df = pd.DataFrame(
+        {
+            "geoid": ["26163000100", "26163000200", "26163000300", None],
+            "fips": ["01", "02", "26", "26"],
+            "population": [3, 120, 2, 2000],
+            "as_text": ["1.5", "2", "3", None],
+            "updated": ["2023-01-05", "2023-02-01", None, "2022-12-31"],
+            "apple_name": ["mac", "ipad", "ipod", "lisa"],
+        }
+    )
+
+    profile = profile_frame(df)
+
+    assert profile["inferred_type"].to_dict() == {
+        "geoid": "numeric",
+        "fips": "string",
+        "population": "numeric",
+        "as_text": "numeric",
+        "updated": "date",
+        "apple_name": "string",
+    }
+
+    population = column_profile(profile, "population")
+    assert population["count"] == 4
+    assert population["distinct_count"] == 4
+    assert (population["min"], population["max"]) == (2, 2000)
+    assert population["small_count"] == 2
+    assert suggested_threshold(population) == 5
+
+    updated = column_profile(profile, "updated")
+    assert updated["null_count"] == 1
+    assert updated["min"] == "2022-12-31T00:00:00"
+
+    assert column_profile(profile, "as_text")["max"] == 3.0
+    assert suggested_threshold(column_profile(profile, "apple_name")) is None
+
+
+def test_distinct_values_count_once_across_chunk_dtypes():
+    # The same column, read in chunks: the second has a gap, so it's float.
+    sketch = DistinctSketch()
+    sketch.update(pd.Series([1, 2, 3], dtype="int64"))
+    sketch.update(pd.Series([1.0, 2.0, np.nan, 4.0, 4.5]))
+
+    assert sketch.estimate() == 5
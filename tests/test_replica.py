@@ -0,0 +1,150 @@
+from datetime import date, datetime
+
+import pytest
+from returns.result import Success
+from sqlalchemy import delete, update
+
+from metadata.replica import LocalReplica
+from metadata.schema import datasets, editions, keywords, variables
+
+
+EDITION = {
+    "num_records": 3,
+    "publish_date": date(2024, 3, 1),
+    "statistics": {"version": 1},
+}
+
+
+@pytest.fixture()
+def replica(md, tmp_path):
+    return LocalReplica(md, tmp_path / "replica.db")
+
+
+def register(md, name, columns, kws):
+    with md.db_engine.begin() as db:
+        return md.register(
+            {"table_name": name},
+            [({"variable_name": column}, None) for column in columns],
+            kws,
+            dict(EDITION),
+            db,
+        )
+
+
+def age(md):
+    # Pretend everything so far happened well before the last sync.
+    with md.db_engine.begin() as db:
+        for table in (datasets, variables, keywords, editions):
+            db.execute(update(table).values(updated_at=datetime(2024, 1, 1)))
+
+
+def test_full_then_delta_refresh(md, replica):
+    parcels = register(md, "parcels", ["parcel_id", "owner"], ["property"])
+    age(md)
+
+    assert replica.refresh() is True
+    assert replica.datasets() == {"parcels": (parcels, ["parcel_id", "owner"])}
+    assert replica.keywords() == {"property": 1}
+
+    tracts = register(md, "tracts", ["geoid"], ["census"])
+    assert replica.refresh() is False
+    assert replica.datasets()["tracts"] == (tracts, ["geoid"])
+
+    # Statistics and fingerprints are there to read offline too.
+    with replica.engine.connect() as local:
+        assert replica.local.get_latest_statistics(parcels, local) == {"version": 1}
+        assert replica.local.get_keyword_usage(local) == {"property": 1, "census": 1}
+
+    with md.db_engine.begin() as db:
+        db.execute(delete(datasets).where(datasets.c.id == tracts))
+    assert replica.refresh() is True
+    assert set(replica.datasets()) == {"parcels"}
+
+
+def test_queued_registrations_sync(md, replica):
+    register(md, "parcels", ["parcel_id", "owner"], ["Property"])
+    replica.refresh()
+
+    replica.queue_dataset(
+        {"table_name": "schools"},
+        [({"variable_name": "school_id"}, None)],
+        ["property ", "education"],
+        dict(EDITION),
+    )
+    replica.queue_edition("parcels", dict(EDITION), ["parcel_id", "owner"], "abc")
+    # An edition of a dataset that's only queued so far.
+    replica.queue_edition("schools", dict(EDITION), ["school_id"])
+
+    assert replica.datasets()["schools"] == (None, ["school_id"])
+    assert replica.pending()[0]["edition"]["publish_date"] == date(2024, 3, 1)
+
+    results = replica.sync()
+
+    assert all(isinstance(result, Success) for _, result in results)
+    assert replica.pending() == []
+    with md.db_engine.connect() as db:
+        available = md.get_available_datasets(db)
+        # Matched to the keyword that exists rather than a near duplicate.
+        assert set(md.get_all_keywords(db)) == {"Property", "education"}
+        assert md.get_dataset_usage(db) == {"parcels": 2, "schools": 2}
+        assert md.find_datasets_by_fingerprint("abc", db) == {"parcels": available["parcels"][0]}
+
+
+def test_conflicts_stay_queued(md, replica):
+    register(md, "parcels", ["parcel_id", "owner"], [])
+    replica.refresh()
+
+    replica.queue_dataset({"table_name": "schools"}, [], [], dict(EDITION))
+    replica.queue_edition("parcels", dict(EDITION), ["parcel_id", "owner"])
+    replica.queue_edition("tracts", dict(EDITION), ["geoid"])
+
+    # Meanwhile, on the central database.
+    register(md, "schools", ["school_id"], [])
+    with md.db_engine.begin() as db:
+        md.insert_variables([({"variable_name": "zoning"}, None)], 1, db)
+
+    results = replica.sync()
+
+    assert [isinstance(result, Success) for _, result in results] == [False, False, False]
+    conflicts = {entry["dataset_name"]: entry["conflict"] for entry in replica.pending()}
+    assert "someone else" in conflicts["schools"]
+    assert "zoning" in conflicts["parcels"]
+    assert "no dataset" in conflicts["tracts"]
+
+    replica.discard(replica.pending()[0]["id"])
+    assert len(replica.pending()) == 2
+
+
+def test_a_sent_edition_isnt_sent_again(md, replica):
+    parcels = register(md, "parcels", ["parcel_id", "owner"], [])
+    replica.refresh()
+
+    edition = {**EDITION, "content_digest": "d" * 64, "content_size": 10}
+    replica.queue_edition("parcels", dict(edition), ["parcel_id", "owner"])
+    assert replica.sync()[0][1] == Success(parcels)
+
+    # As if the process died after the central commit but before dequeuing.
+    replica.queue_edition("parcels", dict(edition), ["parcel_id", "owner"])
+    assert replica.sync()[0][1] == Success(parcels)
+    assert replica.pending() == []
+    with md.db_engine.connect() as db:
+        assert md.get_dataset_usage(db) == {"parcels": 2}
+
+
+def test_new_tags_and_deleted_editions_reach_the_replica(md, replica):
+    parcels = register(md, "parcels", ["parcel_id", "owner"], ["property"])
+    tracts = register(md, "tracts", ["geoid"], [])
+    with md.db_engine.begin() as db:
+        md.insert_edition(dict(EDITION), parcels, db)
+    age(md)
+    replica.refresh()
+
+    # Neither of these moves an updated_at.
+    with md.db_engine.begin() as db:
+        md.tag_dataset([md.get_all_keywords(db)["property"]], tracts, db)
+        db.execute(delete(editions).where(editions.c.dataset_id == parcels))
+
+    assert replica.refresh() is True
+    with replica.engine.connect() as local:
+        assert replica.local.get_keyword_usage(local) == {"property": 2}
+        assert replica.local.get_dataset_usage(local) == {"tracts": 1}
@@ -0,0 +1,26 @@
+from sqlalchemy import create_engine, text
+
+from metadata.schema import metadata, check_schema
+
+
+def test_schema_creates_and_checks_clean_in_sqlite():
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+
+    with engine.connect() as db:
+        assert check_schema(db) == []
+
+
+def test_check_schema_reports_drift():
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+
+    with engine.begin() as db:
+        db.execute(text("ALTER TABLE datasets ADD COLUMN legacy TEXT"))
+        db.execute(text("DROP TABLE standards"))
+
+    with engine.connect() as db:
+        assert check_schema(db) == [
+            "Column 'datasets.legacy' isn't in metadata/schema.py.",
+            "Table 'standards' is missing from the database.",
+        ]
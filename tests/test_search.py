@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import create_mock_engine
+
+from metadata.access import MetadataConnection
+from metadata.search import InvertedIndex, MetadataSearch, prefix_tsquery, tokenize
+from metadata.standards import BUILTIN_STANDARDS
+
+
+def build_index():
+    index = InvertedIndex()
+    index.add(
+        1,
+        {"A": "munoz_llcs LLC ownership of parcels", "C": "Scraped from LARA"},
+        payload={"table_name": "munoz_llcs"},
+    )
+    index.add(
+        2,
+        {"A": "acs_housing Housing values by tract", "D": "median_value"},
+        payload={"table_name": "acs_housing"},
+    )
+    index.add(
+        3,
+        {"A": "property_sales", "D": "parcel sale price"},
+        payload={"table_name": "property_sales"},
+    )
+    return index
+
+
+def test_tokenize_splits_identifiers_and_drops_stopwords():
+    assert tokenize("Median_Value of the Tracts") == ["median", "value", "tract"]
+
+
+def test_prefix_tsquery_is_sanitized():
+    # Prefixes aren't stemmed.
+    assert prefix_tsquery("hous') | val") == "hous:* & val:*"
+
+
+def test_field_weight_orders_results():
+    index = build_index()
+    results = index.search("parcel")
+
+    assert [doc_id for doc_id, _, _ in results] == [1, 3]
+
+
+def test_terms_are_anded():
+    index = build_index()
+
+    assert [doc_id for doc_id, _, _ in index.search("housing tract")] == [2]
+    assert index.search("housing parcel") == []
+
+
+def test_prefix_and_pagination():
+    index = build_index()
+
+    assert index.search("parc") == []
+    assert len(index.search("parc", prefix=True)) == 2
+    assert len(index.search("parcels", prefix=True)) == 2
+    assert [doc_id for doc_id, _, _ in index.search("hous", prefix=True)] == [2]
+
+    first = index.search("parc", prefix=True, limit=1)
+    second = index.search("parc", prefix=True, limit=1, offset=1)
+    assert first[0][0] != second[0][0]
+
+
+def seed(md):
+    with md.db_engine.begin() as db:
+        md.register(
+            {"table_name": "acs_housing", "description": "Housing values by tract"},
+            [({"variable_name": "median_value", "description": "Median home value"}, None)],
+            ["housing", "census"],
+            {"num_records": 1},
+            db,
+        )
+        md.register(
+            {"table_name": "property_sales", "description": "Sales of parcels"},
+            [({"variable_name": "sale_price", "description": "Price paid"}, None)],
+            ["property"],
+            {"num_records": 1},
+            db,
+        )
+        for standard in BUILTIN_STANDARDS:
+            md.insert_standard(standard, db)
+
+
+def test_local_search(md):
+    seed(md)
+    search = MetadataSearch(md)
+
+    with md.db_engine.connect() as db:
+        assert [row["table_name"] for row in search.search_datasets("housing values", db)] == [
+            "acs_housing"
+        ]
+        assert [row["table_name"] for row in search.search_datasets("parcel", db)] == [
+            "property_sales"
+        ]
+        assert [row["variable_name"] for row in search.search_variables("price", db)] == [
+            "sale_price"
+        ]
+        assert [row["content"] for row in search.search_keywords("hous", db)] == ["housing"]
+        assert search.search_standards("tract geoid", db)[0]["name"] == "Census tract GEOID"
+        assert search.search_datasets("nothing like it", db) == []
+
+
+def test_local_indexes_are_built_once_across_threads(md):
+    seed(md)
+    search = MetadataSearch(md)
+    built = []
+    build = search._build_keywords_index
+
+    def slow_build(db):
+        built.append(1)
+        time.sleep(0.05)
+        return build(db)
+
+    search._build_keywords_index = slow_build
+    results = []
+
+    def run():
+        with md.db_engine.connect() as db:
+            results.append(search.search_keywords("prop", db))
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1
+    assert all([row["content"] for row in found] == ["property"] for found in results)
+
+
+def test_postgres_queries():
+    statements = []
+    engine = create_mock_engine(
+        "postgresql+psycopg2://", lambda sql, *args, **kwargs: statements.append(sql) or []
+    )
+    search = MetadataSearch(MetadataConnection(logging.getLogger("tests"), engine))
+
+    search.search_datasets("housing values", engine)
+    search.search_variables("price", engine)
+    search.search_keywords("hous val", engine)
+    search.search_standards("tract", engine)
+
+    compiled = [sql.compile(dialect=engine.dialect) for sql in statements]
+    datasets, variables, keywords, standards = (str(sql) for sql in compiled)
+
+    assert "websearch_to_tsquery" in datasets and "ts_rank_cd(datasets.search_vector" in datasets
+    assert "variables.search_vector @@" in datasets and "keywords.search_vector @@" in datasets
+    assert "ts_rank_cd(variables.search_vector" in variables
+    assert "to_tsquery" in keywords and "websearch" not in keywords
+    assert "hous:* & val:*" in compiled[2].params.values()
+    assert "to_tsvector" in standards
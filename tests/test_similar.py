@@ -0,0 +1,95 @@
+from sqlalchemy import delete, insert, update
+
+from metadata.schema import datasets, variables, keywords, tags
+from metadata.similar import SimilarityIndex
+
+
+def seed(md):
+    with md.db_engine.begin() as db:
+        db.execute(
+            insert(datasets),
+            [
+                {"id": 1, "table_name": "acs_income", "description": "Household income by tract", "universe": "Households"},
+                {"id": 2, "table_name": "crime_incidents", "description": "Reported crimes", "universe": "Incidents"},
+                {"id": 3, "table_name": "building_permits", "description": "Permits issued", "universe": "Parcels"},
+            ],
+        )
+        db.execute(
+            insert(variables),
+            [
+                {"dataset_id": 1, "variable_name": name}
+                for name in ["geoid", "median_household_income", "households", "income_moe"]
+            ]
+            + [{"dataset_id": 2, "variable_name": name} for name in ["case_id", "offense", "geoid", "reported_at"]]
+            + [{"dataset_id": 3, "variable_name": name} for name in ["permit_id", "parcel_id", "issued_at"]],
+        )
+        db.execute(insert(keywords), [{"id": 1, "content": "income"}, {"id": 2, "content": "public safety"}])
+        db.execute(insert(tags), [{"dataset_id": 1, "kw_id": 1}, {"dataset_id": 2, "kw_id": 2}])
+
+
+def test_similar_datasets(md, tmp_path):
+    seed(md)
+    index = SimilarityIndex(md, tmp_path / "similar.npz")
+    with md.db_engine.connect() as db:
+        assert index.refresh(db) is True
+
+    found = index.similar_to(["GEOID", "median_household_income", "households"], "acs_income_2023.csv")
+    assert found[0][0] == "acs_income"
+    assert found[0][1] > 0.5
+    assert "building_permits" not in [name for name, _ in found]
+
+    assert index.similar_to(["geoid"], exclude=["acs_income"])[0][0] == "crime_incidents"
+    assert index.similar_to(["nothing_like_it"]) == []
+
+    # The same answers from the saved index.
+    saved = SimilarityIndex(md, tmp_path / "similar.npz").load()
+    assert saved.similar_to(["median_household_income"]) == index.similar_to(["median_household_income"])
+
+
+def test_refresh_replaces_changed_rows(md, tmp_path):
+    seed(md)
+    index = SimilarityIndex(md, tmp_path / "similar.npz")
+    with md.db_engine.begin() as db:
+        index.refresh(db)
+        before = index.similar_to(["permit_id"])
+
+        db.execute(insert(datasets).values(id=4, table_name="demolition_permits", description="Demolitions"))
+        db.execute(insert(variables), [{"dataset_id": 4, "variable_name": "permit_id"}])
+        db.execute(update(datasets).where(datasets.c.id == 1).values(description="Renamed"))
+        assert index.refresh(db) is False
+
+        assert len(index) == 4
+        assert {name for name, _ in index.similar_to(["permit_id"])} == {"building_permits", "demolition_permits"}
+        assert before[0][0] == "building_permits"
+
+        db.execute(delete(tags).where(tags.c.dataset_id == 2))
+        db.execute(delete(variables).where(variables.c.dataset_id == 2))
+        db.execute(delete(datasets).where(datasets.c.id == 2))
+        # A delete is only noticed as a count that doesn't line up.
+        assert index.refresh(db) is True
+        assert "crime_incidents" not in index.names
+
+
+def test_batches_match_single_queries(md, tmp_path):
+    seed(md)
+    index = SimilarityIndex(md, tmp_path / "similar.npz")
+    with md.db_engine.connect() as db:
+        index.refresh(db)
+
+    queries = [["geoid", "offense"], ["parcel", "issued"], [], ["income"]]
+    assert index.most_similar(queries) == [index.most_similar([query])[0] for query in queries]
+    assert index.most_similar(queries)[2] == []
+
+
+def test_bulk_terms_match_query_terms():
+    from collections import Counter
+
+    from metadata.similar import _term_table, dataset_terms
+
+    entries = [
+        {"table_name": "ACS_Incomes", "description": "Households and the  class", "universe": None, "keywords": ["bus"], "variables": ["Median_Incomes", "GEOID"]},
+        {"table_name": "empty", "description": None, "universe": None, "keywords": [], "variables": []},
+    ]
+    positions, terms = _term_table(entries)
+    for i, entry in enumerate(entries):
+        assert Counter(terms[positions == i]) == Counter(dataset_terms(**entry))
@@ -0,0 +1,91 @@
+import json
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from metadata.drift import edition_snapshot
+from metadata.profile import profile_frame, column_profile
+from metadata.sources import CsvSource, FrameSource, ParquetSource, open_source
+
+
+def test_csv_source_matches_in_memory_profile(tmp_path):
+    df = pd.DataFrame(
+        {
+            "tract": [f"26163{i:06d}" for i in range(1000)],
+            "population": [i % 97 for i in range(1000)],
+            "median_income": [None if i % 10 == 0 else i * 1.5 for i in range(1000)],
+            "name": [f"tract {i % 13}" for i in range(1000)],
+        }
+    )
+    path = tmp_path / "tracts.csv"
+    df.to_csv(path, index=False)
+
+    source = open_source(path, chunksize=128)
+    assert isinstance(source, CsvSource)
+    assert source.columns == list(df.columns)
+    assert source.num_records == 1000
+    assert list(source.head("population")) == [0, 1, 2, 3, 4]
+
+    streamed = source.profile()
+    expected = profile_frame(pd.read_csv(path))
+
+    fields = ["inferred_type", "count", "null_count", "distinct_count", "min", "max", "small_count"]
+    assert streamed[fields].to_dict() == expected[fields].to_dict()
+
+
+def test_frame_source_passthrough():
+    df = pd.DataFrame({"apple_name": ["mac", "ipad"]})
+
+    source = open_source(df)
+    assert isinstance(source, FrameSource)
+    assert source.num_records == 2
+    assert open_source(source) is source
+
+
+def test_only_csvs_take_reading_options(tmp_path):
+    with pytest.raises(TypeError, match="chunksize"):
+        open_source(tmp_path / "tracts.parquet", chunksize=128)
+    with pytest.raises(TypeError):
+        open_source(pd.DataFrame({"a": [1]}), sep=";")
+
+
+def test_parquet_source_reads_footer(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    df = pd.DataFrame(
+        {
+            "population": [float(i % 50) if i % 9 else None for i in range(1000)],
+            "name": [f"tract {i % 13}" for i in range(1000)],
+        }
+    )
+    path = tmp_path / "tracts.parquet"
+    pq.write_table(pa.Table.from_pandas(df), path, row_group_size=100)
+
+    source = open_source(path)
+    assert isinstance(source, ParquetSource)
+    assert source.columns == ["population", "name"]
+    assert source.num_records == 1000
+
+    profile = source.profile()
+    population = column_profile(profile, "population")
+    assert population["null_count"] == df["population"].isna().sum()
+    assert (population["min"], population["max"]) == (0.0, 49.0)
+
+
+def test_decimal_columns_profile_to_json(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    prices = [Decimal("1.50"), Decimal("2.25"), None, Decimal("10.00")]
+    path = tmp_path / "sales.parquet"
+    pq.write_table(pa.table({"price": pa.array(prices, pa.decimal128(10, 2))}), path)
+
+    price = column_profile(open_source(path).profile(), "price")
+    assert (price["min"], price["max"]) == (1.5, 10.0)
+    json.dumps(price)
+
+    snapshot = edition_snapshot(open_source(path))
+    assert snapshot["columns"]["price"]["max"] == 10.0
+    json.dumps(snapshot)
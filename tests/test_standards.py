@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from metadata.bulk import parse_spec
+from metadata.schema import variables, standards
+from metadata.standards import BUILTIN_STANDARDS, StandardMatcher
+
+
+def frame(n=500):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            # Read from a CSV, 01001 comes back as 1001.
+            "county_fips": rng.choice([1001, 17031, 6037], n),
+            "state": rng.choice(["01", "17", "06"], n),
+            "not_a_state": rng.choice(["03", "07", "14"], n),
+            "geoid": [f"17031{i:06d}" for i in rng.integers(0, 999_999, n)],
+            "published": ["2024-03-01"] * n,
+            "population": rng.uniform(0, 5_000, n),
+            "name": ["tract"] * n,
+            # Both a ZIP code and a FIPS county code, as far as it shows.
+            "zip": rng.integers(60601, 60660, n),
+        }
+    )
+
+
+def test_matching():
+    matches = StandardMatcher(BUILTIN_STANDARDS).match(frame())
+
+    assert matches["county_fips"][0][0] == "FIPS county"
+    # The code list wins over a bare pattern.
+    assert matches["state"][0] == ("FIPS state", 1.0)
+    assert "not_a_state" not in matches
+    assert matches["geoid"] == [("Census tract GEOID", 1.0)]
+    assert matches["published"] == [("ISO 8601 date", 1.0)]
+    assert "population" not in matches
+    assert "name" not in matches
+
+
+def test_integer_counts_match_nothing():
+    rng = np.random.default_rng(0)
+    counts = pd.DataFrame(
+        {
+            "population": rng.integers(0, 5_000, 500),
+            "median_income": rng.integers(20_000, 99_999, 500),
+            "year": rng.choice([2019, 2020, 2021], 500),
+            "permits": rng.integers(100_000, 999_999, 500),
+        }
+    )
+
+    assert StandardMatcher(BUILTIN_STANDARDS).match(counts) == {}
+    # The same values are codes when the name says so.
+    renamed = counts.rename(columns={"median_income": "zip"})
+    assert {name for name, _ in StandardMatcher(BUILTIN_STANDARDS).match(renamed)["zip"]} == {
+        "FIPS county",
+        "ZIP code",
+    }
+
+
+def test_mostly_matching_columns_still_match():
+    data = frame()
+    data.loc[:10, "geoid"] = "unknown"
+
+    assert "geoid" in StandardMatcher(BUILTIN_STANDARDS).match(data)
+    data.loc[:100, "geoid"] = "unknown"
+    assert "geoid" not in StandardMatcher(BUILTIN_STANDARDS).match(data)
+
+
+def test_standards_are_stored_and_linked(md):
+    with md.db_engine.begin() as db:
+        for standard in BUILTIN_STANDARDS:
+            md.insert_standard(standard, db)
+        # Updating one by name.
+        md.insert_standard({"name": "ZIP code", "maintainer": "Postal Service"}, db)
+
+        md.insert_variables(
+            [
+                ({"variable_name": "geoid"}, "Census tract GEOID"),
+                ({"variable_name": "ward"}, "City ward"),
+                ({"variable_name": "owner"}, None),
+            ],
+            1,
+            db,
+        )
+
+        current = {standard["name"]: standard for standard in md.get_current_standards(db)}
+        assert current["ZIP code"]["maintainer"] == "Postal Service"
+        assert current["FIPS state"]["codes"][:2] == ["01", "02"]
+        # Named by hand, so added without a pattern.
+        assert current["City ward"]["pattern"] is None
+
+        linked = dict(
+            db.execute(
+                select(variables.c.variable_name, standards.c.name).select_from(
+                    variables.outerjoin(standards, variables.c.standard_id == standards.c.id)
+                )
+            ).all()
+        )
+    assert linked == {"geoid": "Census tract GEOID", "ward": "City ward", "owner": None}
+
+
+def test_specs_pick_up_standards_from_their_data():
+    spec = {
+        "dataset": {"table_name": "tracts", "cadence": "year"},
+        "variables": [
+            {"variable_name": name, "data_type": "string"} for name in frame().columns
+        ],
+        "edition": {
+            "num_records": 1,
+            "publish_date": "2024-01-01",
+            "collection_start": "2023-01-01",
+            "collection_end": "2023-12-31",
+            "acquisition_date": "2024-01-02",
+        },
+    }
+    spec["variables"][0]["standard"] = "Something else"
+
+    registration = parse_spec(
+        spec, "tracts", "tests", source=frame(), standards=StandardMatcher(BUILTIN_STANDARDS)
+    )
+
+    found = {variable["variable_name"]: standard for variable, standard in registration["variables"]}
+    assert found["county_fips"] == "Something else"
+    assert found["geoid"] == "Census tract GEOID"
+    assert found["name"] is None
+    assert found["zip"] is None